@@ -0,0 +1,214 @@
+"""Persistent memo store for the agent's deterministic LLM steps.
+
+classify, decompose and refine map (prompt, input) to a small structured
+result, so a repeated query does not need another LLM round trip. Results
+are kept in SQLite, keyed by (step, model, prompt hash, normalized input).
+The prompt hash covers the system prompt and the output schema, so editing
+either one invalidates the old entries.
+
+Entries expire after AGENT_MEMO_TTL_SECONDS. When the stored values grow
+past AGENT_MEMO_MAX_BYTES, the least recently used entries are evicted.
+Fallback results (after a StructuredOutputError) are never stored.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from src.search.cache import normalize_query
+from src.tracing import current_span
+
+AGENT_MEMO = os.getenv("AGENT_MEMO", "1") == "1"
+AGENT_MEMO_DB = os.getenv("AGENT_MEMO_DB", "data/agent_memo.db")
+AGENT_MEMO_TTL_SECONDS = int(os.getenv("AGENT_MEMO_TTL_SECONDS", str(7 * 24 * 3600)))
+AGENT_MEMO_MAX_BYTES = int(os.getenv("AGENT_MEMO_MAX_BYTES", str(32 * 1024 * 1024)))
+# Evict down to this share of the byte budget so eviction runs rarely
+EVICT_TO = 0.9
+MEMO_MODEL_PREFIX = "memo:"
+
+
+def prompt_hash(messages, schema):
+    """Hash of everything but the user input: system prompts and the output schema."""
+    prompt = [m["content"] for m in messages if m["role"] != "user"]
+    payload = json.dumps({"prompt": prompt, "schema": schema.model_json_schema()}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def memo_input(messages):
+    return normalize_query("\n".join(m["content"] for m in messages if m["role"] == "user"))
+
+
+class MemoStore:
+    """SQLite-backed memo table shared by every worker process."""
+
+    def __init__(self, path=None, ttl=None, max_bytes=None):
+        self.path = path or AGENT_MEMO_DB
+        self.ttl = AGENT_MEMO_TTL_SECONDS if ttl is None else ttl
+        self.max_bytes = AGENT_MEMO_MAX_BYTES if max_bytes is None else max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS memo (
+                step TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                input TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_hit REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (step, model, prompt_hash, input)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS memo_last_hit ON memo (last_hit)")
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread; WAL lets API workers read while another writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, step, model, prompt_key, text):
+        """The stored value (parsed JSON) or None when missing or expired."""
+        conn = self._conn()
+        now = time.time()
+        key = (step, model, prompt_key, text)
+        row = conn.execute(
+            "SELECT value, created FROM memo WHERE step = ? AND model = ? AND prompt_hash = ? AND input = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row["created"] > self.ttl:
+            conn.execute("DELETE FROM memo WHERE step = ? AND model = ? AND prompt_hash = ? AND input = ?", key)
+            conn.commit()
+            return None
+        conn.execute(
+            "UPDATE memo SET hits = hits + 1, last_hit = ? WHERE step = ? AND model = ? AND prompt_hash = ? AND input = ?",
+            (now, *key),
+        )
+        conn.commit()
+        return json.loads(row["value"])
+
+    def put(self, step, model, prompt_key, text, value):
+        conn = self._conn()
+        now = time.time()
+        encoded = json.dumps(value)
+        conn.execute(
+            "INSERT OR REPLACE INTO memo (step, model, prompt_hash, input, value, size, created, last_hit, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (step, model, prompt_key, text, encoded, len(encoded) + len(text), now, now),
+        )
+        conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones while over the byte budget."""
+        conn = self._conn()
+        conn.execute("DELETE FROM memo WHERE created < ?", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM memo").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - int(self.max_bytes * EVICT_TO)
+            # Least recently used rows until their sizes cover the excess
+            conn.execute("""
+                DELETE FROM memo WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, size, SUM(size) OVER (ORDER BY last_hit, rowid) AS running FROM memo
+                    ) WHERE running - size < ?
+                )
+            """, (excess,))
+        conn.commit()
+
+    def stats(self):
+        """Entry counts, bytes and hits per step."""
+        conn = self._conn()
+        rows = conn.execute("""
+            SELECT step, COUNT(*) AS entries, SUM(size) AS bytes, SUM(hits) AS hits, MIN(created) AS oldest
+            FROM memo GROUP BY step ORDER BY step
+        """).fetchall()
+        steps = {
+            row["step"]: {
+                "entries": row["entries"],
+                "bytes": row["bytes"],
+                "hits": row["hits"],
+                "oldest_age_s": round(time.time() - row["oldest"]),
+            }
+            for row in rows
+        }
+        return {
+            "entries": sum(s["entries"] for s in steps.values()),
+            "bytes": sum(s["bytes"] for s in steps.values()),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "steps": steps,
+        }
+
+    def entries(self, step=None, limit=50):
+        """Most recently used entries, optionally for one step."""
+        conn = self._conn()
+        where, params = ("WHERE step = ?", (step,)) if step else ("", ())
+        rows = conn.execute(f"""
+            SELECT step, model, prompt_hash, input, value, hits, created, last_hit
+            FROM memo {where} ORDER BY last_hit DESC LIMIT ?
+        """, (*params, limit)).fetchall()
+        return [{**dict(row), "value": json.loads(row["value"])} for row in rows]
+
+    def flush(self, step=None):
+        """Delete all entries (or one step's); returns how many were removed."""
+        conn = self._conn()
+        if step:
+            removed = conn.execute("DELETE FROM memo WHERE step = ?", (step,)).rowcount
+        else:
+            removed = conn.execute("DELETE FROM memo").rowcount
+        conn.commit()
+        return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MemoStore()
+    return _store
+
+
+def memoized_completion(step, model, messages, schema, compute, store=None):
+    """compute() through the memo: a stored result skips it, and a fresh one is stored.
+
+    Hits are marked on the current span (memo=hit, model "memo:<model>"),
+    so the step shows ~0 ms and no LLM call in the trace and in agent_runs.
+    """
+    if not AGENT_MEMO and store is None:
+        return compute()
+    store = store or get_store()
+    prompt_key, text = prompt_hash(messages, schema), memo_input(messages)
+    try:
+        value = store.get(step, model, prompt_key, text)
+    except sqlite3.Error as e:
+        print(f"Warning: memo lookup failed: {e}")
+        return compute()
+    if value is not None:
+        current_span().set_attributes({"memo": "hit", "model": MEMO_MODEL_PREFIX + model})
+        return schema.model_validate(value)
+
+    result = compute()
+    current_span().set_attribute("memo", "miss")
+    try:
+        store.put(step, model, prompt_key, text, result.model_dump())
+    except sqlite3.Error as e:
+        print(f"Warning: memo store failed: {e}")
+    return result
@@ -0,0 +1,190 @@
+"""Local SIMPLE/COMPARE/EXPLORE classifier for agent queries.
+
+A softmax regression over keyword/regex features. It decides in
+microseconds, and classify_query only calls the LLM when the local
+prediction is not confident. It starts from hand-set weights; train it on
+logged agent_runs with:
+
+    python3 -m src.agents.query_classifier --train
+"""
+import os
+import re
+import json
+import random
+import argparse
+import numpy as np
+
+LABELS = ("SIMPLE", "COMPARE", "EXPLORE")
+MODEL_PATH = os.getenv("QUERY_CLASSIFIER_PATH", "data/models/query_classifier.json")
+MIN_CONFIDENCE = float(os.getenv("QUERY_CLASSIFIER_MIN_CONFIDENCE", "0.85"))
+LOCAL_MODEL_NAME = "local-classifier"
+
+FEATURE_PATTERNS = [
+    ("compare_word", r"\b(compare|comparison|comparing|versus|vs\.?|differences?|pros and cons|trade-?offs?)\b"),
+    ("superlative", r"\b(best|better|cheapest|fastest|most reliable|recommend(ed)?)\b"),
+    ("which", r"\bwhich\b"),
+    ("or_choice", r"\b\w+ or \w+\b"),
+    ("criteria", r"\b(that|which) (also )?(supports?|offers?|has|have)\b.*\band\b"),
+    ("explore_word", r"\b(list|explore|options|alternatives|available|overview|landscape|ecosystem|discover|kinds of|types of)\b"),
+    ("what_apis", r"\bwhat (apis|services|tools|options|kind)\b"),
+    ("any_apis", r"\b(any|some|all|are there) (apis?|services)\b"),
+    ("plural_apis", r"\bapis\b"),
+    ("how_to", r"\b(how (do|can|to|does)|what is the endpoint|endpoint for|example of)\b"),
+    ("named_api", r"\bthe [a-z0-9]+ api\b"),
+    ("auth", r"\b(authenticate|authentication|oauth|api key|token)\b"),
+]
+_COMPILED = [(name, re.compile(pattern)) for name, pattern in FEATURE_PATTERNS]
+FEATURE_NAMES = [name for name, _ in FEATURE_PATTERNS] + ["long_query", "conjunctions"]
+
+# Starting weights (label -> feature -> weight) until a model is trained on logged runs
+DEFAULT_WEIGHTS = {
+    "SIMPLE": {"how_to": 3.0, "named_api": 2.0, "auth": 1.5, "bias": 1.0},
+    "COMPARE": {"compare_word": 5.0, "superlative": 2.5, "which": 1.5, "or_choice": 1.0, "criteria": 2.0,
+                "conjunctions": 0.5, "bias": -1.0},
+    "EXPLORE": {"explore_word": 3.0, "what_apis": 3.0, "any_apis": 2.5, "plural_apis": 1.0,
+                "long_query": -0.5, "bias": -0.5},
+}
+
+
+def features(query):
+    """Binary pattern hits plus two shape features; a vector aligned with FEATURE_NAMES."""
+    text = query.lower().strip()
+    values = [1.0 if pattern.search(text) else 0.0 for _, pattern in _COMPILED]
+    values.append(1.0 if len(text.split()) > 15 else 0.0)
+    values.append(min(len(re.findall(r"\band\b|,", text)), 3) / 3)
+    return np.array(values, dtype="float64")
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class QueryClassifier:
+    def __init__(self, weights, bias):
+        self.weights = np.asarray(weights, dtype="float64")  # (labels, features)
+        self.bias = np.asarray(bias, dtype="float64")
+
+    @classmethod
+    def default(cls):
+        weights = [[DEFAULT_WEIGHTS[label].get(name, 0.0) for name in FEATURE_NAMES] for label in LABELS]
+        bias = [DEFAULT_WEIGHTS[label].get("bias", 0.0) for label in LABELS]
+        return cls(weights, bias)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or MODEL_PATH
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data["features"] != FEATURE_NAMES or data["labels"] != list(LABELS):
+            raise ValueError(f"{path} was trained on a different feature set; retrain it")
+        return cls(data["weights"], data["bias"])
+
+    def save(self, path=None):
+        path = path or MODEL_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "labels": list(LABELS),
+                "features": FEATURE_NAMES,
+                "weights": self.weights.tolist(),
+                "bias": self.bias.tolist(),
+            }, f, indent=2)
+
+    def predict_proba(self, query):
+        return _softmax(self.weights @ features(query) + self.bias)
+
+    def classify(self, query):
+        """(label, confidence) for the most likely query type."""
+        probs = self.predict_proba(query)
+        best = int(probs.argmax())
+        return LABELS[best], float(probs[best])
+
+
+def train(queries, labels, epochs=300, lr=0.5, l2=1e-3):
+    """Fit softmax regression by full-batch gradient descent, starting from the default weights."""
+    x = np.stack([features(q) for q in queries])
+    y = np.zeros((len(labels), len(LABELS)))
+    y[np.arange(len(labels)), [LABELS.index(label) for label in labels]] = 1
+
+    model = QueryClassifier.default()
+    for _ in range(epochs):
+        probs = _softmax(x @ model.weights.T + model.bias)
+        error = (probs - y) / len(x)
+        model.weights -= lr * (error.T @ x + l2 * model.weights)
+        model.bias -= lr * error.sum(axis=0)
+    return model
+
+
+def evaluate(model, queries, labels, min_confidence=None):
+    """Accuracy overall and on the confident subset, and how many LLM calls would be skipped."""
+    min_confidence = MIN_CONFIDENCE if min_confidence is None else min_confidence
+    predictions = [model.classify(q) for q in queries]
+    correct = [pred == label for (pred, _), label in zip(predictions, labels)]
+    confident = [conf >= min_confidence for _, conf in predictions]
+    skipped = sum(confident)
+    return {
+        "queries": len(queries),
+        "accuracy": round(sum(correct) / len(queries), 4) if queries else 0,
+        "skip_rate": round(skipped / len(queries), 4) if queries else 0,
+        "skipped_accuracy": round(sum(c for c, s in zip(correct, confident) if s) / skipped, 4) if skipped else 0,
+        "min_confidence": min_confidence,
+    }
+
+
+def load_training_rows():
+    """(query, query_type) pairs the LLM labeled in logged agent runs."""
+    from src.metrics_db import get_db
+    conn = get_db()
+    rows = conn.execute(
+        "SELECT query, query_type FROM agent_runs WHERE query_type IN (?, ?, ?) AND classify_model != ?",
+        (*LABELS, LOCAL_MODEL_NAME),
+    ).fetchall()
+    conn.close()
+    return [(row["query"], row["query_type"]) for row in rows]
+
+
+_classifier = None
+
+
+def get_classifier():
+    """The trained model if one is saved, else the default weights."""
+    global _classifier
+    if _classifier is None:
+        try:
+            _classifier = QueryClassifier.load()
+        except FileNotFoundError:
+            _classifier = QueryClassifier.default()
+        except (ValueError, KeyError) as e:
+            print(f"Warning: ignoring query classifier model: {e}")
+            _classifier = QueryClassifier.default()
+    return _classifier
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train/evaluate the local agent query classifier")
+    parser.add_argument("--train", action="store_true", help="Fit on logged runs and save the model")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rows = load_training_rows()
+    if not rows:
+        raise SystemExit("No LLM-labeled agent_runs rows to train or evaluate on.")
+    random.Random(0).shuffle(rows)
+    split = int(len(rows) * (1 - args.test_fraction)) if len(rows) > 4 else len(rows)
+    train_rows, test_rows = rows[:split], rows[split:] or rows
+
+    model = get_classifier()
+    if args.train:
+        model = train([q for q, _ in train_rows], [t for _, t in train_rows])
+        model.save()
+        print(f"Trained on {len(train_rows)} runs -> {MODEL_PATH}")
+
+    report = evaluate(model, [q for q, _ in test_rows], [t for _, t in test_rows], args.min_confidence)
+    print(f"Held-out queries:  {report['queries']}")
+    print(f"Accuracy:          {report['accuracy']:.1%}")
+    print(f"Skip rate:         {report['skip_rate']:.1%} of classify LLM calls skipped "
+          f"(confidence >= {report['min_confidence']})")
+    print(f"Skipped accuracy:  {report['skipped_accuracy']:.1%}")
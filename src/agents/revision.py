@@ -0,0 +1,55 @@
+"""Targeted revision of an answer's unsupported claims (the agent's refine pass).
+
+A revision rewrites or drops single answer sentences, so every verdict has
+to name the sentence it is about. The ClaimVerifier's claims are the
+(cleaned) sentences themselves; the LLM grounding check restates claims in
+its own words and quotes the sentence in "answer_sentence". A verdict
+without one cannot be revised in place, and the answer is regenerated.
+"""
+from src.search.claim_verifier import claim_key, clean_claim, replace_claims
+
+REVISE_PROMPT = """You are API Universe, an AI-powered API discovery assistant.
+Some claims in your previous answer were not supported by its sources. For each listed claim,
+rewrite it as one sentence supported by the search results, citing [Source N], or return an
+empty string to drop it when no source supports it. Do not touch any other part of the answer.
+Respond in JSON: {"revisions": [{"claim": "the claim as listed", "revised": "new sentence or empty"}]}"""
+
+# grounding["method"] of verdicts made per answer sentence
+SENTENCE_METHOD = "claim-verifier"
+
+
+def claim_sentence(claim, method):
+    """The cleaned answer sentence a verdict is about, or None when the verdict does not name one."""
+    if method == SENTENCE_METHOD:
+        return claim["claim"]
+    return clean_claim(claim.get("answer_sentence") or "")
+
+
+def revisable_claims(grounding):
+    """The answer sentences with an unsupported claim, in answer order; empty when none can be located."""
+    method = grounding.get("method")
+    sentences = {}
+    for c in grounding.get("claims", []):
+        sentence = claim_sentence(c, method)
+        if c["status"] == "UNSUPPORTED" and sentence:
+            sentences.setdefault(claim_key(sentence), sentence)
+    return list(sentences.values())
+
+
+def apply_revisions(answer, grounding, revisions):
+    """Swap the revised sentences into answer.
+
+    Returns (new_answer, revised_sentences, kept_claims), where kept_claims
+    are the verdicts about sentences the revision left alone, or None when
+    no revision matched a sentence of the answer.
+    """
+    replacements = {r.claim: r.revised for r in revisions}
+    new_answer, revised, replaced = replace_claims(answer, replacements)
+    if not replaced:
+        return None
+    method = grounding.get("method")
+    kept = [
+        c for c in grounding.get("claims", [])
+        if claim_key(claim_sentence(c, method) or "") not in replaced
+    ]
+    return new_answer, revised, kept
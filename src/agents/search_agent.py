@@ -1,22 +1,41 @@
 import os
-import time
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
-from typing import TypedDict
-from src.search.semantic_search import search
+from typing import Optional, TypedDict
+from src.search.semantic_search import search, source_vectors, embed_queries
 from src.search.grounding import check_grounding
+from src.search.claim_verifier import ClaimVerifier, GROUNDING_MODE
+from src.search.context_packer import pack_context, grounding_sources
+from src.search.cache import normalize_query
+from src.search.diversity import MAX_PER_API, api_name, mmr_select, relevance_scores
+from src.search.similar_apis import similar_apis
 from src.metrics_db import log_agent_run
+from src.tracing import start_trace, traced, current_span
+from src.llm.client import chat_completion, stream_completion, openai_client
+from src.llm.structured import (
+    QueryType, Revisions, SubQueries, StructuredOutputError, structured_completion, summarize_claims,
+)
+from src.agents.telemetry import NODE_STEPS, step_summary, run_metrics
+from src.llm.model_policy import MODEL, FAST_MODEL, select_model, escalate
+from src.agents.memo import memoized_completion
+from src.agents.revision import REVISE_PROMPT, SENTENCE_METHOD, apply_revisions, revisable_claims
+from src.agents.query_classifier import get_classifier, LOCAL_MODEL_NAME, MIN_CONFIDENCE as CLASSIFIER_MIN_CONFIDENCE
 
 load_dotenv()
-client = OpenAI()
-MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2-chat-latest")
-FAST_MODEL = "gpt-5-nano"
-MID_MODEL = "gpt-5-mini"
+client = openai_client()
 
-GROUNDING_THRESHOLD = 0.0
-MAX_RETRIES = 0
+# Answers grounded below the threshold get refined queries and a revision of their
+# unsupported claims; requests can override both
+GROUNDING_THRESHOLD = float(os.getenv("AGENT_GROUNDING_THRESHOLD", "0.0"))
+MAX_RETRIES = int(os.getenv("AGENT_MAX_RETRIES", "1"))
+# Token budget for the sources a revision adds to the ones the answer already cites
+REVISE_CONTEXT_BUDGET = 1500
+# Sub-query results beyond this are thinned out by MMR before context packing
+MAX_AGENT_RESULTS = 10
+# A COMPARE query naming one API is compared against this many neighbours from the similar-APIs graph
+COMPARE_ALTERNATIVES = 3
+MAX_COMPARE_APIS = 4
 
 
 class AgentState(TypedDict):
@@ -24,104 +43,209 @@ class AgentState(TypedDict):
     query_type: str
     sub_queries: list
     all_results: list
+    context_results: list
     answer: str
     grounding: dict
-    trace: list
     retry_count: int
-
-
+    latency_slo_ms: Optional[int]
+    model_decision: dict
+    claim_verifier: Optional[ClaimVerifier]
+    grounding_threshold: float
+    max_retries: int
+    # Retrieval results of every pass, and the sub-queries already searched
+    candidates: list
+    searched: list
+    # Set by refine: the next generate revises the unsupported claims instead of starting over
+    revise: bool
+    # Verdicts carried over from the previous pass for claims a revision left alone,
+    # and the revised sentences that still need checking (None after a full generate)
+    kept_claims: list
+    revised_claims: Optional[list]
+
+
+@traced("classify")
 def classify_query(state: AgentState) -> AgentState:
-    _start = time.time()
+    # Confident local predictions skip the LLM round trip entirely
+    query_type, confidence = get_classifier().classify(state["query"])
+    current_span().set_attribute("confidence", round(confidence, 3))
+    if confidence >= CLASSIFIER_MIN_CONFIDENCE:
+        state["query_type"] = query_type
+        current_span().set_attributes({"result": query_type, "model": LOCAL_MODEL_NAME})
+        return state
+
     messages = [
         {"role": "system", "content": """Classify the user query into one of these types:
 - SIMPLE: Single straightforward question about one API or topic
 - COMPARE: Asks to compare multiple APIs or find the best option with multiple criteria
 - EXPLORE: Open-ended exploration of what's available
 
-Respond with ONLY the type in JSON: {"type": "SIMPLE"} or {"type": "COMPARE"} or {"type": "EXPLORE"}"""},
+Respond in JSON: {"type": "SIMPLE"}, {"type": "COMPARE"} or {"type": "EXPLORE"}"""},
         {"role": "user", "content": state["query"]},
     ]
 
-    response = client.chat.completions.create(model=FAST_MODEL, messages=messages)
-    raw = response.choices[0].message.content.strip()
-
     try:
-        clean = raw.replace("```json", "").replace("```", "").strip()
-        result = json.loads(clean)
-        query_type = result.get("type", "SIMPLE")
-    except json.JSONDecodeError:
-        query_type = "SIMPLE"
+        query_type = memoized_completion(
+            "classify", FAST_MODEL, messages, QueryType,
+            lambda: structured_completion(client, FAST_MODEL, messages, QueryType, step="classify"),
+        ).type
+    except StructuredOutputError as e:
+        # Fall back to the local prediction rather than a blind SIMPLE; the run
+        # is recorded as locally labeled so training never learns from it
+        print(f"Warning: {e}")
+        current_span().set_attributes({"fallback": True, "model": LOCAL_MODEL_NAME})
 
     state["query_type"] = query_type
-    _ms = round((time.time() - _start) * 1000)
-    state["trace"].append({"step": "classify", "result": query_type, "ms": _ms, "model": FAST_MODEL})
+    current_span().set_attribute("result", query_type)
     return state
 
 
+@traced("decompose")
 def decompose_query(state: AgentState) -> AgentState:
-    _start = time.time()
     if state["query_type"] == "SIMPLE":
         state["sub_queries"] = [state["query"]]
-        _ms = round((time.time() - _start) * 1000)
-        state["trace"].append({"step": "decompose", "result": "single query (simple)", "ms": _ms, "model": "none"})
+        current_span().set_attribute("result", "single query (simple)")
         return state
 
+    if state["query_type"] == "COMPARE":
+        # Named APIs (plus their precomputed neighbours) replace the decompose LLM call
+        names = similar_apis.mentioned_apis(state["query"])
+        if len(names) == 1:
+            names += [n["api_name"] for n in similar_apis.similar(names[0], COMPARE_ALTERNATIVES) or []]
+        if names:
+            names = names[:MAX_COMPARE_APIS]
+            state["sub_queries"] = [state["query"]] + [f"{name} API" for name in names]
+            current_span().set_attributes({"result": state["sub_queries"], "model": "similar-apis"})
+            return state
+
     messages = [
-        {"role": "system", "content": """Break this query into 2-3 short sub-queries for semantic search. Each sub-query must be under 8 words. Respond with ONLY a JSON array: ["sub query 1", "sub query 2"]"""},
+        {"role": "system", "content": """Break this query into 2-3 short sub-queries for semantic search. Each sub-query must be under 8 words. Respond in JSON: {"queries": ["sub query 1", "sub query 2"]}"""},
         {"role": "user", "content": state["query"]},
     ]
 
-    response = client.chat.completions.create(model=FAST_MODEL, messages=messages)
-    raw = response.choices[0].message.content.strip()
-
     try:
-        clean = raw.replace("```json", "").replace("```", "").strip()
-        sub_queries = json.loads(clean)
-    except json.JSONDecodeError:
+        sub_queries = memoized_completion(
+            "decompose", FAST_MODEL, messages, SubQueries,
+            lambda: structured_completion(client, FAST_MODEL, messages, SubQueries, step="decompose"),
+        ).queries
+    except StructuredOutputError as e:
+        print(f"Warning: {e}")
         sub_queries = [state["query"]]
 
     state["sub_queries"] = sub_queries
-    _ms = round((time.time() - _start) * 1000)
-    state["trace"].append({"step": "decompose", "result": sub_queries, "ms": _ms, "model": FAST_MODEL})
+    current_span().set_attribute("result", sub_queries)
     return state
 
 
+def result_key(result):
+    return result.get("id", result["text"][:100])
+
+
+@traced("retrieve")
 def retrieve(state: AgentState) -> AgentState:
-    _start = time.time()
-    all_results = []
-    seen = set()
-
-    for sq in state["sub_queries"]:
-        results = search(sq, top_k=5)
-        for r in results:
-            key = r["text"][:100]
-            if key not in seen:
-                seen.add(key)
-                all_results.append(r)
+    # Refined queries extend the earlier passes' candidates instead of replacing them
+    merged = {result_key(r): r for r in state["candidates"]}
+    searched = set(state["searched"])
+    new_queries = [sq for sq in state["sub_queries"] if normalize_query(sq) not in searched]
+    for sq in new_queries:
+        for r in search(sq, top_k=5):
+            # The same chunk can come back for several sub-queries
+            merged.setdefault(result_key(r), r)
+    candidates = list(merged.values())
+    state["candidates"] = candidates
+    state["searched"] = state["searched"] + [normalize_query(sq) for sq in new_queries]
+
+    all_results = candidates
+    if len(candidates) > MAX_AGENT_RESULTS:
+        picked = mmr_select(
+            relevance_scores(candidates), source_vectors(candidates), MAX_AGENT_RESULTS,
+            groups=[api_name(r) for r in candidates], max_per_group=MAX_PER_API,
+        )
+        all_results = [candidates[i] for i in picked]
 
     state["all_results"] = all_results
-    _ms = round((time.time() - _start) * 1000)
-    state["trace"].append({
-        "step": "retrieve",
-        "sub_queries": len(state["sub_queries"]),
+    current_span().set_attributes({
+        "sub_queries": len(new_queries),
+        "candidates": len(candidates),
         "total_results": len(all_results),
-        "ms": _ms,
+        "retry": state["retry_count"],
+    })
+    return state
+
+
+def revise_answer(state: AgentState, unsupported) -> Optional[AgentState]:
+    """Rewrite only the unsupported answer sentences, with the sources found since the last pass.
+
+    unsupported comes from revisable_claims(). Returns None when no revision matched a sentence of the answer; the
+    caller then regenerates the whole answer.
+    """
+    previous = state["context_results"]
+    cited = {result_key(r) for r in previous}
+    new_results = [r for r in state["all_results"] if result_key(r) not in cited]
+    # New sources are numbered after the old ones so the answer's citations stay valid
+    context, packed, packing = pack_context(
+        state["query"], new_results, token_budget=REVISE_CONTEXT_BUDGET,
+        include_score=False, first_source=len(previous) + 1,
+    )
+
+    messages = [
+        {"role": "system", "content": REVISE_PROMPT},
+        {"role": "user", "content": (
+            f"Search results:\n{context or '(no new results)'}\n\n"
+            f"User question: {state['query']}\n\n"
+            f"Previous answer:\n{state['answer']}\n\n"
+            f"Unsupported claims:\n{json.dumps(unsupported)}"
+        )},
+    ]
+    decision = state["model_decision"]
+    try:
+        revisions = structured_completion(client, decision["model"], messages, Revisions, step="revise").revisions
+    except StructuredOutputError as e:
+        print(f"Warning: {e}")
+        revisions = []
+
+    applied = apply_revisions(state["answer"], state["grounding"], revisions)
+    if applied is None:
+        current_span().set_attributes({"revision": False, "unsupported_claims": len(unsupported)})
+        return None
+    # Verdicts stand for every claim except the ones the revision replaced or dropped
+    state["answer"], revised, state["kept_claims"] = applied
+    state["context_results"] = previous + packed
+    verifier = None
+    if GROUNDING_MODE == "incremental":
+        verifier = ClaimVerifier(state["context_results"], source_vectors(state["context_results"]), embed_queries)
+        for sentence in revised:
+            verifier.add_claim(sentence)
+    state["claim_verifier"] = verifier
+    state["revised_claims"] = revised
+
+    current_span().set_attributes({
+        "revision": True,
+        "unsupported_claims": len(unsupported),
+        "revised_claims": len(revised),
+        "dropped_claims": sum(1 for r in revisions if not r.revised.strip()),
+        "new_sources": len(packed),
+        "context_tokens": packing["context_packed"],
+        "retry": state["retry_count"],
+        "model.tier": decision["tier"],
     })
     return state
 
 
+@traced("generate")
 def generate(state: AgentState) -> AgentState:
-    _start = time.time()
-    context_parts = []
-    for i, r in enumerate(state["all_results"][:10]):
-        meta = r["metadata"]
-        part = f"[Source {i+1}] API: {meta['api_name']}\n"
-        if meta.get("type") == "endpoint":
-            part += f"Endpoint: {meta.get('method', '')} {meta.get('path', '')}\n"
-        part += f"Content: {r['text']}\n"
-        context_parts.append(part)
-
-    context = "\n---\n".join(context_parts)
+    if state["revise"]:
+        state["revise"] = False
+        # The answer sentences behind the unsupported verdicts (both grounding modes name them)
+        unsupported = revisable_claims(state["grounding"])
+        if unsupported and state["answer"] and state["model_decision"]:
+            revised_state = revise_answer(state, unsupported)
+            if revised_state is not None:
+                return revised_state
+
+    state["kept_claims"] = []
+    state["revised_claims"] = None
+    context, packed, packing = pack_context(state["query"], state["all_results"], include_score=False)
+    state["context_results"] = packed
 
     system = """You are API Universe, an AI-powered API discovery assistant.
 Rules:
@@ -144,32 +268,64 @@ Do NOT include source numbers, endpoints, or URLs in the table. Keep it scannabl
         {"role": "user", "content": f"Search results:\n{context}\n\nUser question: {state['query']}"},
     ]
 
-    response = client.chat.completions.create(model=MODEL, messages=messages, max_completion_tokens=400)
-    state["answer"] = response.choices[0].message.content
-    _ms = round((time.time() - _start) * 1000)
-    state["trace"].append({"step": "generate", "tokens": response.usage.completion_tokens, "ms": _ms, "model": MODEL})
+    # An escalation (or an earlier pass before a refine) has already fixed the tier
+    decision = state["model_decision"] or select_model(
+        state["query_type"], packing["context_packed"], state["latency_slo_ms"]
+    )
+    state["model_decision"] = decision
+
+    if GROUNDING_MODE == "incremental":
+        # Claims are checked as sentences stream in; verify only waits for the stragglers
+        verifier = ClaimVerifier(packed, source_vectors(packed), embed_queries)
+        state["answer"], _ = stream_completion(
+            client, decision["model"], messages, verifier.add_text, max_completion_tokens=400
+        )
+        state["claim_verifier"] = verifier
+    else:
+        response = chat_completion(client, decision["model"], messages, max_completion_tokens=400)
+        state["answer"] = response.choices[0].message.content
+    current_span().set_attributes({
+        "context_tokens": packing["context_packed"],
+        "context_saved": packing["context_saved"],
+        "retry": state["retry_count"],
+        "model.tier": decision["tier"],
+        "model.reason": decision["reason"],
+        "model.escalations": decision["escalations"],
+    })
     return state
 
 
+@traced("verify")
 def verify(state: AgentState) -> AgentState:
-    _start = time.time()
-    sources = [
-        {"api_name": r["metadata"]["api_name"], "text": r["text"][:200]}
-        for r in state["all_results"][:10]
-    ]
-
-    grounding = check_grounding(state["answer"], sources)
+    revised = state["revised_claims"]
+    method = "llm"
+    if state["claim_verifier"] is not None:
+        grounding = state["claim_verifier"].finish()
+        state["claim_verifier"] = None
+        method = SENTENCE_METHOD
+        current_span().set_attribute("model", SENTENCE_METHOD)
+    elif revised is not None:
+        # After a revision only the rewritten sentences are new
+        grounding = (check_grounding(" ".join(revised), grounding_sources(state["context_results"]))
+                     if revised else summarize_claims([]))
+    else:
+        grounding = check_grounding(state["answer"], grounding_sources(state["context_results"]))
+    if revised is not None:
+        # After a revision only the rewritten sentences were verified again
+        grounding = summarize_claims(state["kept_claims"] + grounding.get("claims", []))
+        current_span().set_attributes({"reverified_claims": len(revised), "kept_claims": len(state["kept_claims"])})
     state["grounding"] = {
         "score": grounding.get("grounding_score", 0),
         "supported": grounding.get("supported_count", 0),
         "total": grounding.get("total_count", 0),
         "claims": grounding.get("claims", []),
+        "method": method,
     }
-    _ms = round((time.time() - _start) * 1000)
-    state["trace"].append({"step": "verify", "grounding_score": state["grounding"]["score"], "ms": _ms, "model": MODEL})
+    current_span().set_attributes({"grounding_score": state["grounding"]["score"], "retry": state["retry_count"]})
     return state
 
 
+@traced("refine")
 def refine_query(state: AgentState) -> AgentState:
     """Refine the query when grounding is low."""
     state["retry_count"] += 1
@@ -182,33 +338,46 @@ def refine_query(state: AgentState) -> AgentState:
     messages = [
         {"role": "system", "content": """The previous search didn't return well-grounded results.
 Based on the unsupported claims, generate 2-3 refined search queries that might find better sources.
-Respond with ONLY a JSON array: ["refined query 1", "refined query 2"]"""},
+Respond in JSON: {"queries": ["refined query 1", "refined query 2"]}"""},
         {"role": "user", "content": f"Original query: {state['query']}\nUnsupported claims: {json.dumps(unsupported)}"},
     ]
 
-    response = client.chat.completions.create(model=MODEL, messages=messages)
-    raw = response.choices[0].message.content.strip()
-
     try:
-        clean = raw.replace("```json", "").replace("```", "").strip()
-        refined = json.loads(clean)
-    except json.JSONDecodeError:
+        refined = memoized_completion(
+            "refine", MODEL, messages, SubQueries,
+            lambda: structured_completion(client, MODEL, messages, SubQueries, step="refine"),
+        ).queries
+    except StructuredOutputError as e:
+        print(f"Warning: {e}")
         refined = [state["query"]]
 
     state["sub_queries"] = refined
-    state["trace"].append({
-        "step": "refine",
-        "reason": f"grounding score {state['grounding']['score']} below threshold {GROUNDING_THRESHOLD}",
+    state["revise"] = True
+    current_span().set_attributes({
+        "reason": f"grounding score {state['grounding']['score']} below threshold {state['grounding_threshold']}",
         "refined_queries": refined,
         "retry": state["retry_count"],
     })
     return state
 
 
+@traced("escalate")
+def escalate_model(state: AgentState) -> AgentState:
+    """Move generation one model tier up; the next generate pass reuses the packed context."""
+    state["model_decision"] = escalate(state["model_decision"], state["grounding"].get("score", 0))
+    current_span().set_attributes({
+        "model.tier": state["model_decision"]["tier"],
+        "model.reason": state["model_decision"]["reason"],
+    })
+    return state
+
+
 def should_retry(state: AgentState) -> str:
-    """Decide whether to retry or finish."""
+    """Decide whether to escalate the model, retry retrieval or finish."""
     score = state["grounding"].get("score", 0)
-    if score < GROUNDING_THRESHOLD and state["retry_count"] < MAX_RETRIES:
+    if state["model_decision"] and escalate(state["model_decision"], score) is not None:
+        return "escalate"
+    if score < state["grounding_threshold"] and state["retry_count"] < state["max_retries"]:
         return "refine"
     return "end"
 
@@ -221,59 +390,56 @@ workflow.add_node("retrieve", retrieve)
 workflow.add_node("generate", generate)
 workflow.add_node("verify", verify)
 workflow.add_node("refine", refine_query)
+workflow.add_node("escalate", escalate_model)
 
 workflow.set_entry_point("classify")
 workflow.add_edge("classify", "decompose")
 workflow.add_edge("decompose", "retrieve")
 workflow.add_edge("retrieve", "generate")
 workflow.add_edge("generate", "verify")
-workflow.add_conditional_edges("verify", should_retry, {"refine": "refine", "end": END})
+workflow.add_conditional_edges(
+    "verify", should_retry, {"escalate": "escalate", "refine": "refine", "end": END}
+)
+workflow.add_edge("escalate", "generate")
 workflow.add_edge("refine", "retrieve")
 
 agent = workflow.compile()
 
 
-def run_agent(query: str) -> dict:
+def run_agent(
+    query: str,
+    latency_slo_ms: Optional[int] = None,
+    grounding_threshold: Optional[float] = None,
+    max_retries: Optional[int] = None,
+) -> dict:
     initial_state = {
         "query": query,
         "query_type": "",
         "sub_queries": [],
         "all_results": [],
+        "context_results": [],
         "answer": "",
         "grounding": {},
-        "trace": [],
         "retry_count": 0,
+        "latency_slo_ms": latency_slo_ms,
+        "model_decision": {},
+        "claim_verifier": None,
+        "grounding_threshold": GROUNDING_THRESHOLD if grounding_threshold is None else grounding_threshold,
+        "max_retries": MAX_RETRIES if max_retries is None else max_retries,
+        "candidates": [],
+        "searched": [],
+        "revise": False,
+        "kept_claims": [],
+        "revised_claims": None,
     }
 
-    result = agent.invoke(initial_state)
+    with start_trace("agent", **{"agent.query": query}) as root:
+        result = agent.invoke(initial_state)
+        root.set_attributes({"agent.query_type": result["query_type"], "agent.retries": result["retry_count"]})
 
     # Log to SQLite
-    trace = result["trace"]
-    def _get_trace(step_name, field, default=0):
-        for t in trace:
-            if t["step"] == step_name:
-                return t.get(field, default)
-        return default
-
     try:
-        log_agent_run({
-            "query": result["query"],
-            "query_type": result["query_type"],
-            "latency_ms": 0,  # will be set by the API layer
-            "grounding_score": result["grounding"].get("score", 0),
-            "tokens": _get_trace("generate", "tokens", 0),
-            "classify_model": _get_trace("classify", "model", ""),
-            "classify_ms": _get_trace("classify", "ms", 0),
-            "decompose_model": _get_trace("decompose", "model", ""),
-            "decompose_ms": _get_trace("decompose", "ms", 0),
-            "retrieve_ms": _get_trace("retrieve", "ms", 0),
-            "retrieve_count": _get_trace("retrieve", "total_results", 0),
-            "generate_model": _get_trace("generate", "model", ""),
-            "generate_ms": _get_trace("generate", "ms", 0),
-            "generate_tokens": _get_trace("generate", "tokens", 0),
-            "verify_model": _get_trace("verify", "model", ""),
-            "verify_ms": _get_trace("verify", "ms", 0),
-        })
+        log_agent_run(run_metrics(root, result))
     except Exception as e:
         print(f"Warning: failed to log metrics: {e}")
 
@@ -282,15 +448,17 @@ def run_agent(query: str) -> dict:
         "query_type": result["query_type"],
         "answer": result["answer"],
         "grounding": result["grounding"],
-        "trace": result["trace"],
+        "trace": [step_summary(node) for node in root.children if node.name in NODE_STEPS],
+        "trace_id": root.trace_id,
         "retries": result["retry_count"],
+        "model": result["model_decision"],
         "sources": [
             {
                 "api_name": r["metadata"]["api_name"],
                 "score": r["score"],
                 "type": r["metadata"]["type"],
             }
-            for r in result["all_results"][:10]
+            for r in result["context_results"]
         ],
     }
 
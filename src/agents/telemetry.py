@@ -0,0 +1,57 @@
+"""Agent-run summaries derived from the run's span tree."""
+
+NODE_STEPS = ("classify", "decompose", "retrieve", "generate", "verify", "escalate", "refine")
+
+
+def step_summary(node):
+    """Flatten a node span (and its LLM call, if any) into the trace entry returned to clients."""
+    step = {"step": node.name, "ms": round(node.duration_ms), **node.attributes}
+    llm = node.find("llm.chat")
+    if llm is not None:
+        if not node.attributes.get("fallback"):
+            step["model"] = llm.attributes.get("llm.model")
+        step["tokens"] = llm.attributes.get("llm.usage.completion_tokens", 0)
+        step["prompt_tokens"] = llm.attributes.get("llm.usage.prompt_tokens", 0)
+    return step
+
+
+def run_metrics(root, result):
+    """agent_runs row for one run, read straight off the span tree."""
+    def model(step):
+        # The last pass is the one whose output was kept (after escalations/refines)
+        nodes = root.find_all(step)
+        if not nodes:
+            return "none"
+        llm = nodes[-1].find("llm.chat")
+        # A step that fell back after a failed LLM call kept its local result
+        if llm is None or nodes[-1].attributes.get("fallback"):
+            return nodes[-1].attributes.get("model", "none")
+        return llm.attributes.get("llm.model", "")
+
+    def tokens(step):
+        return sum(s.attributes.get("llm.usage.completion_tokens", 0)
+                   for node in root.find_all(step) for s in node.find_all("llm.chat"))
+
+    retrieve = root.find_all("retrieve")
+    decision = result.get("model_decision") or {}
+    return {
+        "query": result["query"],
+        "query_type": result["query_type"],
+        "latency_ms": round(root.duration_ms),
+        "grounding_score": result["grounding"].get("score", 0),
+        "tokens": tokens("generate"),
+        "classify_model": model("classify"),
+        "classify_ms": round(root.total_ms("classify")),
+        "decompose_model": model("decompose"),
+        "decompose_ms": round(root.total_ms("decompose")),
+        "retrieve_ms": round(root.total_ms("retrieve")),
+        "retrieve_count": retrieve[-1].attributes.get("total_results", 0) if retrieve else 0,
+        "generate_model": model("generate"),
+        "generate_ms": round(root.total_ms("generate")),
+        "generate_tokens": tokens("generate"),
+        "verify_model": model("verify"),
+        "verify_ms": round(root.total_ms("verify")),
+        "model_tier": decision.get("tier", ""),
+        "model_reason": decision.get("reason", ""),
+        "escalations": decision.get("escalations", 0),
+    }
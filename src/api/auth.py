@@ -10,6 +10,9 @@ load_dotenv()
 SECRET_KEY = os.getenv("JWT_SECRET", "api-universe-dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
+# Users allowed to call /admin endpoints. Empty by default: /token mints a token for
+# any user_id, so no name is an admin until an operator lists it here
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
 
 security = HTTPBearer()
 
@@ -35,4 +38,16 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
             raise HTTPException(status_code=401, detail="Invalid token")
         return user_id
     except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+
+def is_admin(user_id):
+    return user_id in ADMIN_USERS
+
+
+def verify_admin(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """FastAPI dependency: a valid token whose user is in ADMIN_USERS."""
+    user_id = verify_token(credentials)
+    if not is_admin(user_id):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_id
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DIR = "data/jobs"
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "256"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+MAX_JOB_QUERIES = 200000
+# Uploads are read as a stream and rejected once they pass this size
+MAX_JOB_BYTES = int(os.getenv("JOB_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_JOB_TOP_K = 50
+# Finished jobs and their result files are removed this long after they finish
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "86400"))
+
+jobs = {}
+_lock = threading.Lock()
+# Bulk jobs share one small pool so nightly pipelines can't starve interactive traffic
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="search-job")
+
+
+class JobInputError(ValueError):
+    pass
+
+
+class JobTooLargeError(JobInputError):
+    pass
+
+
+def _parse_line(line, line_no, count):
+    """The {"id", "query"} item of one JSONL line (None for a blank line); count is the queries so far."""
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise JobInputError(f"line {line_no}: invalid JSON ({e.msg})")
+    if isinstance(item, str):
+        item = {"query": item}
+    if not isinstance(item, dict) or not isinstance(item.get("query"), str) or not item["query"].strip():
+        raise JobInputError(f'line {line_no}: expected {{"query": "..."}}')
+    return {"id": item.get("id", count), "query": item["query"]}
+
+
+class QueryStream:
+    """Parse a JSONL upload chunk by chunk, stopping as soon as it passes MAX_JOB_BYTES or MAX_JOB_QUERIES."""
+
+    def __init__(self, max_bytes=None, max_queries=None):
+        self.max_bytes = MAX_JOB_BYTES if max_bytes is None else max_bytes
+        self.max_queries = MAX_JOB_QUERIES if max_queries is None else max_queries
+        self.queries = []
+        self._buffer = b""
+        self._bytes = 0
+        self._line_no = 0
+
+    def feed(self, chunk):
+        self._bytes += len(chunk)
+        if self._bytes > self.max_bytes:
+            raise JobTooLargeError(f"request body too large (> {self.max_bytes} bytes)")
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        for line in lines:
+            self._add(line)
+        return self
+
+    def _add(self, line):
+        self._line_no += 1
+        try:
+            text = line.decode("utf-8")
+        except UnicodeDecodeError:
+            raise JobInputError(f"line {self._line_no}: not UTF-8")
+        item = _parse_line(text, self._line_no, len(self.queries))
+        if item is None:
+            return
+        if len(self.queries) == self.max_queries:
+            raise JobTooLargeError(f"too many queries (> {self.max_queries})")
+        self.queries.append(item)
+
+    def finish(self):
+        if self._buffer:
+            self._add(self._buffer)
+            self._buffer = b""
+        if not self.queries:
+            raise JobInputError("no queries in request body")
+        return self.queries
+
+
+def parse_queries(body):
+    """Parse a JSONL body: one {"query": ..., "id": optional} object per line."""
+    return QueryStream().feed(body.encode("utf-8")).finish()
+
+
+def _default_search_batch(queries, **kwargs):
+    from src.search.semantic_search import search_batch
+    return search_batch(queries, **kwargs)
+
+
+def _progress(job):
+    elapsed = (job["finished_at"] or time.time()) - job["started_at"] if job["started_at"] else 0
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "total": job["total"],
+        "processed": job["processed"],
+        "progress": round(job["processed"] / job["total"], 4) if job["total"] else 0,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_qps": round(job["processed"] / elapsed, 2) if elapsed > 0 else 0,
+        "created_at": job["created_at"],
+        "error": job["error"],
+    }
+
+
+def _run_job(job, queries, search_fn):
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    tmp_path = job["output_path"] + ".tmp"
+    try:
+        with open(tmp_path, "w") as out:
+            for start in range(0, len(queries), JOB_BATCH_SIZE):
+                batch = queries[start:start + JOB_BATCH_SIZE]
+                results = search_fn(
+                    [q["query"] for q in batch],
+                    top_k=job["top_k"],
+                    use_reranker=job["use_reranker"],
+                    filters=job["filters"],
+                )
+                for q, r in zip(batch, results):
+                    out.write(json.dumps({"id": q["id"], "query": q["query"], "results": r}) + "\n")
+                job["processed"] += len(batch)
+        os.replace(tmp_path, job["output_path"])
+        job["status"] = "completed"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+        print(f"Warning: search job {job['id']} failed: {e}")
+    finally:
+        job["finished_at"] = time.time()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_jobs(ttl=None, now=None):
+    """Forget jobs finished more than ttl seconds ago and delete their output files.
+
+    Files in JOBS_DIR older than ttl that no job owns (left by an earlier
+    process) are deleted as well. Returns the number of jobs removed.
+    """
+    ttl = JOB_TTL_SECONDS if ttl is None else ttl
+    now = time.time() if now is None else now
+    with _lock:
+        expired = [j for j in jobs.values() if j["finished_at"] is not None and now - j["finished_at"] > ttl]
+        for job in expired:
+            del jobs[job["id"]]
+        owned = {j["output_path"] for j in jobs.values()}
+    for job in expired:
+        _remove(job["output_path"])
+
+    try:
+        names = os.listdir(JOBS_DIR)
+    except FileNotFoundError:
+        return len(expired)
+    for name in names:
+        path = os.path.join(JOBS_DIR, name)
+        if path in owned or path.removesuffix(".tmp") in owned:
+            continue
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                _remove(path)
+        except OSError:
+            pass
+    return len(expired)
+
+
+def create_job(queries, user_id, top_k=5, use_reranker=True, filters=None, search_fn=None):
+    """Queue a bulk search job and return its initial status."""
+    if not 1 <= top_k <= MAX_JOB_TOP_K:
+        raise JobInputError(f"top_k must be between 1 and {MAX_JOB_TOP_K}")
+    sweep_jobs()
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "user": user_id,
+        "status": "queued",
+        "total": len(queries),
+        "processed": 0,
+        "top_k": top_k,
+        "use_reranker": use_reranker,
+        "filters": filters,
+        "output_path": os.path.join(JOBS_DIR, f"{job_id}.jsonl"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "started_at": None,
+        "finished_at": None,
+        "error": None,
+    }
+    with _lock:
+        jobs[job_id] = job
+    _executor.submit(_run_job, job, queries, search_fn or _default_search_batch)
+    return _progress(job)
+
+
+def get_job(job_id, user_id):
+    """The job record if it exists, belongs to user_id and has not expired."""
+    sweep_jobs()
+    job = jobs.get(job_id)
+    if job is None or job["user"] != user_id:
+        return None
+    return job
+
+
+def job_status(job):
+    return _progress(job)
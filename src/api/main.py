@@ -1,14 +1,24 @@
 import os
 import time
-from fastapi import FastAPI, Depends
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from src.search.semantic_search import search
+from src.search.semantic_search import cached_search, result_cache
 from src.search.rag import ask
 from src.agents.search_agent import run_agent
-from src.metrics_db import get_db, get_metrics
+from src.metrics_db import get_metrics, log_search_query
+from src.search.adaptive_rerank import rerank_stats
+from src.search.similar_apis import SIMILAR_K, similar_apis
+from src.search.suggest import KINDS, MAX_SUGGESTIONS, suggester
 from src.llm.router import router as llm_router
-from src.api.auth import create_token, verify_token
+from src.api.auth import create_token, is_admin, verify_admin, verify_token
+from src.agents.memo import get_store as get_memo_store
+from src.api.jobs import (
+    MAX_JOB_BYTES, MAX_JOB_TOP_K, create_job, get_job, job_status, QueryStream, JobInputError, JobTooLargeError,
+)
+from src.timing import collect_timings, maybe_profile, profile_requested, rounded
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
@@ -34,15 +44,29 @@ query_log = []
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    use_reranker: bool = True
+    filters: Optional[dict] = None
+    include_timings: bool = False
+    # Result diversity: dedupe (one hit per API), cap (max_per_api per API) or mmr
+    diversity: Optional[Literal["dedupe", "cap", "mmr"]] = None
+    mmr_lambda: Optional[float] = Field(None, ge=0, le=1)
+    max_per_api: Optional[int] = Field(None, ge=1)
 
 
 class AskRequest(BaseModel):
     query: str
     top_k: int = 5
+    include_timings: bool = False
+    latency_slo_ms: Optional[int] = None
 
 
 class AgentRequest(BaseModel):
     query: str
+    include_timings: bool = False
+    latency_slo_ms: Optional[int] = None
+    # Refine and revise answers grounded below this score (defaults: AGENT_GROUNDING_THRESHOLD/AGENT_MAX_RETRIES)
+    grounding_threshold: Optional[float] = Field(None, ge=0, le=1)
+    max_retries: Optional[int] = Field(None, ge=0, le=3)
 
 
 class TokenRequest(BaseModel):
@@ -60,6 +84,17 @@ def log_query(query, endpoint, latency_ms, grounding_score=None):
     # Keep only last 1000 entries
     if len(query_log) > 1000:
         query_log.pop(0)
+    # Counted in memory and flushed in the background; the counts rank /suggest completions
+    log_search_query(query)
+
+
+def add_diagnostics(response, request, timings, profile):
+    """Attach the span breakdown (if asked for) and the saved profile's file name (if one was kept)."""
+    if request.include_timings:
+        response["timings"] = rounded(timings)
+    if profile.get("profile"):
+        response["profile"] = os.path.basename(profile["profile"])
+    return response
 
 
 @app.get("/health")
@@ -74,26 +109,45 @@ def get_token(request: TokenRequest):
 
 
 @app.post("/search")
-def search_endpoint(request: SearchRequest, user_id: str = Depends(verify_token)):
+def search_endpoint(
+    request: SearchRequest,
+    user_id: str = Depends(verify_token),
+    x_profile: Optional[str] = Header(None),
+):
     start = time.time()
-    results = search(request.query, top_k=request.top_k)
-    latency = round((time.time() - start) * 1000)
+    with collect_timings() as timings, maybe_profile("/search", profile_requested(x_profile, is_admin(user_id))) as profile:
+        results, cache_info = cached_search(
+            request.query,
+            top_k=request.top_k,
+            use_reranker=request.use_reranker,
+            filters=request.filters,
+            diversity=request.diversity,
+            mmr_lambda=request.mmr_lambda,
+            max_per_api=request.max_per_api,
+        )
+    latency = round((time.time() - start) * 1000, 3)
 
     log_query(request.query, "/search", latency)
 
-    return {
+    return add_diagnostics({
         "query": request.query,
         "user": user_id,
         "results": results,
         "count": len(results),
         "latency_ms": latency,
-    }
+        "cache": cache_info,
+    }, request, timings, profile)
 
 
 @app.post("/ask")
-def ask_endpoint(request: AskRequest, user_id: str = Depends(verify_token)):
+def ask_endpoint(
+    request: AskRequest,
+    user_id: str = Depends(verify_token),
+    x_profile: Optional[str] = Header(None),
+):
     start = time.time()
-    result = ask(request.query, top_k=request.top_k)
+    with collect_timings() as timings, maybe_profile("/ask", profile_requested(x_profile, is_admin(user_id))) as profile:
+        result = ask(request.query, top_k=request.top_k, latency_slo_ms=request.latency_slo_ms)
     latency = round((time.time() - start) * 1000)
 
     grounding_score = result.get("grounding", {}).get("score")
@@ -101,13 +155,23 @@ def ask_endpoint(request: AskRequest, user_id: str = Depends(verify_token)):
 
     result["user"] = user_id
     result["latency_ms"] = latency
-    return result
+    return add_diagnostics(result, request, timings, profile)
 
 
 @app.post("/agent")
-def agent_endpoint(request: AgentRequest, user_id: str = Depends(verify_token)):
+def agent_endpoint(
+    request: AgentRequest,
+    user_id: str = Depends(verify_token),
+    x_profile: Optional[str] = Header(None),
+):
     start = time.time()
-    result = run_agent(request.query)
+    with collect_timings() as timings, maybe_profile("/agent", profile_requested(x_profile, is_admin(user_id))) as profile:
+        result = run_agent(
+            request.query,
+            latency_slo_ms=request.latency_slo_ms,
+            grounding_threshold=request.grounding_threshold,
+            max_retries=request.max_retries,
+        )
     latency = round((time.time() - start) * 1000)
 
     grounding_score = result.get("grounding", {}).get("score")
@@ -116,22 +180,108 @@ def agent_endpoint(request: AgentRequest, user_id: str = Depends(verify_token)):
     result["user"] = user_id
     result["latency_ms"] = latency
 
-    # Update the latency in SQLite (agent logged 0, we have the real total)
-    try:
-        conn = get_db()
-        conn.execute(
-            "UPDATE agent_runs SET latency_ms = ? WHERE id = (SELECT MAX(id) FROM agent_runs)",
-            (latency,)
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Warning: failed to update latency in DB: {e}")
+    return add_diagnostics(result, request, timings, profile)
 
-    return result
+
+@app.get("/suggest")
+def suggest_endpoint(
+    q: str,
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+    kind: Optional[List[Literal[KINDS]]] = Query(None),
+    user_id: str = Depends(verify_token),
+):
+    """Prefix completions for API titles, endpoints and tags (no embedding or LLM calls)."""
+    start = time.perf_counter()
+    suggestions = suggester.suggest(q, limit=limit, kinds=kind)
+    return {
+        "query": q,
+        "suggestions": suggestions,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+@app.get("/similar/{api_name}")
+def similar_endpoint(
+    api_name: str,
+    k: int = Query(10, ge=1, le=SIMILAR_K),
+    user_id: str = Depends(verify_token),
+):
+    """Nearest APIs from the precomputed neighbour graph (no embedding or LLM calls)."""
+    start = time.perf_counter()
+    neighbours = similar_apis.similar(api_name, k)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail=f"Unknown API: {api_name}")
+    return {
+        "api_name": similar_apis.lookup(api_name),
+        "similar": neighbours,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
 
 
 @app.get("/metrics")
 def metrics(user_id: str = Depends(verify_token)):
-    """Observability dashboard data from SQLite."""
-    return get_metrics()
\ No newline at end of file
+    """Observability dashboard data from SQLite, plus this worker's rerank path counts and search cache stats."""
+    return {**get_metrics(), "rerank": rerank_stats(), "search_cache": result_cache.get_stats()}
+
+
+@app.get("/admin/memo")
+def memo_inspect(
+    step: Optional[Literal["classify", "decompose", "refine"]] = None,
+    limit: int = Query(20, ge=0, le=500),
+    user_id: str = Depends(verify_admin),
+):
+    """Agent memo store size per step and its most recently used entries."""
+    store = get_memo_store()
+    return {**store.stats(), "recent": store.entries(step, limit)}
+
+
+@app.delete("/admin/memo")
+def memo_flush(
+    step: Optional[Literal["classify", "decompose", "refine"]] = None,
+    user_id: str = Depends(verify_admin),
+):
+    """Drop memoized agent steps (all of them, or one step's)."""
+    return {"removed": get_memo_store().flush(step), "step": step}
+
+
+@app.post("/jobs/search")
+async def create_search_job(
+    request: Request,
+    top_k: int = Query(5, ge=1, le=MAX_JOB_TOP_K),
+    use_reranker: bool = True,
+    user_id: str = Depends(verify_token),
+):
+    """Bulk search: POST a JSONL body of {"query": ...} lines, poll the returned job."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_JOB_BYTES:
+        raise HTTPException(status_code=413, detail=f"request body too large (> {MAX_JOB_BYTES} bytes)")
+    # Streamed, so an oversized upload is rejected without reading the rest of it
+    stream = QueryStream()
+    try:
+        async for chunk in request.stream():
+            stream.feed(chunk)
+        queries = stream.finish()
+    except JobTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except JobInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return create_job(queries, user_id, top_k=top_k, use_reranker=use_reranker)
+
+
+@app.get("/jobs/{job_id}")
+def search_job_status(job_id: str, user_id: str = Depends(verify_token)):
+    job = get_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/results")
+def search_job_results(job_id: str, user_id: str = Depends(verify_token)):
+    job = get_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(job["output_path"], media_type="application/x-ndjson",
+                        filename=f"{job_id}.jsonl")
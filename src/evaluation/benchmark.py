@@ -0,0 +1,530 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import faiss
+from src.evaluation.eval import load_golden_dataset, precision_at_k, hit_at_k
+from src.evaluation.metrics import percentiles
+from src.search.vector_store import INDEX_TYPES, make_index
+from src.llm.embeddings import HashEmbeddingProvider
+from src.timing import collect_timings, span
+from src.search.adaptive_rerank import PATHS, RERANK_MODE, RERANK_MODES, rerank_stats, reset_stats
+from src.search.diversity import DIVERSITY_MODE, DIVERSITY_MODES
+
+BENCHMARK_RESULTS_PATH = "data/processed/benchmark_results.json"
+BASELINE_PATH = "data/processed/benchmark_baseline.json"
+QUERY_EMBEDDINGS_PATH = "data/processed/query_embeddings.npz"
+PARSE_BENCHMARK_PATH = "data/processed/parse_benchmark.json"
+
+# Span names recorded by semantic_search.search(), plus the whole query
+STAGES = ("embed", "faiss", "hydrate", "rerank", "diversify", "total")
+DEFAULT_CLIENTS = (1, 4, 8)
+DEFAULT_MULTIPLIERS = (2, 5, 10)
+DEFAULT_TOLERANCE = 0.2
+STORE_RECALL_K = 50
+DEFAULT_STORE_FILTERS = {"type": "endpoint"}
+
+
+def load_query_cache(path=QUERY_EMBEDDINGS_PATH):
+    if not os.path.exists(path):
+        return {}
+    data = np.load(path)
+    return {str(q): v.reshape(1, -1) for q, v in zip(data["queries"], data["vectors"])}
+
+
+def save_query_cache(cache, path=QUERY_EMBEDDINGS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    queries = sorted(cache)
+    vectors = np.concatenate([cache[q] for q in queries]).astype("float32")
+    np.savez(path, queries=np.array(queries), vectors=vectors)
+
+
+def make_embedder(queries, dimension, mode="cached"):
+    """Return a query -> embedding function for the given mode.
+
+    stub:   hash-seeded random vectors, fully offline (latency numbers only)
+    cached: embeddings recorded by a previous live run, offline and quality-preserving
+    live:   call the embeddings API on every query and refresh the cache
+    """
+    if mode == "stub":
+        provider = HashEmbeddingProvider(dimension=dimension)
+        return lambda q: provider.embed([q])
+
+    from src.search.semantic_search import embed_query
+
+    cache = load_query_cache()
+    if mode == "live":
+        def embed_live(q):
+            cache[q] = embed_query(q)
+            return cache[q]
+        embed_live.cache = cache
+        return embed_live
+
+    missing = [q for q in queries if q not in cache]
+    if missing:
+        raise RuntimeError(
+            f"{len(missing)} queries missing from {QUERY_EMBEDDINGS_PATH}; "
+            "run once with --embeddings live to record them"
+        )
+    return lambda q: cache[q]
+
+
+def stage_timings(spans, total_ms):
+    """{stage: ms} from a collect_timings() breakdown; spans nested deeper than a stage are part of it."""
+    timings = {stage: 0.0 for stage in STAGES}
+    for key, ms in spans.items():
+        path = key.split("/")
+        if path[0] == "search":
+            path = path[1:]
+        if len(path) == 1 and path[0] in timings:
+            timings[path[0]] += ms
+    timings["total"] = total_ms
+    return timings
+
+
+def run_pipeline(query, embed, faiss_index, top_k=5, use_reranker=True, retrieve_multiplier=5, **search_options):
+    """Run one query through semantic_search.search(), the path /search serves, timing each stage in ms.
+
+    embed supplies the query embedding (the embed stage); the other stages
+    are the spans search() records. search_options go to search() as is.
+    """
+    from src.search.semantic_search import search
+
+    with collect_timings() as spans:
+        start = time.perf_counter()
+        with span("embed"):
+            query_embedding = embed(query)
+        results = search(
+            query, top_k=top_k, use_reranker=use_reranker, retrieve_multiplier=retrieve_multiplier,
+            query_embedding=query_embedding, faiss_index=faiss_index, **search_options,
+        )
+        total_ms = (time.perf_counter() - start) * 1000
+    return results, stage_timings(spans, total_ms)
+
+
+def rerank_path(before, after):
+    """The adaptive-rerank path one query took, from rerank_stats()["paths"] around it (None without a reranker)."""
+    return next((path for path in PATHS if after[path] > before[path]), None)
+
+
+def benchmark_stages(dataset, embed, faiss_index, repeats=3, **pipeline_kwargs):
+    """Per-stage latency percentiles plus retrieval quality over the dataset.
+
+    "rerank" holds rerank_stats() for the run and the total latency of the
+    queries on each path (skip, band, full).
+    """
+    samples = {stage: [] for stage in STAGES}
+    path_samples = {path: [] for path in PATHS}
+    p5_scores, hits = [], []
+    reset_stats()
+
+    for i in range(repeats):
+        for item in dataset:
+            before = rerank_stats()["paths"]
+            results, timings = run_pipeline(item["query"], embed, faiss_index, **pipeline_kwargs)
+            path = rerank_path(before, rerank_stats()["paths"])
+            if path is not None:
+                path_samples[path].append(timings["total"])
+            for stage in STAGES:
+                samples[stage].append(timings[stage])
+            if i == 0:
+                expected = item.get("expected_apis")
+                p5 = precision_at_k(results, expected, k=5)
+                if p5 is not None:
+                    p5_scores.append(p5)
+                hits.append(hit_at_k(results, expected, k=3))
+
+    return {
+        "stages": {stage: percentiles(samples[stage]) for stage in STAGES},
+        "precision_at_5": round(float(np.mean(p5_scores)), 4) if p5_scores else None,
+        "hit_rate_at_3": round(float(np.mean(hits)), 4) if hits else None,
+        "rerank": {
+            **rerank_stats(),
+            "mode": pipeline_kwargs.get("rerank_mode") or RERANK_MODE,
+            "latency_ms": {path: percentiles(path_samples[path]) for path in PATHS},
+        },
+    }
+
+
+def benchmark_throughput(queries, embed, faiss_index, clients, rounds=3, **pipeline_kwargs):
+    """Drive the pipeline from N concurrent clients, each replaying the query list."""
+    def client_loop(offset):
+        latencies = []
+        for r in range(rounds):
+            for j in range(len(queries)):
+                q = queries[(j + offset) % len(queries)]
+                _, timings = run_pipeline(q, embed, faiss_index, **pipeline_kwargs)
+                latencies.append(timings["total"])
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        per_client = list(pool.map(client_loop, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for client in per_client for ms in client]
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "qps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def stored_vectors(index):
+    """Every vector of a FAISS index, in id order; an IVF index first gets the direct map reconstruct needs."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_ablation_indexes(base_index, index_types=INDEX_TYPES):
+    """Rebuild the stored vectors into each FAISS index type under test."""
+    vectors = stored_vectors(base_index)
+    indexes = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        indexes[index_type] = make_index(vectors, index_type)
+        print(f"  Built {index_type} index in {time.perf_counter() - start:.1f}s")
+    return indexes
+
+
+def run_ablations(dataset, embed, indexes, multipliers=DEFAULT_MULTIPLIERS, top_k=5, **search_options):
+    """Latency/quality matrix over index type x reranker x retrieve_k multiplier."""
+    rows = []
+    for index_type, faiss_index in indexes.items():
+        configs = [(False, 1)] + [(True, m) for m in multipliers]
+        for use_reranker, multiplier in configs:
+            report = benchmark_stages(
+                dataset, embed, faiss_index, repeats=1,
+                top_k=top_k, use_reranker=use_reranker, retrieve_multiplier=multiplier, **search_options,
+            )
+            total = report["stages"]["total"]
+            rows.append({
+                "index_type": index_type,
+                "use_reranker": use_reranker,
+                "retrieve_multiplier": multiplier,
+                "p50_ms": total["p50"],
+                "p95_ms": total["p95"],
+                "precision_at_5": report["precision_at_5"],
+                "hit_rate_at_3": report["hit_rate_at_3"],
+                "rerank_skip_rate": report["rerank"]["skip_rate"],
+            })
+            print(f"  {index_type:5s} rerank={str(use_reranker):5s} x{multiplier:<2d} "
+                  f"p50={total['p50']:.1f}ms p95={total['p95']:.1f}ms P@5={report['precision_at_5']}")
+    return rows
+
+
+def benchmark_stores(queries, embed, stores, reference_index, k=STORE_RECALL_K, repeats=3,
+                     filters=DEFAULT_STORE_FILTERS, vector_ids=None):
+    """Vector-search latency per store, recall@k against exact search, and how full filtered results are.
+
+    Recall is measured against a flat index over the same vectors, so FAISS
+    and pgvector are judged on one ground truth. filled is the mean share of
+    the k slots a filtered search returns (post-filtering can come back short).
+    vector_ids maps a store's result vector ids to reference rows, for stores that
+    keep one row per chunk over deduplicated embeddings.
+    """
+    vector_ids = vector_ids or {}
+    vectors = {q: embed(q) for q in queries}
+    exact = {q: set(reference_index.search(v, k)[1][0].tolist()) - {-1} for q, v in vectors.items()}
+
+    rows = []
+    for name, store in stores.items():
+        latencies, filtered_latencies, recalls, filled = [], [], [], []
+        for i in range(repeats):
+            for q in queries:
+                start = time.perf_counter()
+                results = store.search(vectors[q], k)[0]
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                filtered = store.search(vectors[q], k, filters=filters)[0]
+                filtered_latencies.append((time.perf_counter() - start) * 1000)
+
+                if i == 0:
+                    if exact[q]:
+                        ids = {r["vector_id"] for r in results}
+                        if name in vector_ids:
+                            ids = {int(vector_ids[name][row_id]) for row_id in ids}
+                        recalls.append(len(ids & exact[q]) / len(exact[q]))
+                    filled.append(len(filtered) / k)
+
+        row = {
+            "store": name,
+            "latency_ms": percentiles(latencies),
+            "filtered_latency_ms": percentiles(filtered_latencies),
+            f"recall_at_{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+            "filtered_fill": round(float(np.mean(filled)), 4) if filled else None,
+        }
+        rows.append(row)
+        print(f"  {name:8s} p50={row['latency_ms']['p50']:.2f}ms p95={row['latency_ms']['p95']:.2f}ms "
+              f"filtered p50={row['filtered_latency_ms']['p50']:.2f}ms "
+              f"recall@{k}={row[f'recall_at_{k}']} filled={row['filtered_fill']}")
+    return rows
+
+
+def flatten_metrics(report):
+    """Pull the regression-checked numbers out of a benchmark report."""
+    metrics = {}
+    for stage, stats in report["stages"].items():
+        for p in ("p50", "p95", "p99"):
+            metrics[f"stages.{stage}.{p}"] = stats[p]
+    for run in report.get("throughput", []):
+        metrics[f"throughput.c{run['clients']}.qps"] = run["qps"]
+    for key in ("precision_at_5", "hit_rate_at_3"):
+        if report.get(key) is not None:
+            metrics[key] = report[key]
+    return metrics
+
+
+def _higher_is_better(metric):
+    return metric.endswith("qps") or metric in ("precision_at_5", "hit_rate_at_3")
+
+
+def check_regressions(report, baseline, tolerance=None):
+    """Compare a report against a JSON baseline; return a list of failures."""
+    tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE) if tolerance is None else tolerance
+    current = flatten_metrics(report)
+    # Quality is only comparable when both runs used the same kind of query embeddings
+    same_embeddings = baseline.get("embeddings") == report.get("config", {}).get("embeddings")
+    failures = []
+
+    for metric, expected in baseline.get("metrics", {}).items():
+        if metric not in current:
+            continue
+        if metric in ("precision_at_5", "hit_rate_at_3") and not same_embeddings:
+            continue
+        actual = current[metric]
+        if _higher_is_better(metric):
+            limit = expected * (1 - tolerance)
+            if actual < limit:
+                failures.append(f"{metric}: {actual} < {round(limit, 3)} (baseline {expected})")
+        else:
+            limit = expected * (1 + tolerance)
+            if actual > limit:
+                failures.append(f"{metric}: {actual} > {round(limit, 3)} (baseline {expected})")
+
+    return failures
+
+
+def save_baseline(report, path=BASELINE_PATH, tolerance=DEFAULT_TOLERANCE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    baseline = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embeddings": report["config"]["embeddings"],
+        "tolerance": tolerance,
+        "metrics": flatten_metrics(report),
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Baseline saved to {path}")
+
+
+def run_benchmark(embeddings="cached", top_k=5, repeats=3, clients=DEFAULT_CLIENTS,
+                  ablations=True, index_types=INDEX_TYPES, compare_pgvector=False, rerank_mode=None, diversity=None):
+    """Run the full retrieval benchmark and return the report.
+
+    rerank_mode and diversity override RERANK_MODE and DIVERSITY_MODE for every search.
+    """
+    from src.search.semantic_search import faiss_store
+
+    base_index = faiss_store().index
+
+    dataset = load_golden_dataset()
+    queries = [item["query"] for item in dataset]
+    embed = make_embedder(queries, base_index.d, mode=embeddings)
+
+    print(f"Benchmarking {len(queries)} queries ({embeddings} embeddings, {base_index.ntotal} vectors)\n")
+
+    report = {
+        "config": {
+            "embeddings": embeddings,
+            "top_k": top_k,
+            "repeats": repeats,
+            "queries": len(queries),
+            "vectors": int(base_index.ntotal),
+            "rerank_mode": rerank_mode or RERANK_MODE,
+            "diversity": diversity or DIVERSITY_MODE,
+        },
+    }
+    search_options = {k: v for k, v in (("rerank_mode", rerank_mode), ("diversity", diversity)) if v is not None}
+    report.update(benchmark_stages(dataset, embed, base_index, repeats=repeats, top_k=top_k, **search_options))
+    if embeddings == "live":
+        save_query_cache(embed.cache)
+        embed = make_embedder(queries, base_index.d, mode="cached")
+
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:9s} p50={stats['p50']:8.2f}ms  p95={stats['p95']:8.2f}ms  p99={stats['p99']:8.2f}ms")
+
+    rerank = report["rerank"]
+    print(f"\nRerank ({rerank['mode']}): skip rate {rerank['skip_rate']:.1%}, "
+          f"candidates reranked {rerank['reranked_fraction']:.1%}")
+    for path in PATHS:
+        stats = rerank["latency_ms"][path]
+        if stats["n"]:
+            print(f"  {path:5s} n={stats['n']:<5d} p50={stats['p50']:8.2f}ms  p95={stats['p95']:8.2f}ms")
+
+    print("\nThroughput:")
+    report["throughput"] = []
+    for n in clients:
+        run = benchmark_throughput(queries, embed, base_index, n, top_k=top_k, **search_options)
+        report["throughput"].append(run)
+        print(f"  {n:3d} clients: {run['qps']:8.2f} qps  p95={run['latency_ms']['p95']:.1f}ms")
+
+    if ablations:
+        print("\nAblations:")
+        indexes = build_ablation_indexes(base_index, index_types)
+        report["ablations"] = run_ablations(dataset, embed, indexes, top_k=top_k, **search_options)
+
+    if compare_pgvector:
+        from src.search.pgvector_store import PgVectorStore
+        from src.search.vector_store import EMBEDDINGS_PATH
+        from src.ingestion.embed import load_rows
+
+        print("\nVector stores:")
+        reference = make_index(stored_vectors(base_index), "flat")
+        pg_store = PgVectorStore()
+        chunk_rows = load_rows(EMBEDDINGS_PATH)
+        try:
+            report["stores"] = benchmark_stores(
+                queries, embed, {"faiss": faiss_store(), "pgvector": pg_store}, reference, repeats=repeats,
+                vector_ids={"pgvector": chunk_rows} if chunk_rows is not None else None,
+            )
+        finally:
+            pg_store.close()
+
+    os.makedirs(os.path.dirname(BENCHMARK_RESULTS_PATH), exist_ok=True)
+    with open(BENCHMARK_RESULTS_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {BENCHMARK_RESULTS_PATH}")
+
+    return report
+
+
+def _baseline_parse(content):
+    """The original chunker parse path: stdlib json, then pure-Python yaml.safe_load."""
+    import yaml
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return yaml.safe_load(content)
+
+
+def benchmark_parsing(raw_dir="data/raw", top=10):
+    """Per-spec parse time, baseline (json + pure-Python YAML) vs accelerated path."""
+    from src.ingestion.chunker import iter_spec_files, parse_spec, extract_endpoints
+
+    rows = []
+    for filepath, source_name in iter_spec_files(raw_dir):
+        with open(filepath, "rb") as f:
+            content = f.read()
+        row = {"file": source_name, "bytes": len(content)}
+
+        start = time.perf_counter()
+        try:
+            _baseline_parse(content.decode("utf-8"))
+        except Exception:
+            pass
+        row["baseline_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        try:
+            spec = parse_spec(content)
+        except Exception:
+            spec = None
+        row["fast_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        row["endpoints"] = len(extract_endpoints(spec)) if isinstance(spec, dict) else 0
+        row["extract_ms"] = (time.perf_counter() - start) * 1000
+        rows.append(row)
+
+    baseline_total = sum(r["baseline_ms"] for r in rows)
+    fast_total = sum(r["fast_ms"] for r in rows)
+    report = {
+        "specs": len(rows),
+        "baseline_parse_ms": round(baseline_total, 1),
+        "fast_parse_ms": round(fast_total, 1),
+        "extract_ms": round(sum(r["extract_ms"] for r in rows), 1),
+        "speedup": round(baseline_total / fast_total, 2) if fast_total else None,
+        "fast_parse": percentiles([r["fast_ms"] for r in rows]),
+        "slowest": sorted(rows, key=lambda r: r["baseline_ms"], reverse=True)[:top],
+    }
+
+    print(f"Parsed {report['specs']} specs: baseline {report['baseline_parse_ms']}ms, "
+          f"accelerated {report['fast_parse_ms']}ms ({report['speedup']}x), "
+          f"endpoint extraction {report['extract_ms']}ms")
+    for r in report["slowest"]:
+        print(f"  {r['file'][:50]:50s} {r['bytes'] / 1e6:7.2f}MB  "
+              f"{r['baseline_ms']:9.1f}ms -> {r['fast_ms']:8.1f}ms  ({r['endpoints']} endpoints)")
+
+    os.makedirs(os.path.dirname(PARSE_BENCHMARK_PATH), exist_ok=True)
+    with open(PARSE_BENCHMARK_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {PARSE_BENCHMARK_PATH}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark")
+    parser.add_argument("--embeddings", choices=["stub", "cached", "live"], default="cached")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--clients", default=",".join(str(c) for c in DEFAULT_CLIENTS))
+    parser.add_argument("--no-ablations", action="store_true")
+    parser.add_argument("--rerank-mode", choices=RERANK_MODES, default=None,
+                        help="override RERANK_MODE; the report gives the latency of each rerank path")
+    parser.add_argument("--diversity", choices=DIVERSITY_MODES, default=None, help="override DIVERSITY_MODE")
+    parser.add_argument("--compare-pgvector", action="store_true",
+                        help="also benchmark the pgvector store (DATABASE_URL) against FAISS")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=None)
+    parser.add_argument("--parse-specs", nargs="?", const="data/raw", default=None, metavar="RAW_DIR",
+                        help="benchmark spec parsing instead of search")
+    args = parser.parse_args()
+
+    if args.parse_specs:
+        benchmark_parsing(args.parse_specs)
+        return 0
+
+    report = run_benchmark(
+        embeddings=args.embeddings,
+        top_k=args.top_k,
+        repeats=args.repeats,
+        clients=[int(c) for c in args.clients.split(",")],
+        ablations=not args.no_ablations,
+        compare_pgvector=args.compare_pgvector,
+        rerank_mode=args.rerank_mode,
+        diversity=args.diversity,
+    )
+
+    if args.update_baseline:
+        save_baseline(report, tolerance=args.tolerance or DEFAULT_TOLERANCE)
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print(f"No baseline at {BASELINE_PATH}; run with --update-baseline to create one.")
+        return 0
+
+    with open(BASELINE_PATH, "r") as f:
+        baseline = json.load(f)
+    failures = check_regressions(report, baseline, args.tolerance)
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,12 +1,15 @@
 import os
 import json
 import time
-from src.search.semantic_search import search
-from src.search.rag import ask
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from src.evaluation.metrics import percentiles, retrieval_metrics
 
 
 GOLDEN_DATASET_PATH = "data/processed/golden_dataset.json"
 EVAL_RESULTS_PATH = "data/processed/eval_results.json"
+DEFAULT_WORKERS = 8
+DEFAULT_E2E_CONCURRENCY = 4
 
 
 def create_sample_golden_dataset():
@@ -55,90 +58,235 @@ def precision_at_k(results, expected_apis, k=5):
     return relevant / k
 
 
-def run_eval():
-    """Run the full evaluation suite."""
-    if not os.path.exists(GOLDEN_DATASET_PATH):
-        create_sample_golden_dataset()
+def hit_at_k(results, expected_apis, k=3):
+    """Whether any of the top-K results matches an expected API."""
+    return bool(expected_apis) and any(
+        any(exp.lower() in r["metadata"]["api_name"].lower() for exp in expected_apis)
+        for r in results[:k]
+    )
 
-    with open(GOLDEN_DATASET_PATH, "r") as f:
-        dataset = json.load(f)
 
-    print(f"Running evaluation on {len(dataset)} queries...\n")
+def load_golden_dataset(path=GOLDEN_DATASET_PATH):
+    """Load a golden dataset (.json array or .jsonl, one query per line).
+
+    The starter set is created if the default dataset doesn't exist yet.
+    """
+    if not os.path.exists(path):
+        if path == GOLDEN_DATASET_PATH:
+            return create_sample_golden_dataset()
+        raise FileNotFoundError(path)
+
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.time()
+    try:
+        return fn(*args, **kwargs), time.time() - start, None
+    except Exception as e:
+        return None, time.time() - start, str(e)
 
-    results = []
-    total_p_at_5 = 0
-    total_p_at_3 = 0
-    total_latency = 0
-    scored_count = 0
 
-    for i, item in enumerate(dataset):
-        query = item["query"]
-        expected = item.get("expected_apis")
+def run_parallel(fn, queries, workers=DEFAULT_WORKERS):
+    """Run fn(query) over all queries on a thread pool, preserving order."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda q: _timed(fn, q), queries))
 
-        start = time.time()
-        search_results = search(query, top_k=5)
-        latency = time.time() - start
 
-        p5 = precision_at_k(search_results, expected, k=5)
-        p3 = precision_at_k(search_results, expected, k=3)
+def run_eval(dataset_path=GOLDEN_DATASET_PATH, k=5, workers=DEFAULT_WORKERS, verbose=None, rerank_mode=None,
+             results_path=EVAL_RESULTS_PATH):
+    """Run the retrieval evaluation suite concurrently over the golden dataset."""
+    from src.search.semantic_search import search
+    from src.search.adaptive_rerank import rerank_stats, reset_stats
 
-        top_apis = [r["metadata"]["api_name"] for r in search_results[:3]]
-        hit = expected and any(
-            any(exp.lower() in api.lower() for exp in expected)
-            for api in top_apis
-        )
+    dataset = load_golden_dataset(dataset_path)
+    verbose = len(dataset) <= 50 if verbose is None else verbose
+
+    print(f"Running evaluation on {len(dataset)} queries with {workers} workers...\n")
+
+    reset_stats()
+    start = time.time()
+    outcomes = run_parallel(
+        lambda q: search(q, top_k=k, rerank_mode=rerank_mode), [item["query"] for item in dataset], workers,
+    )
+    wall_time = time.time() - start
+    rerank = rerank_stats()
+    if rerank_mode:
+        rerank["mode"] = rerank_mode
+
+    retrieved = [
+        [r["metadata"]["api_name"] for r in (res or [])]
+        for res, _, _ in outcomes
+    ]
+    expected = [item.get("expected_apis") for item in dataset]
+    metrics, per_query, scored = retrieval_metrics(retrieved, expected, k=k)
 
+    results = []
+    latencies = []
+    for i, (item, (_, latency, error)) in enumerate(zip(dataset, outcomes)):
+        latencies.append(latency * 1000)
         result = {
-            "query": query,
-            "expected_apis": expected,
-            "top_results": top_apis,
-            "hit_at_3": hit,
-            "precision_at_5": p5,
-            "precision_at_3": p3,
+            "query": item["query"],
+            "expected_apis": expected[i],
+            "top_results": retrieved[i][:3],
             "latency_ms": round(latency * 1000),
         }
+        for name, values in per_query.items():
+            result[name] = round(float(values[i]), 4) if scored[i] else None
+        if error:
+            result["error"] = error
         results.append(result)
 
-        status = "✓" if hit else "✗"
-        print(f"  [{status}] {query}")
-        print(f"      Expected: {expected} | Got: {top_apis[:2]} | P@5: {p5} | {result['latency_ms']}ms")
-
-        if p5 is not None:
-            total_p_at_5 += p5
-            total_p_at_3 += (p3 or 0)
-            scored_count += 1
-
-        total_latency += latency
-
-    avg_p5 = total_p_at_5 / scored_count if scored_count > 0 else 0
-    avg_p3 = total_p_at_3 / scored_count if scored_count > 0 else 0
-    avg_latency = (total_latency / len(dataset)) * 1000
-    hit_rate = sum(1 for r in results if r["hit_at_3"]) / len(dataset)
+        if verbose:
+            status = "✓" if result.get("hit_at_3") else "✗"
+            print(f"  [{status}] {item['query']}")
+            print(f"      Expected: {expected[i]} | Got: {retrieved[i][:2]} | "
+                  f"P@{k}: {result[f'precision_at_{k}']} | {result['latency_ms']}ms")
 
+    hits = sum(1 for r in results if r.get("hit_at_3"))
     summary = {
         "total_queries": len(dataset),
-        "avg_precision_at_5": round(avg_p5, 4),
-        "avg_precision_at_3": round(avg_p3, 4),
-        "hit_rate_at_3": round(hit_rate, 4),
-        "avg_latency_ms": round(avg_latency),
+        "scored_queries": metrics["scored_queries"],
+        "errors": sum(1 for r in results if "error" in r),
+        f"avg_precision_at_{k}": metrics[f"precision_at_{k}"],
+        "avg_precision_at_3": metrics.get("precision_at_3"),
+        f"recall_at_{k}": metrics[f"recall_at_{k}"],
+        "mrr": metrics["mrr"],
+        f"ndcg_at_{k}": metrics[f"ndcg_at_{k}"],
+        "hit_rate_at_3": round(hits / len(dataset), 4) if dataset else 0,
+        "avg_latency_ms": round(sum(latencies) / len(latencies)) if latencies else 0,
+        "latency_ms": percentiles(latencies),
+        "throughput_qps": round(len(dataset) / wall_time, 2) if wall_time > 0 else 0,
+        "rerank": rerank,
         "results": results,
     }
 
-    with open(EVAL_RESULTS_PATH, "w") as f:
+    with open(results_path, "w") as f:
         json.dump(summary, f, indent=2)
 
     print(f"\n{'='*50}")
     print(f"EVALUATION RESULTS")
     print(f"{'='*50}")
-    print(f"Queries:           {summary['total_queries']}")
-    print(f"Avg Precision@5:   {summary['avg_precision_at_5']}")
+    print(f"Queries:           {summary['total_queries']} ({summary['errors']} errors)")
+    print(f"Avg Precision@{k}:   {summary[f'avg_precision_at_{k}']}")
     print(f"Avg Precision@3:   {summary['avg_precision_at_3']}")
+    print(f"Recall@{k}:          {summary[f'recall_at_{k}']}")
+    print(f"MRR:               {summary['mrr']}")
+    print(f"nDCG@{k}:            {summary[f'ndcg_at_{k}']}")
     print(f"Hit Rate@3:        {summary['hit_rate_at_3']}")
-    print(f"Avg Latency:       {summary['avg_latency_ms']}ms")
-    print(f"\nResults saved to {EVAL_RESULTS_PATH}")
+    print(f"Avg Latency:       {summary['avg_latency_ms']}ms (p95 {summary['latency_ms']['p95']}ms)")
+    print(f"Throughput:        {summary['throughput_qps']} qps")
+    print(f"Rerank ({rerank['mode']}):  {rerank['paths']} | {rerank['reranked_fraction']:.0%} of candidates reranked")
+    print(f"\nResults saved to {results_path}")
 
     return summary
 
 
+def compare_rerank_modes(dataset_path=GOLDEN_DATASET_PATH, k=5, workers=DEFAULT_WORKERS):
+    """Quality and latency of adaptive reranking against reranking every candidate."""
+    runs = {}
+    for mode in ("always", "adaptive"):
+        print(f"\n--- rerank mode: {mode} ---")
+        runs[mode] = run_eval(dataset_path, k=k, workers=workers, verbose=False, rerank_mode=mode,
+                              results_path=EVAL_RESULTS_PATH.replace(".json", f"_rerank_{mode}.json"))
+
+    metrics = [f"avg_precision_at_{k}", "hit_rate_at_3", "mrr", f"ndcg_at_{k}"]
+    print(f"\n{'metric':18s} {'always':>10s} {'adaptive':>10s} {'delta':>10s}")
+    for metric in metrics:
+        always, adaptive = runs["always"][metric], runs["adaptive"][metric]
+        print(f"{metric:18s} {always:10.4f} {adaptive:10.4f} {adaptive - always:+10.4f}")
+    for p in ("p50", "p95"):
+        always, adaptive = runs["always"]["latency_ms"][p], runs["adaptive"]["latency_ms"][p]
+        print(f"{'latency ' + p:18s} {always:10.1f} {adaptive:10.1f} {adaptive - always:+10.1f}")
+    print(f"Skip rate: {runs['adaptive']['rerank']['skip_rate']:.1%}, "
+          f"candidates reranked: {runs['adaptive']['rerank']['reranked_fraction']:.1%}")
+    return runs
+
+
+def _run_ask(query):
+    from src.search.rag import ask
+    result = ask(query)
+    return {
+        "grounding_score": result.get("grounding", {}).get("score"),
+        "tokens": result["tokens"]["input"] + result["tokens"]["output"],
+    }
+
+
+def _run_agent(query):
+    from src.agents.search_agent import run_agent
+    result = run_agent(query)
+    tokens = sum(step.get("tokens", 0) for step in result["trace"])
+    return {
+        "grounding_score": result.get("grounding", {}).get("score"),
+        "tokens": tokens,
+        "query_type": result["query_type"],
+    }
+
+
+def run_e2e_eval(endpoint="ask", dataset_path=GOLDEN_DATASET_PATH, concurrency=DEFAULT_E2E_CONCURRENCY):
+    """End-to-end /ask or /agent evaluation: grounding, tokens and latency.
+
+    concurrency bounds the number of in-flight pipeline runs (and so LLM calls).
+    """
+    runner = {"ask": _run_ask, "agent": _run_agent}[endpoint]
+    dataset = load_golden_dataset(dataset_path)
+
+    print(f"Running /{endpoint} evaluation on {len(dataset)} queries (concurrency {concurrency})...")
+
+    start = time.time()
+    outcomes = run_parallel(runner, [item["query"] for item in dataset], workers=concurrency)
+    wall_time = time.time() - start
+
+    results = []
+    for item, (res, latency, error) in zip(dataset, outcomes):
+        row = {"query": item["query"], "latency_ms": round(latency * 1000)}
+        row.update(res or {})
+        if error:
+            row["error"] = error
+        results.append(row)
+
+    ok = [r for r in results if "error" not in r]
+    grounding = [r["grounding_score"] for r in ok if r.get("grounding_score") is not None]
+    summary = {
+        "endpoint": endpoint,
+        "total_queries": len(dataset),
+        "errors": len(results) - len(ok),
+        "avg_grounding": round(sum(grounding) / len(grounding), 4) if grounding else 0,
+        "total_tokens": sum(r.get("tokens", 0) for r in ok),
+        "avg_tokens": round(sum(r.get("tokens", 0) for r in ok) / len(ok)) if ok else 0,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+        "wall_time_s": round(wall_time, 2),
+        "results": results,
+    }
+
+    path = EVAL_RESULTS_PATH.replace(".json", f"_{endpoint}.json")
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"  Grounding: {summary['avg_grounding']} | Tokens: {summary['total_tokens']} | "
+          f"p50 {summary['latency_ms']['p50']}ms p95 {summary['latency_ms']['p95']}ms | "
+          f"{summary['errors']} errors | wall {summary['wall_time_s']}s")
+    print(f"Results saved to {path}")
+    return summary
+
+
 if __name__ == "__main__":
-    run_eval()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the golden-set evaluation")
+    parser.add_argument("--dataset", default=GOLDEN_DATASET_PATH, help=".json or .jsonl golden set")
+    parser.add_argument("--mode", choices=["search", "ask", "agent"], default="search")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rerank-mode", choices=["adaptive", "always"], default=None)
+    parser.add_argument("--compare-rerank", action="store_true",
+                        help="run search eval with adaptive and always-on reranking and compare")
+    args = parser.parse_args()
+
+    if args.compare_rerank:
+        compare_rerank_modes(args.dataset, k=args.k, workers=args.workers or DEFAULT_WORKERS)
+    elif args.mode == "search":
+        run_eval(args.dataset, k=args.k, workers=args.workers or DEFAULT_WORKERS, rerank_mode=args.rerank_mode)
+    else:
+        run_e2e_eval(args.mode, args.dataset, concurrency=args.workers or DEFAULT_E2E_CONCURRENCY)
@@ -0,0 +1,271 @@
+"""Local OpenAI-compatible stand-in for load tests.
+
+Serves /v1/chat/completions (plain, JSON-mode, json_schema and streamed)
+and /v1/embeddings. Latency is drawn from a configurable distribution, and
+configurable shares of requests fail with 500 or 429 (also returned when
+more than max_concurrency requests are in flight). Nothing is a real model:
+structured replies are sampled from the requested schema, text replies
+are filler sentences with [Source N] citations, and embeddings are
+hash-seeded unit vectors.
+
+    python3 -m src.evaluation.fake_openai --port 8900 --chat-latency lognormal:600:0.4 --rate-limit-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn src.api.main:app
+
+Latency specs: fixed:MS, uniform:LOW_MS:HIGH_MS, lognormal:MEDIAN_MS:SIGMA.
+"""
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.llm.embeddings import HashEmbeddingProvider
+
+DEFAULT_CONFIG = {
+    # Time to first token; a non-streamed reply also waits token_ms per completion token
+    "chat_latency": os.getenv("FAKE_CHAT_LATENCY", "lognormal:400:0.4"),
+    "token_ms": float(os.getenv("FAKE_TOKEN_MS", "10")),
+    "completion_tokens": int(os.getenv("FAKE_COMPLETION_TOKENS", "120")),
+    "embed_latency": os.getenv("FAKE_EMBED_LATENCY", "lognormal:60:0.3"),
+    "embedding_dim": int(os.getenv("FAKE_EMBEDDING_DIM", "3072")),
+    "error_rate": float(os.getenv("FAKE_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("FAKE_RATE_LIMIT_RATE", "0")),
+    # 0 = unlimited; beyond this many in-flight requests every request gets a 429
+    "max_concurrency": int(os.getenv("FAKE_MAX_CONCURRENCY", "0")),
+    "retry_after_ms": int(os.getenv("FAKE_RETRY_AFTER_MS", "500")),
+    "seed": None,
+}
+
+# Valid for every agent/grounding schema when a caller only asks for JSON mode
+JSON_MODE_REPLY = {"type": "SIMPLE", "queries": ["fake sub query"], "claims": [], "revisions": []}
+FILLER_WORDS = ("api", "endpoint", "supports", "requests", "payments", "auth", "webhooks", "storage", "events", "users")
+
+
+def parse_latency(spec):
+    """Sampler rng -> milliseconds for a latency spec string."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Bad latency spec {spec!r} (fixed:MS, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA)")
+
+
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+
+def sample_schema(schema, rng, defs=None, name="value"):
+    """A value matching a JSON schema (the subset strict structured outputs use)."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return sample_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], rng, defs, name)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"] or schema["anyOf"]
+        return sample_schema(options[0], rng, defs, name)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: sample_schema(sub, rng, defs, key) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 1), min(schema.get("maxItems", 2), 2))
+        return [sample_schema(schema.get("items", {}), rng, defs, name) for _ in range(count)]
+    if kind == "integer":
+        return rng.randint(0, 10)
+    if kind == "number":
+        return round(rng.random(), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    return f"fake {name} {' '.join(rng.choice(FILLER_WORDS) for _ in range(3))}"
+
+
+def filler_text(rng, tokens):
+    """Sentences with citations, roughly `tokens` long."""
+    sentences = []
+    while sum(count_tokens(s) for s in sentences) < tokens:
+        words = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(6, 12)))
+        sentences.append(f"The {words.capitalize()} [Source {rng.randint(1, 5)}].")
+    return " ".join(sentences)
+
+
+def reply_content(body, rng, completion_tokens):
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(sample_schema(response_format["json_schema"]["schema"], rng))
+    if response_format.get("type") == "json_object":
+        return json.dumps(JSON_MODE_REPLY)
+    cap = body.get("max_completion_tokens") or body.get("max_tokens") or completion_tokens
+    return filler_text(rng, min(completion_tokens, cap))
+
+
+def error_response(status, message, code, retry_after_ms=None):
+    headers = {}
+    if retry_after_ms is not None:
+        headers = {"retry-after-ms": str(retry_after_ms), "retry-after": str(max(1, retry_after_ms // 1000))}
+    return JSONResponse(
+        {"error": {"message": message, "type": code, "param": None, "code": code}},
+        status_code=status, headers=headers,
+    )
+
+
+def create_app(config=None):
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    chat_latency = parse_latency(config["chat_latency"])
+    embed_latency = parse_latency(config["embed_latency"])
+    rng = random.Random(config["seed"])
+    embedder = HashEmbeddingProvider(dimension=config["embedding_dim"])
+    stats = Counter()
+    lock = threading.Lock()
+    state = {"in_flight": 0, "ids": 0}
+
+    app = FastAPI(title="Fake OpenAI")
+
+    def admit(route):
+        """An error response for this request, or None to serve it."""
+        with lock:
+            stats[f"{route}.requests"] += 1
+            state["ids"] += 1
+            if config["max_concurrency"] and state["in_flight"] >= config["max_concurrency"]:
+                stats[f"{route}.429"] += 1
+                return error_response(429, "Too many concurrent requests", "rate_limit_exceeded", config["retry_after_ms"])
+            roll = rng.random()
+            if roll < config["rate_limit_rate"]:
+                stats[f"{route}.429"] += 1
+                return error_response(429, "Rate limit reached", "rate_limit_exceeded", config["retry_after_ms"])
+            if roll < config["rate_limit_rate"] + config["error_rate"]:
+                stats[f"{route}.500"] += 1
+                return error_response(500, "The server had an error processing your request", "server_error")
+            state["in_flight"] += 1
+            return None
+
+    def release():
+        with lock:
+            state["in_flight"] -= 1
+
+    def sample(sampler):
+        with lock:
+            return max(0.0, sampler(rng))
+
+    @app.get("/stats")
+    def get_stats():
+        with lock:
+            return {**stats, "in_flight": state["in_flight"], "config": config}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(request: Request, deployment: str = None):
+        body = await request.json()
+        with lock:
+            content = reply_content(body, rng, config["completion_tokens"])
+            completion_id = f"chatcmpl-fake-{state['ids']}"
+        rejected = admit("chat")
+        if rejected is not None:
+            return rejected
+
+        model = body.get("model", deployment or "fake")
+        prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+        completion_tokens = count_tokens(content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        created = int(time.time())
+        first_token_ms = sample(chat_latency)
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep((first_token_ms + config["token_ms"] * completion_tokens) / 1000)
+            finally:
+                release()
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta, finish_reason=None):
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}]}
+
+        async def events():
+            try:
+                await asyncio.sleep(first_token_ms / 1000)
+                yield f"data: {json.dumps(chunk({'role': 'assistant', 'content': ''}))}\n\n"
+                words = content.split(" ")
+                for i, word in enumerate(words):
+                    text = word if i == 0 else " " + word
+                    yield f"data: {json.dumps(chunk({'content': text}))}\n\n"
+                    await asyncio.sleep(config["token_ms"] * count_tokens(text) / 1000)
+                yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+                if include_usage:
+                    final = {**chunk({}), "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                release()
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        rejected = admit("embeddings")
+        if rejected is not None:
+            return rejected
+        try:
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            texts = [t if isinstance(t, str) else json.dumps(t) for t in texts]
+            dimension = body.get("dimensions") or config["embedding_dim"]
+            provider = embedder if dimension == embedder.dimension else HashEmbeddingProvider(dimension=dimension)
+            vectors = provider.embed(texts)
+            await asyncio.sleep(sample(embed_latency) / 1000)
+        finally:
+            release()
+
+        base64_format = body.get("encoding_format") == "base64"
+        data = [
+            {"object": "embedding", "index": i,
+             "embedding": base64.b64encode(np.asarray(v, dtype="float32").tobytes()).decode() if base64_format
+             else [float(x) for x in v]}
+            for i, v in enumerate(vectors)
+        ]
+        tokens = sum(count_tokens(t) for t in texts)
+        return {"object": "list", "data": data, "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--chat-latency", default=DEFAULT_CONFIG["chat_latency"])
+    parser.add_argument("--token-ms", type=float, default=DEFAULT_CONFIG["token_ms"])
+    parser.add_argument("--completion-tokens", type=int, default=DEFAULT_CONFIG["completion_tokens"])
+    parser.add_argument("--embed-latency", default=DEFAULT_CONFIG["embed_latency"])
+    parser.add_argument("--embedding-dim", type=int, default=DEFAULT_CONFIG["embedding_dim"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_CONFIG["error_rate"])
+    parser.add_argument("--rate-limit-rate", type=float, default=DEFAULT_CONFIG["rate_limit_rate"])
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_CONFIG["max_concurrency"])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("host", "port")}
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,254 @@
+"""Open-loop load generator for the API.
+
+Requests are fired at a target rate, whether or not earlier ones have
+finished, so a saturated worker shows up as queueing latency and errors
+instead of a slower send rate. Each stage runs one target RPS for a fixed
+duration over a weighted mix of /search, /ask and /agent calls with
+golden-dataset queries. The report gives throughput, p50/p95/p99 latency
+and error rates per endpoint.
+
+Run it against a worker whose LLM and embedding calls go to the stand-in:
+
+    python3 -m src.evaluation.fake_openai --port 8900 &
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn src.api.main:app --port 8000 &
+    python3 -m src.evaluation.loadtest --rps 2,5,10,20 --duration 30 --mix search=8,ask=1,agent=1 \
+        --fake-url http://127.0.0.1:8900
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+import httpx
+from src.evaluation.eval import load_golden_dataset
+from src.evaluation.metrics import percentiles
+
+LOADTEST_RESULTS_PATH = "data/processed/loadtest_results.json"
+ENDPOINTS = {"search": "/search", "ask": "/ask", "agent": "/agent"}
+DEFAULT_MIX = "search=8,ask=1,agent=1"
+DEFAULT_TIMEOUT = 60.0
+MAX_IN_FLIGHT = 1000
+# A stage is sustained when at most this share of requests fail and latency does not
+# build up: the last quarter's median may be at most this multiple of the first quarter's
+MAX_ERROR_RATE = 0.01
+MAX_LATENCY_GROWTH = 2.0
+
+
+def parse_mix(spec):
+    """{"search": 8, ...} from "search=8,ask=1,agent=1"."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix (expected {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def request_body(endpoint, query):
+    if endpoint == "search":
+        return {"query": query, "top_k": 5}
+    return {"query": query}
+
+
+def arrival_times(rps, duration, rng, arrivals="poisson"):
+    """Send offsets in seconds: a Poisson process or evenly spaced at rps."""
+    if rps <= 0:
+        return []
+    if arrivals == "uniform":
+        return [i / rps for i in range(int(rps * duration))]
+    times, t = [], rng.expovariate(rps)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rps)
+    return times
+
+
+async def fire(client, endpoint, query, headers, records, started):
+    start = time.perf_counter()
+    record = {"endpoint": endpoint, "offset_s": round(start - started, 4)}
+    try:
+        response = await client.post(ENDPOINTS[endpoint], json=request_body(endpoint, query), headers=headers)
+        record["status"] = response.status_code
+    except httpx.TimeoutException:
+        record["status"] = "timeout"
+    except httpx.HTTPError as e:
+        record["status"] = type(e).__name__
+    record["latency_ms"] = (time.perf_counter() - start) * 1000
+    records.append(record)
+
+
+async def run_stage(client, rps, duration, mix, queries, headers, seed=0, arrivals="poisson",
+                    max_in_flight=MAX_IN_FLIGHT):
+    """Fire requests at rps for duration seconds; returns (records, dropped, wall_seconds).
+
+    Requests that would exceed max_in_flight are dropped (counted, not sent).
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    records, tasks = [], set()
+    dropped = 0
+    started = time.perf_counter()
+    for offset in arrival_times(rps, duration, rng, arrivals):
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            dropped += 1
+            continue
+        endpoint = rng.choices(names, weights)[0]
+        task = asyncio.create_task(fire(client, endpoint, rng.choice(queries), headers, records, started))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return records, dropped, time.perf_counter() - started
+
+
+def summarize(records, wall_seconds, dropped=0):
+    """Per-endpoint and overall throughput, latency percentiles and error rates."""
+    def summary(rows):
+        ok = [r for r in rows if isinstance(r["status"], int) and r["status"] < 400]
+        statuses = Counter(str(r["status"]) for r in rows)
+        return {
+            "sent": len(rows),
+            "ok": len(ok),
+            "errors": len(rows) - len(ok),
+            "error_rate": round((len(rows) - len(ok)) / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(ok) / wall_seconds, 3) if wall_seconds else 0.0,
+            "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+            "status_counts": dict(sorted(statuses.items())),
+        }
+
+    endpoints = sorted({r["endpoint"] for r in records})
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "dropped": dropped,
+        "all": summary(records),
+        "endpoints": {name: summary([r for r in records if r["endpoint"] == name]) for name in endpoints},
+    }
+
+
+def latency_growth(records):
+    """Median latency of the last quarter of sends over that of the first (queue build-up shows as > 1)."""
+    ok = sorted((r for r in records if isinstance(r["status"], int) and r["status"] < 400),
+                key=lambda r: r["offset_s"])
+    quarter = len(ok) // 4
+    if quarter == 0:
+        return 1.0
+    early = percentiles([r["latency_ms"] for r in ok[:quarter]])["p50"]
+    late = percentiles([r["latency_ms"] for r in ok[-quarter:]])["p50"]
+    return round(late / early, 3) if early else 1.0
+
+
+def sustained(stage):
+    """Whether a stage kept up with its target rate: nothing dropped, few errors, no queue build-up."""
+    return (
+        stage["dropped"] == 0
+        and stage["all"]["error_rate"] <= MAX_ERROR_RATE
+        and stage["latency_growth"] <= MAX_LATENCY_GROWTH
+    )
+
+
+async def run_load(url, rps_steps, duration, mix, queries=None, timeout=DEFAULT_TIMEOUT, arrivals="poisson",
+                   max_in_flight=MAX_IN_FLIGHT, fake_url=None, seed=0, client=None):
+    """Run one stage per target RPS and return the report."""
+    queries = queries or [q["query"] for q in load_golden_dataset()]
+    owns_client = client is None
+    if owns_client:
+        client = httpx.AsyncClient(
+            base_url=url, timeout=timeout, limits=httpx.Limits(max_connections=max_in_flight),
+        )
+    try:
+        token = (await client.post("/token", json={"user_id": "loadtest"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        stages = []
+        for i, rps in enumerate(rps_steps):
+            print(f"Stage {i + 1}/{len(rps_steps)}: {rps} rps for {duration}s ...")
+            fake_before = await fake_stats(fake_url)
+            records, dropped, wall = await run_stage(
+                client, rps, duration, mix, queries, headers, seed=seed + i, arrivals=arrivals,
+                max_in_flight=max_in_flight,
+            )
+            stage = {
+                "target_rps": rps,
+                "duration_s": duration,
+                **summarize(records, wall, dropped),
+                "latency_growth": latency_growth(records),
+            }
+            fake_after = await fake_stats(fake_url)
+            if fake_after is not None:
+                stage["upstream"] = {
+                    key: value - (fake_before or {}).get(key, 0)
+                    for key, value in fake_after.items() if isinstance(value, (int, float)) and key != "in_flight"
+                }
+            stage["sustained"] = sustained(stage)
+            stages.append(stage)
+            print_stage(stage)
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    passing = [s["target_rps"] for s in stages if s["sustained"]]
+    return {
+        "url": url,
+        "mix": mix,
+        "arrivals": arrivals,
+        "stages": stages,
+        "max_sustained_rps": max(passing) if passing else 0,
+    }
+
+
+async def fake_stats(fake_url):
+    """Request/429/500 counters of the fake OpenAI server, if one is given."""
+    if not fake_url:
+        return None
+    try:
+        async with httpx.AsyncClient(base_url=fake_url, timeout=5) as client:
+            return (await client.get("/stats")).json()
+    except httpx.HTTPError as e:
+        print(f"Warning: fake OpenAI stats unavailable: {e}")
+        return None
+
+
+def print_stage(stage):
+    print(f"  achieved {stage['all']['throughput_rps']} ok/s, errors {stage['all']['error_rate']:.2%}, "
+          f"dropped {stage['dropped']}, latency growth x{stage['latency_growth']}"
+          f"{'' if stage['sustained'] else '  (NOT sustained)'}")
+    for name, s in stage["endpoints"].items():
+        lat = s["latency_ms"]
+        print(f"    {name:7s} sent {s['sent']:5d}  {s['throughput_rps']:7.2f} ok/s  "
+              f"p50 {lat['p50']:8.1f}  p95 {lat['p95']:8.1f}  p99 {lat['p99']:8.1f} ms  "
+              f"errors {s['error_rate']:.2%} {s['status_counts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for /search, /ask and /agent")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", default="5", help="comma-separated target rates, one stage each")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--fake-url", default=None, help="fake OpenAI server, to report upstream 429s/500s")
+    parser.add_argument("--dataset", default=None, help="queries (golden dataset format)")
+    parser.add_argument("--out", default=LOADTEST_RESULTS_PATH)
+    args = parser.parse_args()
+
+    queries = [q["query"] for q in load_golden_dataset(args.dataset)] if args.dataset else None
+    report = asyncio.run(run_load(
+        args.url, [float(r) for r in args.rps.split(",")], args.duration, parse_mix(args.mix),
+        queries=queries, timeout=args.timeout, arrivals=args.arrivals,
+        max_in_flight=args.max_in_flight, fake_url=args.fake_url,
+    ))
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nMax sustained: {report['max_sustained_rps']} rps. Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
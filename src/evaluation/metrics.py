@@ -0,0 +1,112 @@
+import numpy as np
+
+
+def percentiles(values):
+    """Summarize a list of millisecond timings."""
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "n": 0}
+    arr = np.asarray(values, dtype="float64")
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(arr.mean()), 3),
+        "n": int(arr.size),
+    }
+
+
+def match_tensor(retrieved, expected, k):
+    """Case-insensitive substring matches between expected and retrieved API names.
+
+    retrieved: list (per query) of retrieved API names, in rank order
+    expected:  list (per query) of expected API name fragments, or None if unscored
+
+    Returns (match, expected_mask, scored) where match[q, e, r] is True when
+    expected fragment e of query q occurs in the rank-r result name.
+    """
+    n = len(retrieved)
+    max_expected = max([len(e) for e in expected if e] + [1])
+
+    names = np.full((n, k), "", dtype=object)
+    fragments = np.full((n, max_expected), "", dtype=object)
+    for q in range(n):
+        top = retrieved[q][:k]
+        names[q, :len(top)] = [name.lower() for name in top]
+        if expected[q]:
+            fragments[q, :len(expected[q])] = [e.lower() for e in expected[q]]
+
+    names = names.astype(str)
+    fragments = fragments.astype(str)
+    expected_mask = fragments != ""
+    # Empty names are padding for short result lists and must never match
+    match = (np.char.find(names[:, None, :], fragments[:, :, None]) >= 0)
+    match &= expected_mask[:, :, None] & (names != "")[:, None, :]
+
+    scored = expected_mask.any(axis=1)
+    return match, expected_mask, scored
+
+
+def relevance_matrix(match):
+    """Binary relevance per rank: [queries, k]."""
+    return match.any(axis=1)
+
+
+def precision_at_k(rel, k):
+    return rel[:, :k].sum(axis=1) / k
+
+
+def hit_at_k(rel, k):
+    return rel[:, :k].any(axis=1).astype("float64")
+
+
+def recall_at_k(match, expected_mask, k):
+    """Fraction of expected APIs matched by at least one of the top-k results."""
+    found = match[:, :, :k].any(axis=2) & expected_mask
+    totals = expected_mask.sum(axis=1)
+    return np.divide(found.sum(axis=1), totals, out=np.zeros(len(totals)), where=totals > 0)
+
+
+def mrr(rel):
+    """Reciprocal rank of the first relevant result (0 when none)."""
+    has_hit = rel.any(axis=1)
+    first = rel.argmax(axis=1)
+    return np.where(has_hit, 1.0 / (first + 1), 0.0)
+
+
+def ndcg_at_k(rel, expected_mask, k):
+    """Binary nDCG@k.
+
+    The ideal list assumes each expected API contributes at least one relevant
+    result, or as many as were actually retrieved if that is more.
+    """
+    rel = rel[:, :k].astype("float64")
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = rel @ discounts
+
+    ideal_count = np.minimum(k, np.maximum(expected_mask.sum(axis=1), rel.sum(axis=1))).astype(int)
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])[ideal_count]
+    return np.divide(dcg, ideal, out=np.zeros(len(dcg)), where=ideal > 0)
+
+
+def retrieval_metrics(retrieved, expected, k=5):
+    """Per-query and mean retrieval metrics for a whole evaluation run."""
+    match, expected_mask, scored = match_tensor(retrieved, expected, k)
+    rel = relevance_matrix(match)
+
+    per_query = {
+        f"precision_at_{k}": precision_at_k(rel, k),
+        f"recall_at_{k}": recall_at_k(match, expected_mask, k),
+        "mrr": mrr(rel),
+        f"ndcg_at_{k}": ndcg_at_k(rel, expected_mask, k),
+    }
+    if k >= 3:
+        per_query["precision_at_3"] = precision_at_k(rel, 3)
+        per_query["hit_at_3"] = hit_at_k(rel, 3)
+
+    summary = {
+        name: round(float(values[scored].mean()), 4) if scored.any() else 0.0
+        for name, values in per_query.items()
+    }
+    summary["scored_queries"] = int(scored.sum())
+    return summary, per_query, scored
@@ -1,57 +1,224 @@
 import os
 import json
+import hashlib
 import yaml
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+CHUNKS_PATH = "data/processed/chunks.jsonl"
+LEGACY_CHUNKS_PATH = "data/processed/chunks.json"
+SPEC_EXTENSIONS = (".json", ".yaml", ".yml")
+HTTP_METHODS = ("get", "post", "put", "patch", "delete", "head", "options")
+MAX_REF_DEPTH = 32
+
+
+def _text(value):
+    """Spec fields can be YAML dates, numbers or null; chunks only hold strings."""
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _as_list(value):
+    """A spec field that should be a list but may be a single value or null."""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def content_hash(text):
+    """Digest of a chunk's text; chunks with identical text share one embedding."""
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def parse_spec(content):
+    """Parse JSON (orjson when installed) or YAML (libyaml when available)."""
+    if content.lstrip()[:1] in (b"{", b"[", "{", "["):
+        try:
+            return orjson.loads(content) if orjson is not None else json.loads(content)
+        except ValueError:
+            # orjson is stricter (e.g. integers beyond 64 bits); fall back before trying YAML
+            try:
+                return json.loads(content)
+            except ValueError:
+                pass
+    return yaml.load(content, Loader=YamlLoader)
+
+
+class RefResolver:
+    """Resolve local $ref pointers ("#/components/schemas/User"), memoized per spec.
+
+    Each pointer is walked once; later references to it are dictionary lookups.
+    Remote references are left as-is.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._cache = {}
+
+    def _lookup(self, ref):
+        if ref in self._cache:
+            return self._cache[ref]
+
+        node = self.spec
+        for part in ref[2:].split("/") if ref != "#" else []:
+            part = part.replace("~1", "/").replace("~0", "~")
+            if isinstance(node, dict) and part in node:
+                node = node[part]
+            elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                node = node[int(part)]
+            else:
+                node = None
+                break
+
+        self._cache[ref] = node
+        return node
+
+    def resolve(self, node):
+        """Follow $ref chains until a concrete node (or an unresolvable ref) is reached."""
+        for _ in range(MAX_REF_DEPTH):
+            if not isinstance(node, dict):
+                return node
+            ref = node.get("$ref")
+            if not isinstance(ref, str) or not ref.startswith("#"):
+                return node
+            target = self._lookup(ref)
+            if target is None:
+                return node
+            node = target
+        return node
+
+    def schema_name(self, schema):
+        """Human-readable name for a schema: its $ref name, Name[] for arrays, or its title."""
+        if not isinstance(schema, dict):
+            return None
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            return ref.rsplit("/", 1)[-1]
+        if schema.get("type") == "array":
+            item = self.schema_name(schema.get("items"))
+            return f"{item}[]" if item else None
+        return _text(schema.get("title")) or None
+
 
 def extract_api_info(spec):
     """Pull key fields from an OpenAPI/Swagger spec."""
     info = spec.get("info", {})
+    if not isinstance(info, dict):
+        info = {}
     return {
-        "title": info.get("title", "Unknown API"),
-        "description": info.get("description", ""),
-        "version": info.get("version", ""),
-        "base_url": spec.get("servers", [{}])[0].get("url", "")
-            if spec.get("servers")
-            else spec.get("host", ""),
+        "title": _text(info.get("title", "Unknown API")),
+        "description": _text(info.get("description", "")),
+        "version": _text(info.get("version", "")),
+        "base_url": _text(spec.get("servers", [{}])[0].get("url", "")
+                          if spec.get("servers")
+                          else spec.get("host", "")),
     }
 
 
-def extract_endpoints(spec):
-    """Extract each endpoint as a separate chunk."""
+def _parameters(resolver, path_params, op_params):
+    """Merge path-level and operation parameters; the operation wins on (name, in)."""
+    merged = {}
+    for raw in list(path_params or []) + list(op_params or []):
+        param = resolver.resolve(raw)
+        if isinstance(param, dict) and param.get("name"):
+            merged[(param["name"], param.get("in"))] = param
+    return list(merged.values())
+
+
+def _content_schema_names(resolver, content):
+    names = []
+    if isinstance(content, dict):
+        for media in content.values():
+            if isinstance(media, dict):
+                name = resolver.schema_name(media.get("schema"))
+                if name and name not in names:
+                    names.append(name)
+    return names
+
+
+def _request_schema(resolver, details, params):
+    body = resolver.resolve(details.get("requestBody"))
+    if isinstance(body, dict):
+        names = _content_schema_names(resolver, body.get("content"))
+        if names:
+            return names[0]
+    # Swagger 2: the body is an "in: body" parameter
+    for param in params:
+        if param.get("in") == "body":
+            return resolver.schema_name(param.get("schema"))
+    return None
+
+
+def _response_schemas(resolver, details):
+    names = []
+    responses = details.get("responses")
+    if not isinstance(responses, dict):
+        return names
+    for code in sorted(responses, key=lambda c: (not str(c).startswith("2"), str(c))):
+        response = resolver.resolve(responses[code])
+        if not isinstance(response, dict):
+            continue
+        candidates = _content_schema_names(resolver, response.get("content"))
+        swagger_name = resolver.schema_name(response.get("schema"))
+        if swagger_name:
+            candidates.append(swagger_name)
+        for name in candidates:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def extract_endpoints(spec, resolver=None):
+    """Extract each endpoint as a separate chunk, with $ref parameters and schemas resolved."""
+    resolver = resolver or RefResolver(spec)
     paths = spec.get("paths", {})
     endpoints = []
 
+    if not isinstance(paths, dict):
+        return endpoints
+
     for path, methods in paths.items():
+        methods = resolver.resolve(methods)
         if not isinstance(methods, dict):
             continue
+        path_params = methods.get("parameters", [])
         for method, details in methods.items():
-            if method in ("get", "post", "put", "patch", "delete"):
-                endpoints.append({
-                    "method": method.upper(),
-                    "path": path,
-                    "summary": details.get("summary", ""),
-                    "description": details.get("description", ""),
-                    "parameters": [
-                        p.get("name", "") for p in details.get("parameters", [])
-                    ],
-                    "tags": details.get("tags", []),
-                })
+            if method not in HTTP_METHODS or not isinstance(details, dict):
+                continue
+            params = _parameters(resolver, path_params, details.get("parameters", []))
+            endpoints.append({
+                "method": method.upper(),
+                "path": path,
+                "summary": _text(details.get("summary", "")),
+                "description": _text(details.get("description", "")),
+                "parameters": [_text(p["name"]) for p in params],
+                "request_schema": _request_schema(resolver, details, params),
+                "response_schemas": _response_schemas(resolver, details),
+                "tags": [_text(t) for t in _as_list(details.get("tags"))],
+            })
 
     return endpoints
 
 
-def chunk_spec(filepath):
+def chunk_spec(filepath, source_name=None):
     """Turn one API spec file into searchable chunks."""
-    with open(filepath, "r") as f:
+    source_name = source_name or os.path.basename(filepath)
+    with open(filepath, "rb") as f:
         content = f.read()
 
     try:
-        spec = json.loads(content)
-    except json.JSONDecodeError:
-        try:
-            spec = yaml.safe_load(content)
-        except Exception:
-            return []
+        spec = parse_spec(content)
+    except Exception:
+        return []
 
     if not isinstance(spec, dict):
         return []
@@ -71,7 +238,7 @@ def chunk_spec(filepath):
                 "description": api_info["description"],
                 "version": api_info["version"],
                 "base_url": api_info["base_url"],
-                "source_file": os.path.basename(filepath),
+                "source_file": source_name,
             },
         })
 
@@ -82,6 +249,15 @@ def chunk_spec(filepath):
             f"{ep['summary']}\n"
             f"{ep['description']}"
         ).strip()
+        details = []
+        if ep["parameters"]:
+            details.append(f"Parameters: {', '.join(ep['parameters'])}")
+        if ep["request_schema"]:
+            details.append(f"Request body: {ep['request_schema']}")
+        if ep["response_schemas"]:
+            details.append(f"Responses: {', '.join(ep['response_schemas'])}")
+        if details:
+            ep_text += "\n" + "\n".join(details)
 
         if ep_text:
             chunks.append({
@@ -95,34 +271,104 @@ def chunk_spec(filepath):
                     "description": ep["description"],
                     "tags": ep["tags"],
                     "parameters": ep["parameters"],
-                    "source_file": os.path.basename(filepath),
+                    "request_schema": ep["request_schema"],
+                    "response_schemas": ep["response_schemas"],
+                    "source_file": source_name,
                 },
             })
 
     return chunks
 
 
-def chunk_all_specs(raw_dir="data/raw", output_path="data/processed/chunks.json"):
-    """Process all specs and save chunks."""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    all_chunks = []
+def iter_spec_files(raw_dir="data/raw"):
+    """Yield (path, source_name) for every spec in raw_dir, in a stable order.
+
+    When the downloader's manifest.json is present it is authoritative: specs
+    live in content-addressed objects/ and are named after their API.
+    Otherwise every JSON/YAML file directly in raw_dir is a spec.
+    """
+    manifest_path = os.path.join(raw_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            specs = json.load(f)["specs"]
+        for name in sorted(specs):
+            rel_path = specs[name]["path"]
+            yield os.path.join(raw_dir, rel_path), name + os.path.splitext(rel_path)[1]
+        return
+
+    for filename in sorted(os.listdir(raw_dir)):
+        if filename.lower().endswith(SPEC_EXTENSIONS):
+            yield os.path.join(raw_dir, filename), filename
 
-    files = [f for f in os.listdir(raw_dir) if f.endswith(".json")]
+
+def iter_chunks(raw_dir="data/raw", progress_every=20):
+    """Yield chunks spec by spec so only one parsed spec is held in memory."""
+    files = list(iter_spec_files(raw_dir))
     print(f"Processing {len(files)} spec files...")
 
-    for i, filename in enumerate(files):
-        filepath = os.path.join(raw_dir, filename)
-        chunks = chunk_spec(filepath)
-        all_chunks.extend(chunks)
-        if (i + 1) % 20 == 0:
-            print(f"  Processed {i + 1}/{len(files)} files ({len(all_chunks)} chunks so far)")
+    count = 0
+    for i, (filepath, source_name) in enumerate(files):
+        for chunk in chunk_spec(filepath, source_name):
+            count += 1
+            yield chunk
+        if progress_every and (i + 1) % progress_every == 0:
+            print(f"  Processed {i + 1}/{len(files)} files ({count} chunks so far)")
+
+
+def default_chunks_path():
+    """chunks.jsonl, or the legacy chunks.json if only that one exists."""
+    if not os.path.exists(CHUNKS_PATH) and os.path.exists(LEGACY_CHUNKS_PATH):
+        return LEGACY_CHUNKS_PATH
+    return CHUNKS_PATH
+
+
+def iter_chunks_file(path=None):
+    """Read chunks back one at a time (JSONL), or all at once for legacy .json files."""
+    path = path or default_chunks_path()
+    if path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r") as f:
+            yield from json.load(f)
+
+
+def count_chunks(path=None):
+    path = path or default_chunks_path()
+    if path.endswith(".jsonl"):
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _ in iter_chunks_file(path))
+
+
+def chunk_all_specs(raw_dir="data/raw", output_path=CHUNKS_PATH):
+    """Process all specs and save chunks.
+
+    .jsonl output is streamed one chunk per line; a .json path keeps the old
+    single-array format.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    if not output_path.endswith(".jsonl"):
+        all_chunks = list(iter_chunks(raw_dir))
+        with open(output_path, "w") as f:
+            json.dump(all_chunks, f, indent=2)
+        print(f"\nDone! Created {len(all_chunks)} chunks saved to {output_path}")
+        return len(all_chunks)
 
-    with open(output_path, "w") as f:
-        json.dump(all_chunks, f, indent=2)
+    count = 0
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for chunk in iter_chunks(raw_dir):
+            f.write(json.dumps(chunk) + "\n")
+            count += 1
+    os.replace(tmp_path, output_path)
 
-    print(f"\nDone! Created {len(all_chunks)} chunks saved to {output_path}")
-    return all_chunks
+    print(f"\nDone! Created {count} chunks saved to {output_path}")
+    return count
 
 
 if __name__ == "__main__":
-    chunk_all_specs()
\ No newline at end of file
+    chunk_all_specs()
@@ -1,52 +1,210 @@
 import os
 import json
+import time
+import random
+import asyncio
+import hashlib
 import httpx
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
 APIS_GURU_LIST = "https://api.apis.guru/v2/list.json"
 RAW_DIR = "data/raw"
-
-
-def download_specs(limit=100):
-    os.makedirs(RAW_DIR, exist_ok=True)
-
-    print("Fetching API list from APIs.guru...")
-    response = httpx.get(APIS_GURU_LIST, timeout=30)
-    apis = response.json()
-
-    count = 0
-    for name, info in apis.items():
-        if count >= limit:
-            break
-
+OBJECTS_DIR = "objects"
+MANIFEST_NAME = "manifest.json"
+
+CONCURRENCY = 32
+TIMEOUT = 30
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def safe_name(name):
+    return name.replace(":", "_").replace("/", "_")
+
+
+def spec_url_for(info):
+    """Pick the preferred version's spec URL from an APIs.guru list entry."""
+    preferred = info.get("preferred", "")
+    version_info = info["versions"].get(preferred, {})
+    spec_url = version_info.get("swaggerUrl") or version_info.get("swaggerYamlUrl")
+
+    if not spec_url:
+        first_version = list(info["versions"].values())[0]
+        spec_url = first_version.get("swaggerUrl", "")
+
+    return spec_url
+
+
+def spec_extension(url, content):
+    lowered = url.lower().split("?", 1)[0]
+    if lowered.endswith((".yaml", ".yml")):
+        return ".yaml"
+    if lowered.endswith(".json") or content.lstrip()[:1] in (b"{", b"["):
+        return ".json"
+    return ".yaml"
+
+
+def load_manifest(raw_dir=RAW_DIR):
+    path = os.path.join(raw_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"specs": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, raw_dir=RAW_DIR):
+    path = os.path.join(raw_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def store_object(content, ext, raw_dir=RAW_DIR):
+    """Write content under its SHA-256; identical specs are stored once."""
+    digest = hashlib.sha256(content).hexdigest()
+    rel_path = os.path.join(OBJECTS_DIR, digest[:2], digest + ext)
+    path = os.path.join(raw_dir, rel_path)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return digest, rel_path
+
+
+def prune_objects(manifest, raw_dir=RAW_DIR):
+    """Delete stored objects no manifest entry points at any more."""
+    referenced = {entry["path"] for entry in manifest["specs"].values()}
+    removed = 0
+    objects_root = os.path.join(raw_dir, OBJECTS_DIR)
+    if not os.path.isdir(objects_root):
+        return removed
+    for dirpath, _, filenames in os.walk(objects_root):
+        for filename in filenames:
+            rel_path = os.path.relpath(os.path.join(dirpath, filename), raw_dir)
+            if rel_path not in referenced:
+                os.remove(os.path.join(dirpath, filename))
+                removed += 1
+    return removed
+
+
+async def fetch_with_retry(client, url, headers=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE):
+    """GET with exponential backoff and jitter on transport errors, 429 and 5xx."""
+    for attempt in range(max_retries + 1):
         try:
-            preferred = info.get("preferred", "")
-            version_info = info["versions"].get(preferred, {})
-            spec_url = version_info.get("swaggerUrl") or version_info.get("openapiVer")
-
-            if not spec_url:
-                first_version = list(info["versions"].values())[0]
-                spec_url = first_version.get("swaggerUrl", "")
-
-            if not spec_url:
-                continue
-
-            print(f"[{count + 1}/{limit}] Downloading: {name}")
-            spec_response = httpx.get(spec_url, timeout=15, follow_redirects=True)
-            spec_data = spec_response.text
-
-            safe_name = name.replace(":", "_").replace("/", "_")
-            filepath = os.path.join(RAW_DIR, f"{safe_name}.json")
-
-            with open(filepath, "w") as f:
-                f.write(spec_data)
-
-            count += 1
-
-        except Exception as e:
-            print(f"  Skipping {name}: {e}")
-
-    print(f"\nDone! Downloaded {count} API specs to {RAW_DIR}/")
+            response = await client.get(url, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            retry_after = response.headers.get("retry-after", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff_base * 2 ** attempt
+        except httpx.TransportError:
+            if attempt == max_retries:
+                raise
+            delay = backoff_base * 2 ** attempt
+        await asyncio.sleep(delay + random.uniform(0, backoff_base))
+
+
+async def fetch_spec(client, semaphore, name, url, previous, raw_dir, backoff_base):
+    """Conditionally download one spec; returns (status, manifest_entry)."""
+    headers = {}
+    if previous and previous.get("url") == url:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    async with semaphore:
+        response = await fetch_with_retry(client, url, headers=headers, backoff_base=backoff_base)
+
+    if response.status_code == 304 and previous:
+        return "not_modified", previous
+    response.raise_for_status()
+
+    content = response.content
+    digest, rel_path = store_object(content, spec_extension(url, content), raw_dir)
+    entry = {
+        "url": url,
+        "sha256": digest,
+        "path": rel_path,
+        "bytes": len(content),
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    status = "unchanged" if previous and previous.get("sha256") == digest else "downloaded"
+    return status, entry
+
+
+async def download_specs_async(limit=100, list_url=APIS_GURU_LIST, raw_dir=RAW_DIR,
+                               concurrency=CONCURRENCY, backoff_base=BACKOFF_BASE, prune=True):
+    """Refresh up to `limit` specs concurrently, transferring only what changed."""
+    os.makedirs(raw_dir, exist_ok=True)
+    manifest = load_manifest(raw_dir)
+    previous_specs = manifest["specs"]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(http2=HTTP2, limits=limits, timeout=TIMEOUT, follow_redirects=True) as client:
+        print("Fetching API list from APIs.guru...")
+        response = await fetch_with_retry(client, list_url, backoff_base=backoff_base)
+        response.raise_for_status()
+        apis = response.json()
+
+        jobs = []
+        for name, info in apis.items():
+            if len(jobs) >= limit:
+                break
+            try:
+                url = spec_url_for(info)
+            except (KeyError, IndexError, AttributeError):
+                url = None
+            if url:
+                jobs.append((safe_name(name), url))
+
+        print(f"Refreshing {len(jobs)} specs ({concurrency} connections, HTTP/2 {'on' if HTTP2 else 'off'})...")
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.time()
+        outcomes = await asyncio.gather(
+            *(fetch_spec(client, semaphore, name, url, previous_specs.get(name), raw_dir, backoff_base)
+              for name, url in jobs),
+            return_exceptions=True,
+        )
+
+    stats = {"downloaded": 0, "unchanged": 0, "not_modified": 0, "failed": 0, "bytes": 0}
+    specs = dict(previous_specs)
+    for (name, url), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            stats["failed"] += 1
+            print(f"  Skipping {name}: {outcome}")
+            continue
+        status, entry = outcome
+        stats[status] += 1
+        if status != "not_modified":
+            stats["bytes"] += entry["bytes"]
+        specs[name] = entry
+
+    manifest = {"source": list_url, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "specs": specs}
+    save_manifest(manifest, raw_dir)
+    if prune:
+        stats["pruned"] = prune_objects(manifest, raw_dir)
+    stats["seconds"] = round(time.time() - start, 1)
+
+    print(f"\nDone! {stats['downloaded']} new/changed, {stats['unchanged']} unchanged, "
+          f"{stats['not_modified']} not modified, {stats['failed']} failed "
+          f"({stats['bytes'] / 1e6:.1f}MB in {stats['seconds']}s) -> {raw_dir}/")
+    return stats
+
+
+def download_specs(limit=100, **kwargs):
+    return asyncio.run(download_specs_async(limit=limit, **kwargs))
 
 
 if __name__ == "__main__":
-    download_specs(limit=3000)
\ No newline at end of file
+    download_specs(limit=3000)
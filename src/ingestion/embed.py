@@ -1,18 +1,31 @@
 import os
+import re
 import json
+import argparse
+import itertools
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
+from src.llm.embeddings import get_provider, describe
+from src.ingestion.chunker import iter_chunks_file, content_hash
 
 load_dotenv()
-client = OpenAI()
 
-EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
-CHUNKS_PATH = "data/processed/chunks.json"
 EMBEDDINGS_DIR = "data/processed/embeddings"
+EMBEDDINGS_PATH = "data/processed/embeddings.npy"
+EMBEDDINGS_META_PATH = "data/processed/embeddings_meta.json"
 BATCH_SIZE = 100
 MAX_CHARS = 20000
 
+# Chunks with identical (truncated) text are embedded once and share a row
+EMBED_DEDUPE = os.getenv("EMBED_DEDUPE", "1") == "1"
+# USD per million input tokens, for the dedupe report (unlisted models count as free)
+EMBEDDING_PRICES = {
+    "text-embedding-3-large": 0.13,
+    "text-embedding-3-small": 0.02,
+    "text-embedding-ada-002": 0.10,
+}
+CHARS_PER_TOKEN = 4
+
 
 def truncate_text(text, max_chars=MAX_CHARS):
     if len(text) <= max_chars:
@@ -20,54 +33,194 @@ def truncate_text(text, max_chars=MAX_CHARS):
     return text[:max_chars]
 
 
-def generate_embeddings():
-    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
-
-    with open(CHUNKS_PATH, "r") as f:
-        chunks = json.load(f)
-
-    total = len(chunks)
-    print(f"Total chunks: {total}")
-    print(f"Using model: {EMBEDDING_MODEL}")
-
-    existing = [f for f in os.listdir(EMBEDDINGS_DIR) if f.startswith("batch_") and f.endswith(".npy")]
+def batch_dir(provider, dedupe=True):
+    """Per-model batch directory, so re-embedding never resumes from another model's (or mode's) batches."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{provider.name}_{provider.model}")
+    return os.path.join(EMBEDDINGS_DIR, slug + "_dedupe" if dedupe else slug)
+
+
+def rows_path(embeddings_path=None):
+    """The chunk -> embedding row map saved next to an embeddings file."""
+    root, _ = os.path.splitext(embeddings_path or EMBEDDINGS_PATH)
+    return root + "_rows.npy"
+
+
+def load_rows(embeddings_path=None):
+    """rows[i] is chunk i's row in the embeddings file, or None for builds with one row per chunk."""
+    path = rows_path(embeddings_path)
+    return np.load(path) if os.path.exists(path) else None
+
+
+def dedupe_plan(chunks_path=None, dedupe=True):
+    """Assign every chunk an embedding row; identical texts share one.
+
+    Returns (rows, first, counts): rows[i] is chunk i's row, first[i] marks
+    the chunk whose text is embedded for that row (rows are numbered in
+    order of first occurrence), and counts has the chunk and unique-text
+    totals and the characters that need no embedding.
+    """
+    rows, first = [], []
+    seen = {}
+    chars = duplicate_chars = 0
+    for chunk in iter_chunks_file(chunks_path):
+        text = truncate_text(chunk["text"])
+        chars += len(text)
+        key = content_hash(text) if dedupe else len(rows)
+        row = seen.get(key)
+        if row is None:
+            row = seen[key] = len(seen)
+            first.append(True)
+        else:
+            duplicate_chars += len(text)
+            first.append(False)
+        rows.append(row)
+    counts = {"chunks": len(rows), "unique": len(seen), "chars": chars, "duplicate_chars": duplicate_chars}
+    return np.array(rows, dtype="int32"), np.array(first, dtype=bool), counts
+
+
+def dedupe_report(counts, model):
+    """Dedupe ratio and the embedding tokens and cost that duplicate texts did not incur."""
+    tokens_saved = counts["duplicate_chars"] // CHARS_PER_TOKEN
+    return {
+        **counts,
+        "duplicates": counts["chunks"] - counts["unique"],
+        "dedupe_ratio": round(1 - counts["unique"] / counts["chunks"], 4) if counts["chunks"] else 0.0,
+        "tokens_saved": tokens_saved,
+        "cost_saved_usd": round(tokens_saved / 1e6 * EMBEDDING_PRICES.get(model, 0.0), 4),
+    }
+
+
+def print_dedupe_report(report):
+    print(f"Chunks: {report['chunks']}, unique texts: {report['unique']} "
+          f"({report['duplicates']} duplicates, dedupe ratio {report['dedupe_ratio']:.1%})")
+    print(f"Embedding tokens saved: ~{report['tokens_saved']} (${report['cost_saved_usd']:.2f})")
+
+
+def iter_batches(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def combine_batches(out_dir, output_path=None):
+    """Concatenate batch files into one .npy on disk without holding them all in memory."""
+    output_path = output_path or EMBEDDINGS_PATH
+    files = sorted(f for f in os.listdir(out_dir) if f.startswith("batch_") and f.endswith(".npy"))
+    shapes = [np.load(os.path.join(out_dir, f), mmap_mode="r").shape for f in files]
+    total = sum(shape[0] for shape in shapes)
+    dimension = shapes[0][1]
+
+    combined = np.lib.format.open_memmap(output_path, mode="w+", dtype="float32", shape=(total, dimension))
+    row = 0
+    for f, shape in zip(files, shapes):
+        combined[row:row + shape[0]] = np.load(os.path.join(out_dir, f))
+        row += shape[0]
+    combined.flush()
+    return total, dimension
+
+
+def generate_embeddings(provider=None, chunks_path=None, dedupe=None):
+    """Embed each distinct chunk text once into embeddings.npy.
+
+    The chunk -> row map is saved next to it (embeddings_rows.npy), and
+    the dedupe report is stored in embeddings_meta.json. dedupe=False
+    embeds every chunk (one row each), overriding EMBED_DEDUPE.
+    """
+    provider = provider or get_provider()
+    dedupe = EMBED_DEDUPE if dedupe is None else dedupe
+    out_dir = batch_dir(provider, dedupe)
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows, first, counts = dedupe_plan(chunks_path, dedupe)
+    report = dedupe_report(counts, provider.model)
+    total = report["unique"]
+    print_dedupe_report(report)
+    print(f"Using {provider.name} model: {provider.model}")
+
+    existing = [f for f in os.listdir(out_dir) if f.startswith("batch_") and f.endswith(".npy")]
     start_batch = len(existing)
     start_idx = start_batch * BATCH_SIZE
 
     if start_idx > 0:
-        print(f"Resuming from chunk {start_idx} (batch {start_batch})...")
+        print(f"Resuming from text {start_idx} (batch {start_batch})...")
 
-    for i in range(start_idx, total, BATCH_SIZE):
-        batch = chunks[i:i + BATCH_SIZE]
-        texts = [truncate_text(chunk["text"]) for chunk in batch]
+    # Chunks are streamed from disk; only one batch of texts is in memory at a time
+    texts = (truncate_text(c["text"]) for c, keep in zip(iter_chunks_file(chunks_path), first) if keep)
+    remaining = itertools.islice(texts, start_idx, None)
+    for batch_num, batch in enumerate(iter_batches(remaining, BATCH_SIZE), start=start_batch):
+        i = batch_num * BATCH_SIZE
 
         try:
-            response = client.embeddings.create(
-                model=EMBEDDING_MODEL,
-                input=texts,
-            )
-
-            embeddings = [e.embedding for e in response.data]
-            arr = np.array(embeddings, dtype="float32")
-
-            batch_num = i // BATCH_SIZE
-            np.save(os.path.join(EMBEDDINGS_DIR, f"batch_{batch_num:05d}.npy"), arr)
+            arr = provider.embed(batch)
+            np.save(os.path.join(out_dir, f"batch_{batch_num:05d}.npy"), arr)
 
             print(f"  Embedded {min(i + BATCH_SIZE, total)}/{total}")
 
         except Exception as e:
-            print(f"  Error at chunk {i}: {e}")
-            print(f"  Re-run to resume from chunk {i}.")
-            return
+            print(f"  Error at text {i}: {e}")
+            print(f"  Re-run to resume from text {i}.")
+            return False
 
     print("Combining batches...")
-    all_files = sorted([f for f in os.listdir(EMBEDDINGS_DIR) if f.startswith("batch_")])
-    all_embeddings = np.concatenate([np.load(os.path.join(EMBEDDINGS_DIR, f)) for f in all_files])
-    np.save(os.path.join("data/processed", "embeddings.npy"), all_embeddings)
-
-    print(f"\nDone! Shape: {all_embeddings.shape}")
-    print(f"Saved to data/processed/embeddings.npy")
+    count, dimension = combine_batches(out_dir)
+    np.save(rows_path(), rows)
+
+    with open(EMBEDDINGS_META_PATH, "w") as f:
+        json.dump({
+            **describe(provider),
+            "dimension": int(dimension),
+            "count": int(count),
+            "chunks": int(len(rows)),
+            "dedupe": report,
+        }, f, indent=2)
+
+    print(f"\nDone! Shape: ({count}, {dimension}) for {len(rows)} chunks")
+    print(f"Saved to {EMBEDDINGS_PATH}")
+    return True
+
+
+def rebuild_store(store="faiss", index_type=None):
+    """Index embeddings.npy into the FAISS file or the pgvector table."""
+    if store == "pgvector":
+        from src.search.pgvector_store import load_pgvector
+        load_pgvector(index_type=index_type or "hnsw")
+    else:
+        from src.search.vector_store import build_index
+        build_index(index_type=index_type or "flat")
+
+
+def reembed_corpus(provider_name, model=None, rebuild_index=True, index_type=None, store="faiss", dedupe=None):
+    """Re-embed every chunk with another provider and (optionally) rebuild the index for it."""
+    provider = get_provider(provider_name, model)
+    if not generate_embeddings(provider, dedupe=dedupe):
+        return False
+    if rebuild_index:
+        rebuild_store(store, index_type)
+    return True
 
 
 if __name__ == "__main__":
-    generate_embeddings()
+    parser = argparse.ArgumentParser(description="Embed chunks for the vector index")
+    parser.add_argument("--provider", default=None, help="openai, local or hash (default: EMBEDDING_PROVIDER)")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--rebuild-index", action="store_true")
+    parser.add_argument("--index-type", default=None,
+                        help="flat/hnsw/ivf for faiss, hnsw/ivfflat for pgvector")
+    parser.add_argument("--store", choices=["faiss", "pgvector"], default="faiss",
+                        help="where --rebuild-index writes the index")
+    parser.add_argument("--no-dedupe", action="store_true", help="embed every chunk, even identical texts")
+    parser.add_argument("--dedupe-report", action="store_true",
+                        help="only print the dedupe ratio and embedding cost saved")
+    args = parser.parse_args()
+    dedupe = False if args.no_dedupe else None
+
+    if args.dedupe_report:
+        _, _, counts = dedupe_plan()
+        print_dedupe_report(dedupe_report(counts, get_provider(args.provider, args.model).model))
+    elif args.rebuild_index:
+        reembed_corpus(args.provider, args.model, index_type=args.index_type, store=args.store, dedupe=dedupe)
+    else:
+        generate_embeddings(get_provider(args.provider, args.model), dedupe=dedupe)
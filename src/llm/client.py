@@ -0,0 +1,60 @@
+import os
+import time
+from openai import OpenAI
+from src.tracing import span
+
+
+def openai_client(**kwargs):
+    """OpenAI client honouring OPENAI_BASE_URL, e.g. the load-test stand-in (src.evaluation.fake_openai).
+
+    A local base URL needs no real key, so a placeholder is used when
+    OPENAI_API_KEY is unset.
+    """
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    api_key = os.getenv("OPENAI_API_KEY") or ("local" if base_url else None)
+    return OpenAI(base_url=base_url, api_key=api_key, **kwargs)
+
+
+def chat_completion(client, model, messages, provider="openai", **kwargs):
+    """chat.completions.create inside an "llm.chat" span carrying model, provider and token usage."""
+    with span("llm.chat", **{"llm.provider": provider, "llm.model": model}) as s:
+        response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            s.set_attributes({
+                "llm.usage.prompt_tokens": usage.prompt_tokens,
+                "llm.usage.completion_tokens": usage.completion_tokens,
+            })
+    return response
+
+
+def stream_completion(client, model, messages, on_delta, provider="openai", **kwargs):
+    """Streamed chat completion; on_delta(text) sees each content chunk as it arrives.
+
+    Returns (full_text, usage). The span covers the whole stream and records
+    time to first token.
+    """
+    with span("llm.chat", **{"llm.provider": provider, "llm.model": model, "llm.stream": True}) as s:
+        start = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        parts = []
+        usage = None
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    s.set_attribute("llm.time_to_first_token_ms", round((time.perf_counter() - start) * 1000))
+                parts.append(delta)
+                on_delta(delta)
+        if usage is not None:
+            s.set_attributes({
+                "llm.usage.prompt_tokens": usage.prompt_tokens,
+                "llm.usage.completion_tokens": usage.completion_tokens,
+            })
+    return "".join(parts), usage
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASH_EMBEDDING_DIM = int(os.getenv("HASH_EMBEDDING_DIM", "384"))
+
+
+class OpenAIEmbeddingProvider:
+    """Embeddings from the OpenAI API."""
+
+    name = "openai"
+
+    def __init__(self, model=None):
+        self.model = model or OPENAI_EMBEDDING_MODEL
+        self._client = None
+
+    def embed(self, texts):
+        if self._client is None:
+            from src.llm.client import openai_client
+            self._client = openai_client()
+        response = self._client.embeddings.create(model=self.model, input=list(texts))
+        return np.array([e.embedding for e in response.data], dtype="float32")
+
+
+class LocalEmbeddingProvider:
+    """CPU embeddings from a sentence-transformers model, no network calls after download."""
+
+    name = "local"
+
+    def __init__(self, model=None):
+        self.model = model or LOCAL_EMBEDDING_MODEL
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._encoder is None:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(self.model, device="cpu")
+        return self._encoder
+
+    def embed(self, texts):
+        encoder = self._encoder or self._load()
+        vectors = encoder.encode(
+            list(texts), batch_size=64, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return np.asarray(vectors, dtype="float32")
+
+
+class HashEmbeddingProvider:
+    """Deterministic hash-seeded vectors for offline tests and latency benchmarks.
+
+    Carries no semantic signal; only identical texts map to the same vector.
+    """
+
+    name = "hash"
+
+    def __init__(self, model=None, dimension=None):
+        self.dimension = dimension or HASH_EMBEDDING_DIM
+        self.model = model or f"hash-{self.dimension}"
+
+    def embed(self, texts):
+        vectors = np.empty((len(texts), self.dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dimension)
+            vectors[i] = vec / np.linalg.norm(vec)
+        return vectors
+
+
+PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+    "hash": HashEmbeddingProvider,
+}
+
+_instances = {}
+
+
+def get_provider(name=None, model=None):
+    """Return a shared provider instance (EMBEDDING_PROVIDER by default)."""
+    name = name or DEFAULT_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name} (expected one of {sorted(PROVIDERS)})")
+    key = (name, model)
+    if key not in _instances:
+        _instances[key] = PROVIDERS[name](model=model)
+    return _instances[key]
+
+
+def describe(provider):
+    return {"embedding_provider": provider.name, "embedding_model": provider.model}
+
+
+def check_manifest(manifest, provider):
+    """Reject an index built with a different embedding model than the active one."""
+    built_with = (manifest.get("embedding_provider"), manifest.get("embedding_model"))
+    active = (provider.name, provider.model)
+    if built_with != active:
+        raise RuntimeError(
+            f"Index was built with {built_with[0]}:{built_with[1]} embeddings but the active "
+            f"provider is {active[0]}:{active[1]}. Re-embed the corpus "
+            f"(python3 -m src.ingestion.embed --provider {active[0]} --rebuild-index) "
+            f"or set EMBEDDING_PROVIDER to match."
+        )
@@ -0,0 +1,74 @@
+"""Cost/latency-aware choice of generation model.
+
+Every tier, threshold and SLO cap lives here; callers pass what they know
+about the request and get back the model plus the reason it was picked.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2-chat-latest")
+MID_MODEL = os.getenv("OPENAI_MID_MODEL", "gpt-5-mini")
+FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-5-nano")
+
+TIERS = ("fast", "mid", "full")
+TIER_MODELS = {"fast": FAST_MODEL, "mid": MID_MODEL, "full": MODEL}
+
+# Starting tier per agent query type. Unclassified queries (/ask) stay on the full
+# model they always used; only a latency SLO moves them down
+QUERY_TYPE_TIERS = {"SIMPLE": "fast", "EXPLORE": "mid", "COMPARE": "full"}
+DEFAULT_TIER = "full"
+
+# Packed context above this many tokens needs at least the mid model to synthesize
+LARGE_CONTEXT_TOKENS = int(os.getenv("MODEL_LARGE_CONTEXT_TOKENS", "1500"))
+
+# (max SLO in ms, highest tier that fits it), checked in order
+SLO_TIER_CAPS = ((2000, "fast"), (6000, "mid"))
+
+# Regenerate one tier up when grounding comes back below this
+ESCALATE_BELOW = float(os.getenv("MODEL_ESCALATE_BELOW", "0.5"))
+MAX_ESCALATIONS = int(os.getenv("MODEL_MAX_ESCALATIONS", "1"))
+
+
+def _decision(tier, reason, escalations=0, max_tier="full"):
+    return {"model": TIER_MODELS[tier], "tier": tier, "reason": reason, "escalations": escalations,
+            "max_tier": max_tier}
+
+
+def select_model(query_type=None, context_tokens=0, latency_slo_ms=None):
+    """Pick the cheapest tier that suits the query type and context size, capped by the SLO."""
+    tier = QUERY_TYPE_TIERS.get(query_type, DEFAULT_TIER)
+    reasons = [f"type={query_type or 'unclassified'}"]
+
+    if context_tokens > LARGE_CONTEXT_TOKENS and TIERS.index(tier) < TIERS.index("mid"):
+        tier = "mid"
+        reasons.append(f"context {context_tokens} > {LARGE_CONTEXT_TOKENS} tokens")
+
+    max_tier = "full"
+    if latency_slo_ms is not None:
+        for max_slo, cap in SLO_TIER_CAPS:
+            if latency_slo_ms <= max_slo:
+                max_tier = cap
+                if TIERS.index(tier) > TIERS.index(cap):
+                    tier = cap
+                    reasons.append(f"slo {latency_slo_ms}ms caps at {cap}")
+                break
+
+    return _decision(tier, "; ".join(reasons), max_tier=max_tier)
+
+
+def escalate(decision, grounding_score):
+    """The next tier up if grounding is too low and escalation budget remains, else None.
+
+    Never escalates past the tier the request's latency SLO allows.
+    """
+    if grounding_score >= ESCALATE_BELOW or decision["escalations"] >= MAX_ESCALATIONS:
+        return None
+    max_tier = decision.get("max_tier", "full")
+    position = TIERS.index(decision["tier"])
+    if position >= TIERS.index(max_tier):
+        return None
+    tier = TIERS[position + 1]
+    reason = f"{decision['reason']}; escalated: grounding {grounding_score} < {ESCALATE_BELOW}"
+    return _decision(tier, reason, decision["escalations"] + 1, max_tier)
@@ -3,6 +3,7 @@ import time
 import json
 from openai import OpenAI
 from dotenv import load_dotenv
+from src.llm.client import openai_client
 
 load_dotenv()
 
@@ -14,11 +15,11 @@ class LLMRouter:
         self.providers = []
         self.stats = {}
 
-        # Primary: OpenAI
-        if os.getenv("OPENAI_API_KEY"):
+        # Primary: OpenAI (or an OpenAI-compatible endpoint at OPENAI_BASE_URL)
+        if os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_BASE_URL"):
             self.providers.append({
                 "name": "openai",
-                "client": OpenAI(),
+                "client": openai_client(),
                 "model": os.getenv("OPENAI_MODEL", "gpt-5.2-chat-latest"),
                 "priority": 1,
             })
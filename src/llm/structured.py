@@ -0,0 +1,149 @@
+"""Schema-constrained LLM calls with typed results.
+
+The agent and grounding steps ask for JSON. Here the model is held to a JSON
+schema via response_format and each step gets an output-token cap. The reply
+is validated into a pydantic model, and an invalid reply is retried with the
+validation error before the caller falls back.
+"""
+import os
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, ValidationError
+from src.llm.client import chat_completion
+from src.tracing import current_span
+
+# json_schema (strict structured outputs) or json_object (JSON mode, for deployments without schema support)
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "json_schema")
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "1"))
+
+# Output caps per step. Reasoning models spend part of this on hidden reasoning,
+# so the caps leave headroom over the visible JSON.
+STEP_MAX_TOKENS = {
+    "classify": 256,
+    "decompose": 384,
+    "refine": 384,
+    "revise": 768,
+    # Each verdict quotes its answer sentence
+    "grounding": 2048,
+}
+
+
+class QueryType(BaseModel):
+    type: Literal["SIMPLE", "COMPARE", "EXPLORE"]
+
+
+class SubQueries(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=3)
+
+
+class Revision(BaseModel):
+    claim: str
+    # Empty when the claim cannot be supported and should be dropped
+    revised: str
+
+
+class Revisions(BaseModel):
+    revisions: List[Revision]
+
+
+class ClaimCheck(BaseModel):
+    claim: str
+    status: Literal["SUPPORTED", "UNSUPPORTED", "PARTIAL"]
+    source: Optional[str]
+    # The answer sentence the claim comes from, verbatim, so a revision can replace it
+    answer_sentence: Optional[str] = None
+
+
+class GroundingCheck(BaseModel):
+    claims: List[ClaimCheck]
+
+
+class StructuredOutputError(Exception):
+    pass
+
+
+def strict_schema(model):
+    """JSON schema for model in the form strict mode requires: every property required, no extras."""
+    schema = model.model_json_schema()
+
+    def tighten(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+            # Length bounds on arrays are validated locally; strict mode rejects them
+            node.pop("minItems", None)
+            node.pop("maxItems", None)
+            for value in node.values():
+                tighten(value)
+        elif isinstance(node, list):
+            for value in node:
+                tighten(value)
+
+    tighten(schema)
+    return schema
+
+
+def response_format(model):
+    if STRUCTURED_OUTPUT_MODE == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": strict_schema(model), "strict": True},
+    }
+
+
+def parse(model, raw):
+    """Validate raw model output, tolerating code fences from models that ignore JSON mode."""
+    clean = (raw or "").strip()
+    if clean.startswith("```"):
+        clean = clean.split("\n", 1)[-1].rsplit("```", 1)[0]
+    return model.model_validate_json(clean)
+
+
+def structured_completion(client, model_name, messages, schema, step, retries=None):
+    """Call the LLM for a `schema` instance, re-asking with the validation error on bad output.
+
+    Raises StructuredOutputError once the retries are used up.
+    """
+    retries = STRUCTURED_RETRIES if retries is None else retries
+    messages = list(messages)
+    error = None
+    for attempt in range(retries + 1):
+        response = chat_completion(
+            client, model_name, messages,
+            response_format=response_format(schema),
+            max_completion_tokens=STEP_MAX_TOKENS[step],
+        )
+        raw = response.choices[0].message.content
+        try:
+            result = parse(schema, raw)
+            current_span().set_attribute("structured.attempts", attempt + 1)
+            return result
+        except (ValidationError, ValueError) as e:
+            error = e
+            messages += [
+                {"role": "assistant", "content": raw or ""},
+                {"role": "user", "content": f"That response did not match the required JSON schema: {e}. "
+                                            f"Reply again with only valid JSON."},
+            ]
+
+    current_span().set_attributes({"structured.attempts": retries + 1, "structured.error": str(error)})
+    raise StructuredOutputError(f"{schema.__name__}: no valid response after {retries + 1} attempts: {error}")
+
+
+def grounding_result(check):
+    """Aggregate claim verdicts into the grounding dict callers use."""
+    return summarize_claims([c.model_dump() for c in check.claims])
+
+
+def summarize_claims(claims):
+    """Counts and score over claim dicts with a "status" (PARTIAL counts half)."""
+    supported = sum(1 for c in claims if c["status"] == "SUPPORTED")
+    partial = sum(1 for c in claims if c["status"] == "PARTIAL")
+    total = len(claims)
+    return {
+        "claims": claims,
+        "supported_count": supported,
+        "total_count": total,
+        "grounding_score": round((supported + 0.5 * partial) / total, 3) if total else 0.0,
+    }
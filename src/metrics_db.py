@@ -1,10 +1,27 @@
 import sqlite3
 import os
 import time
-from datetime import datetime
+import atexit
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from src.search.suggest import normalize
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "metrics.db")
 
+ADDED_COLUMNS = [
+    ("model_tier", "TEXT"),
+    ("model_reason", "TEXT"),
+    ("escalations", "INTEGER"),
+]
+
+# Logged queries are counted in memory and upserted into query_counts in batches
+QUERY_FLUSH_SECONDS = float(os.getenv("QUERY_FLUSH_SECONDS", "5"))
+# Counts not seen for this long are pruned, and only the most frequent rows are kept
+QUERY_COUNTS_MAX_AGE_DAYS = int(os.getenv("QUERY_COUNTS_MAX_AGE_DAYS", "90"))
+QUERY_COUNTS_MAX_ROWS = int(os.getenv("QUERY_COUNTS_MAX_ROWS", "100000"))
+QUERY_PRUNE_SECONDS = 3600
+
 def get_db():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -31,12 +48,126 @@ def init_db():
             generate_ms INTEGER,
             generate_tokens INTEGER,
             verify_model TEXT,
-            verify_ms INTEGER
+            verify_ms INTEGER,
+            model_tier TEXT,
+            model_reason TEXT,
+            escalations INTEGER
+        )
+    """)
+    # Databases created before a column existed get it added in place
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(agent_runs)")}
+    for column, column_type in ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE agent_runs ADD COLUMN {column} {column_type}")
+    # Normalized queries from /search, /ask and /agent with their counts; they rank /suggest completions
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_counts (
+            query TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            last_seen TEXT NOT NULL
         )
     """)
+    # The per-request query_log table this replaces is folded into the counts once
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='query_log'").fetchone():
+        counts, last_seen = Counter(), {}
+        for row in conn.execute("SELECT query, timestamp FROM query_log"):
+            query = normalize(row["query"])
+            if query:
+                counts[query] += 1
+                last_seen[query] = max(last_seen.get(query, ""), row["timestamp"])
+        _upsert_counts(conn, counts, last_seen)
+        conn.execute("DROP TABLE query_log")
+    conn.commit()
+    conn.close()
+
+def _upsert_counts(conn, counts, last_seen):
+    conn.executemany("""
+        INSERT INTO query_counts (query, count, last_seen) VALUES (?, ?, ?)
+        ON CONFLICT(query) DO UPDATE SET
+            count = count + excluded.count,
+            last_seen = MAX(last_seen, excluded.last_seen)
+    """, [(query, n, last_seen[query]) for query, n in counts.items()])
+
+def add_query_counts(counts: dict):
+    """Add {normalized query: count} to query_counts in one transaction."""
+    if not counts:
+        return
+    now = datetime.utcnow().isoformat()
+    conn = get_db()
+    _upsert_counts(conn, counts, {query: now for query in counts})
     conn.commit()
     conn.close()
 
+def prune_query_counts(max_age_days: int = None, max_rows: int = None):
+    """Drop counts not seen for max_age_days, then all but the max_rows most frequent."""
+    max_age_days = QUERY_COUNTS_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_rows = QUERY_COUNTS_MAX_ROWS if max_rows is None else max_rows
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+    conn = get_db()
+    conn.execute("DELETE FROM query_counts WHERE last_seen < ?", (cutoff,))
+    conn.execute("""
+        DELETE FROM query_counts WHERE query NOT IN (
+            SELECT query FROM query_counts ORDER BY count DESC, last_seen DESC LIMIT ?
+        )
+    """, (max_rows,))
+    conn.commit()
+    conn.close()
+
+class QueryCounter:
+    """Per-worker query counts, flushed to query_counts by a background thread.
+
+    record() is a dict increment under a lock, so request threads never
+    touch SQLite. The table is pruned at most every QUERY_PRUNE_SECONDS.
+    """
+
+    def __init__(self, interval=QUERY_FLUSH_SECONDS):
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pruned_at = 0.0
+
+    def record(self, query: str):
+        query = normalize(query)
+        if not query:
+            return
+        with self._lock:
+            self._counts[query] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="query-counter")
+                self._thread.start()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        try:
+            add_query_counts(counts)
+            if time.monotonic() - self._pruned_at >= QUERY_PRUNE_SECONDS:
+                prune_query_counts()
+                self._pruned_at = time.monotonic()
+        except Exception as e:
+            print(f"Warning: {sum(counts.values())} queries not logged: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+query_counter = QueryCounter()
+atexit.register(query_counter.flush)
+
+def log_search_query(query: str):
+    query_counter.record(query)
+
+def query_frequencies(limit: int = 100000):
+    """{normalized query: count}, most frequent first."""
+    conn = get_db()
+    rows = conn.execute(
+        "SELECT query, count FROM query_counts ORDER BY count DESC LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return {row["query"]: row["count"] for row in rows}
+
 def log_agent_run(data: dict):
     conn = get_db()
     conn.execute("""
@@ -44,8 +175,8 @@ def log_agent_run(data: dict):
             timestamp, query, query_type, latency_ms, grounding_score, tokens,
             classify_model, classify_ms, decompose_model, decompose_ms,
             retrieve_ms, retrieve_count, generate_model, generate_ms, generate_tokens,
-            verify_model, verify_ms
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            verify_model, verify_ms, model_tier, model_reason, escalations
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         datetime.utcnow().isoformat(),
         data.get("query", ""),
@@ -64,6 +195,9 @@ def log_agent_run(data: dict):
         data.get("generate_tokens", 0),
         data.get("verify_model", ""),
         data.get("verify_ms", 0),
+        data.get("model_tier", ""),
+        data.get("model_reason", ""),
+        data.get("escalations", 0),
     ))
     conn.commit()
     conn.close()
@@ -86,7 +220,7 @@ def get_metrics():
         SELECT id, timestamp, query, query_type, latency_ms, grounding_score, tokens,
                classify_model, classify_ms, decompose_model, decompose_ms,
                retrieve_ms, retrieve_count, generate_model, generate_ms, generate_tokens,
-               verify_model, verify_ms
+               verify_model, verify_ms, model_tier, model_reason, escalations
         FROM agent_runs ORDER BY id DESC LIMIT 10
     """).fetchall()
     
@@ -103,9 +237,40 @@ def get_metrics():
         FROM agent_runs
         GROUP BY classify_model, generate_model
     """).fetchall()
+
+    # Model tier routing: how often each tier is picked and what it costs in latency/grounding
+    tier_stats = conn.execute("""
+        SELECT
+            model_tier,
+            COUNT(*) as runs,
+            ROUND(AVG(latency_ms)) as avg_latency_ms,
+            ROUND(AVG(grounding_score), 3) as avg_grounding,
+            SUM(CASE WHEN escalations > 0 THEN 1 ELSE 0 END) as escalated_runs
+        FROM agent_runs
+        WHERE model_tier IS NOT NULL AND model_tier != ''
+        GROUP BY model_tier
+    """).fetchall()
+    
+    # Share of classify steps the local classifier answered without an LLM call
+    classifier = conn.execute("""
+        SELECT
+            SUM(CASE WHEN classify_model = 'local-classifier' THEN 1 ELSE 0 END) as local_runs,
+            COUNT(*) as total_runs
+        FROM agent_runs
+    """).fetchone()
+    
+    # Agent LLM steps answered from the memo store (src/agents/memo.py) instead of an LLM call
+    memo = conn.execute("""
+        SELECT
+            SUM(CASE WHEN classify_model LIKE 'memo:%' THEN 1 ELSE 0 END) as classify_hits,
+            SUM(CASE WHEN decompose_model LIKE 'memo:%' THEN 1 ELSE 0 END) as decompose_hits
+        FROM agent_runs
+    """).fetchone()
     
     conn.close()
     
+    local_runs = classifier["local_runs"] or 0
+    total_runs = classifier["total_runs"] or 0
     return {
         "summary": {
             "total_queries": summary["total_queries"] or 0,
@@ -115,6 +280,17 @@ def get_metrics():
         },
         "recent_runs": [dict(r) for r in recent],
         "model_stats": [dict(r) for r in model_stats],
+        "tier_stats": [dict(r) for r in tier_stats],
+        "classifier": {
+            "local_runs": local_runs,
+            "llm_runs": total_runs - local_runs,
+            "skip_rate": round(local_runs / total_runs, 3) if total_runs else 0,
+        },
+        "memo": {
+            "classify_hits": memo["classify_hits"] or 0,
+            "decompose_hits": memo["decompose_hits"] or 0,
+            "llm_calls_saved": (memo["classify_hits"] or 0) + (memo["decompose_hits"] or 0),
+        },
     }
 
 # Initialize on import
@@ -0,0 +1,145 @@
+"""Decide how much of a candidate list the cross-encoder has to see.
+
+The vector scores (inner products of normalized embeddings, sorted
+descending) often settle the ranking already. The cut is the top_k-th
+candidate that survives the diversity step (one hit per API by default).
+When it leads the next surviving candidate by a wide margin, the
+cross-encoder is skipped on the bet that it would rarely change the final
+set; it can still reorder anything, so this trades some quality for
+latency. Otherwise only the band of candidates within RERANK_BAND of the
+cut is reranked, so the candidate count follows the score distribution
+rather than a fixed multiple of top_k. MMR picks depend on the stored
+vectors, not only the scores, so under MMR reranking is never skipped.
+"""
+import os
+import threading
+from collections import Counter
+from src.search.diversity import api_name, per_api_limit
+from src.tracing import current_span
+
+# always: rerank every candidate; adaptive: skip or band-limit reranking from the vector
+# scores (opt-in until eval.py --compare-rerank shows it keeps quality)
+RERANK_MODE = os.getenv("RERANK_MODE", "always")
+RERANK_MODES = ("adaptive", "always")
+# Gap between the top_k-th and the next surviving vector score that skips reranking
+SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.05"))
+# Candidates scoring within this distance below the cut are still in contention
+BAND_WIDTH = float(os.getenv("RERANK_BAND", "0.1"))
+# The band never shrinks below top_k * this, leaving room for the per-API dedupe
+MIN_BAND_MULTIPLIER = 2
+
+PATHS = ("skip", "band", "full")
+_paths = Counter()
+_candidates = Counter()
+_lock = threading.Lock()
+
+
+def admitted(groups, per_group):
+    """Positions kept when at most per_group results share a group, in order."""
+    counts = Counter()
+    kept = []
+    for i, group in enumerate(groups):
+        if counts[group] < per_group:
+            counts[group] += 1
+            kept.append(i)
+    return kept
+
+
+def plan(scores, top_k, mode=None, groups=None, per_group=None):
+    """{"path", "candidates"} for vector scores sorted descending.
+
+    skip: keep the vector order; band: rerank the first `candidates`
+    results and drop the rest; full: rerank everything. groups and
+    per_group describe the diversity step that follows (the API of each
+    result and how many per API it keeps); per_group None with groups
+    means the selection cannot be predicted from scores, so no skip.
+    """
+    mode = mode or RERANK_MODE
+    n = len(scores)
+    if mode == "always":
+        return {"path": "full", "candidates": n}
+    if mode != "adaptive":
+        raise ValueError(f"Unknown rerank mode: {mode} (expected one of {RERANK_MODES})")
+
+    can_skip = groups is None or bool(per_group)
+    positions = admitted(groups, per_group) if groups is not None and per_group else list(range(n))
+    kept = [scores[i] for i in positions]
+    k = min(top_k, len(kept))
+    if can_skip and (len(kept) <= 1 or (len(kept) > k and kept[k - 1] - kept[k] >= SKIP_MARGIN)):
+        return {"path": "skip", "candidates": 0}
+    if not kept:
+        return {"path": "full", "candidates": n}
+
+    floor = kept[k - 1] - BAND_WIDTH
+    in_band = sum(1 for s in scores if s >= floor)
+    # Deep enough to hold top_k * MIN_BAND_MULTIPLIER results that survive diversity
+    reach = positions[min(len(positions), top_k * MIN_BAND_MULTIPLIER) - 1] + 1
+    candidates = min(n, max(in_band, reach))
+    return {"path": "full" if candidates == n else "band", "candidates": candidates}
+
+
+def diversity_groups(results, diversity=None, max_per_api=None):
+    """(groups, per_group) arguments to plan() for the diversity step after reranking."""
+    return [api_name(r) for r in results], per_api_limit(diversity, max_per_api)
+
+
+def record(decision, total):
+    with _lock:
+        _paths[decision["path"]] += 1
+        _candidates["considered"] += total
+        _candidates["reranked"] += decision["candidates"]
+
+
+def rerank_stats():
+    """How often each path fired and the share of candidates that reached the cross-encoder."""
+    with _lock:
+        runs = sum(_paths.values())
+        considered = _candidates["considered"]
+        return {
+            "mode": RERANK_MODE,
+            "runs": runs,
+            "paths": {path: _paths[path] for path in PATHS},
+            "skip_rate": round(_paths["skip"] / runs, 4) if runs else 0,
+            "reranked_fraction": round(_candidates["reranked"] / considered, 4) if considered else 0,
+        }
+
+
+def reset_stats():
+    with _lock:
+        _paths.clear()
+        _candidates.clear()
+
+
+def adaptive_rerank(query, results, top_k, rerank_fn, mode=None, diversity=None, max_per_api=None):
+    """rerank_fn(query, candidates, top_k=...) applied to the part of results the plan selects.
+
+    diversity and max_per_api are those of the diversify() call that follows.
+    """
+    decision = plan([r["score"] for r in results], top_k, mode, *diversity_groups(results, diversity, max_per_api))
+    record(decision, len(results))
+    current_span().set_attributes({"rerank.path": decision["path"], "rerank.planned": decision["candidates"]})
+    if decision["path"] == "skip":
+        return results
+    return rerank_fn(query, results[:decision["candidates"]], top_k=top_k * 2)
+
+
+def adaptive_rerank_batch(queries, batch, top_k, rerank_batch_fn, mode=None, diversity=None, max_per_api=None):
+    """adaptive_rerank for many queries, with one batched cross-encoder call for those that need it."""
+    decisions = [
+        plan([r["score"] for r in results], top_k, mode, *diversity_groups(results, diversity, max_per_api))
+        for results in batch
+    ]
+    for decision, results in zip(decisions, batch):
+        record(decision, len(results))
+
+    todo = [i for i, d in enumerate(decisions) if d["path"] != "skip" and batch[i]]
+    reranked = rerank_batch_fn(
+        [queries[i] for i in todo],
+        [batch[i][:decisions[i]["candidates"]] for i in todo],
+        top_k=top_k * 2,
+    ) if todo else []
+
+    out = list(batch)
+    for i, results in zip(todo, reranked):
+        out[i] = results
+    return out
@@ -0,0 +1,110 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so trivially different queries share an entry."""
+    return " ".join(query.lower().split())
+
+
+def make_key(query, top_k, use_reranker, filters, index_version, options=None):
+    """Cache key; options holds any other result-shaping parameters (e.g. diversity settings)."""
+    filter_key = json.dumps(filters, sort_keys=True) if filters else ""
+    options_key = json.dumps(options, sort_keys=True) if options else ""
+    return (normalize_query(query), int(top_k), bool(use_reranker), filter_key, index_version, options_key)
+
+
+def estimate_size(results):
+    """Approximate in-memory footprint of a result list, in bytes."""
+    return len(json.dumps(results, default=str))
+
+
+class ResultCache:
+    """Bounded search result cache with size-aware LRU eviction.
+
+    Entries older than ttl are stale; within stale_ttl beyond that they can
+    still be served while the caller refreshes them in the background.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, stale_ttl=0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        """Return (results, age_seconds, state) where state is fresh, stale or miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None, 0.0, "miss"
+
+            results, size, created = entry
+            age = now - created
+            if age <= self.ttl:
+                state = "fresh"
+                self.stats["hits"] += 1
+            elif age <= self.ttl + self.stale_ttl:
+                state = "stale"
+                self.stats["stale_hits"] += 1
+            else:
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None, 0.0, "miss"
+
+            self._entries.move_to_end(key)
+            return results, age, state
+
+    def put(self, key, results):
+        size = estimate_size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (results, size, time.time())
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def claim_refresh(self, key):
+        """Return True if the caller should refresh key (only one refresher at a time)."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hit_rate": round((self.stats["hits"] + self.stats["stale_hits"]) / lookups, 4)
+                    if lookups else 0,
+            }
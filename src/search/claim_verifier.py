@@ -0,0 +1,221 @@
+"""Claim-level grounding that runs while the answer is still streaming.
+
+Each finished sentence of the answer is a claim. It is embedded and compared
+against the vectors of the source chunks the answer was generated from, on a
+worker pool, so most claims are settled before generation ends. Verdicts are
+cached per (claim, source set). Identifiers in a claim (paths, numbers,
+CamelCase names) must also appear in the best-matching source for the claim
+to count as fully supported.
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from src.llm.structured import summarize_claims
+
+# llm: the post-hoc check_grounding LLM call; incremental: this verifier. The similarity
+# thresholds are not calibrated per embedding model, and similarity cannot tell a
+# contradicted claim from a supported one, so the verifier is opt-in
+GROUNDING_MODE = os.getenv("GROUNDING_MODE", "llm")
+SUPPORT_THRESHOLD = float(os.getenv("CLAIM_SUPPORT_THRESHOLD", "0.55"))
+PARTIAL_THRESHOLD = float(os.getenv("CLAIM_PARTIAL_THRESHOLD", "0.4"))
+VERIFY_WORKERS = int(os.getenv("CLAIM_VERIFY_WORKERS", "8"))
+MIN_CLAIM_WORDS = 4
+CLAIM_CACHE_SIZE = 10000
+
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+_CITATION = re.compile(r"\[Source \d+\]")
+_MARKUP = re.compile(r"[|*_`#>]+|^\s*(?:[-+]|\d+\.)\s+")
+_TABLE_RULE = re.compile(r"^[\s|:-]+$")
+_SALIENT = re.compile(r"/[\w{}./-]+|\b\d[\d.,]*\b|\b[A-Z][a-z]+[A-Z]\w*\b")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+_executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="claim-verify")
+
+
+class SentenceSplitter:
+    """Turn a stream of text deltas into complete sentences."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, delta):
+        self._buffer += delta
+        parts = _BOUNDARY.split(self._buffer)
+        # The last piece may still be growing
+        self._buffer = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def clean_claim(sentence):
+    """Claim text with markdown and citations removed, or None for headings, table rules and fragments."""
+    if _TABLE_RULE.match(sentence):
+        return None
+    text = _WHITESPACE.sub(" ", _MARKUP.sub(" ", _CITATION.sub("", sentence))).strip(" :")
+    if len(text.split()) < MIN_CLAIM_WORDS:
+        return None
+    return text
+
+
+def salient_tokens(claim):
+    return {t.lower().rstrip(".,") for t in _SALIENT.findall(claim)}
+
+
+def source_set_key(sources):
+    digest = hashlib.sha1()
+    for s in sources:
+        digest.update(s.get("packed_text", s["text"]).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ClaimCache:
+    """Bounded LRU of verdicts keyed by (claim, source set)."""
+
+    def __init__(self, max_entries=CLAIM_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is not None:
+                self._entries.move_to_end(key)
+            return verdict
+
+    def put(self, key, verdict):
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+claim_cache = ClaimCache()
+
+
+class ClaimVerifier:
+    """Verify an answer's claims against its sources as the text arrives.
+
+    sources are the results the answer was generated from, in context order
+    (so "Source N" lines up with the prompt); source_vectors holds their
+    L2-normalized embeddings; embed_fn maps a list of texts to normalized vectors.
+    """
+
+    def __init__(self, sources, source_vectors, embed_fn, cache=None, executor=None):
+        self.sources = sources
+        self.source_vectors = np.asarray(source_vectors, dtype="float32")
+        # Identifiers must appear in the text the model saw (packed_text when the context was trimmed)
+        self.source_texts = [s.get("packed_text", s["text"]).lower() for s in sources]
+        self.embed_fn = embed_fn
+        self.cache = cache if cache is not None else claim_cache
+        self.executor = executor or _executor
+        self.key = source_set_key(sources)
+        self.splitter = SentenceSplitter()
+        self.futures = []
+
+    def add_text(self, delta):
+        for sentence in self.splitter.feed(delta):
+            self.add_claim(sentence)
+
+    def add_claim(self, sentence):
+        claim = clean_claim(sentence)
+        if claim is None:
+            return
+        verdict = self.cache.get((claim.lower(), self.key))
+        if verdict is not None:
+            future = Future()
+            future.set_result(verdict)
+        else:
+            future = self.executor.submit(self._verify, claim)
+        self.futures.append(future)
+
+    def _verify(self, claim):
+        if not self.sources:
+            return {"claim": claim, "status": "UNSUPPORTED", "source": None, "similarity": 0.0}
+
+        vector = np.asarray(self.embed_fn([claim]), dtype="float32")[0]
+        similarities = self.source_vectors @ vector
+        best = int(similarities.argmax())
+        similarity = float(similarities[best])
+
+        if similarity >= SUPPORT_THRESHOLD:
+            status = "SUPPORTED"
+        elif similarity >= PARTIAL_THRESHOLD:
+            status = "PARTIAL"
+        else:
+            status = "UNSUPPORTED"
+
+        # A close paraphrase that names an endpoint/number the source lacks is not fully grounded
+        if status == "SUPPORTED" and any(t not in self.source_texts[best] for t in salient_tokens(claim)):
+            status = "PARTIAL"
+
+        verdict = {
+            "claim": claim,
+            "status": status,
+            "source": f"Source {best + 1}" if status != "UNSUPPORTED" else None,
+            "similarity": round(similarity, 3),
+        }
+        self.cache.put((claim.lower(), self.key), verdict)
+        return verdict
+
+    def finish(self):
+        """Verify the trailing sentence and return the grounding dict once every claim is settled."""
+        for sentence in self.splitter.flush():
+            self.add_claim(sentence)
+
+        claims = []
+        for future in self.futures:
+            try:
+                claims.append(dict(future.result()))
+            except Exception as e:
+                print(f"Warning: claim verification failed: {e}")
+        return summarize_claims(claims)
+
+
+def claim_key(claim):
+    """Words of a claim, lowercased; tolerates the punctuation and spacing an LLM changes when echoing it."""
+    return " ".join(_WORD.findall(claim.lower()))
+
+
+def replace_claims(answer, replacements):
+    """Swap the sentences whose claim matches a key of replacements; an empty replacement drops the sentence.
+
+    Returns (new_answer, revised_sentences, replaced_claim_keys). Text
+    outside the replaced sentences is kept as is.
+    """
+    targets = {claim_key(claim): revised.strip() for claim, revised in replacements.items()}
+    # Even positions are sentences, odd positions the separators after them
+    pieces = re.split(f"({_BOUNDARY.pattern})", answer)
+    revised_sentences, replaced = [], set()
+    for i in range(0, len(pieces), 2):
+        sentence = pieces[i].strip()
+        claim = clean_claim(sentence) if sentence else None
+        if claim is None or claim_key(claim) not in targets:
+            continue
+        replaced.add(claim_key(claim))
+        revised = targets[claim_key(claim)]
+        if revised:
+            pieces[i] = pieces[i].replace(sentence, revised)
+            revised_sentences.append(revised)
+        else:
+            pieces[i] = ""
+            if i + 1 < len(pieces):
+                pieces[i + 1] = ""
+    return "".join(pieces).strip(), revised_sentences, replaced
+
+
+def verify_answer(answer, sources, source_vectors, embed_fn, **kwargs):
+    """Verify a complete answer (non-streaming callers)."""
+    verifier = ClaimVerifier(sources, source_vectors, embed_fn, **kwargs)
+    verifier.add_text(answer)
+    return verifier.finish()
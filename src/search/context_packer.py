@@ -0,0 +1,146 @@
+import os
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or encoding files unavailable offline
+    _encoding = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+MAX_CHUNK_TOKENS = 300
+MIN_CHUNK_TOKENS = 40
+LEAD_SENTENCES = 3
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "you", "your",
+    "can", "how", "what", "which", "who", "does", "api", "apis", "need", "want", "use",
+    "into", "about", "there", "their", "have", "has", "not", "but", "all", "any",
+}
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def terms(text):
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS}
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def trim_to_relevant(text, query_terms, max_tokens=MAX_CHUNK_TOKENS):
+    """Keep the first line plus the sentences sharing the most terms with the query."""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    sentences = split_sentences(text)
+    if not sentences:
+        return text
+
+    # The first line is the title or "METHOD /path"; always keep it
+    keep = {0}
+    budget = max_tokens - count_tokens(sentences[0])
+    overlap = {i: len(terms(sentences[i]) & query_terms) for i in range(1, len(sentences))}
+    ranked = sorted(overlap, key=lambda i: (-overlap[i], i))
+    for i in ranked:
+        # Sentences unrelated to the query only fill in a short lead
+        if overlap[i] == 0 and len(keep) >= LEAD_SENTENCES:
+            break
+        cost = count_tokens(sentences[i])
+        if cost <= budget:
+            keep.add(i)
+            budget -= cost
+        if budget <= 0:
+            break
+
+    trimmed = [sentences[i] for i in sorted(keep)]
+    if budget < 0 or not trimmed:
+        return sentences[0][: max_tokens * 4]
+    return "\n".join(trimmed)
+
+
+def is_near_duplicate(candidate_terms, kept_terms, threshold=NEAR_DUPLICATE_THRESHOLD):
+    for other in kept_terms:
+        union = candidate_terms | other
+        if union and len(candidate_terms & other) / len(union) >= threshold:
+            return True
+    return False
+
+
+def format_source(n, result, text, include_score=True):
+    meta = result["metadata"]
+    part = f"[Source {n}] API: {meta['api_name']}\n"
+    if include_score:
+        part += f"Score: {result.get('rerank_score', result['score']):.3f}\n"
+    if meta.get("type") == "endpoint":
+        part += f"Endpoint: {meta.get('method', '')} {meta.get('path', '')}\n"
+    part += f"Content: {text}\n"
+    return part
+
+
+def pack_context(query, results, token_budget=CONTEXT_TOKEN_BUDGET,
+                 max_chunk_tokens=MAX_CHUNK_TOKENS, include_score=True, first_source=1):
+    """Build a prompt context that fits a token budget.
+
+    Results are taken in reranker-score order, near-duplicates are dropped,
+    and each chunk is trimmed to its most query-relevant sentences.
+    Sources are numbered from first_source, so a context that extends an
+    earlier one keeps that one's [Source N] citations valid.
+    Returns (context, packed_results, stats); each packed result is a copy
+    carrying the text the prompt got as "packed_text".
+    """
+    query_terms = terms(query)
+    ordered = sorted(results, key=lambda r: r.get("rerank_score", r["score"]), reverse=True)
+
+    parts, packed, kept_terms = [], [], []
+    used = 0
+    dropped_duplicates = 0
+    raw_tokens = 0
+
+    for i, r in enumerate(ordered):
+        raw_tokens += count_tokens(format_source(i + 1, r, r["text"], include_score))
+
+        chunk_terms = terms(r["text"])
+        if is_near_duplicate(chunk_terms, kept_terms):
+            dropped_duplicates += 1
+            continue
+
+        remaining = token_budget - used
+        if remaining < MIN_CHUNK_TOKENS:
+            continue
+
+        text = trim_to_relevant(r["text"], query_terms, min(max_chunk_tokens, remaining - 20))
+        part = format_source(first_source + len(packed), r, text, include_score)
+        cost = count_tokens(part)
+        if cost > remaining:
+            continue
+
+        parts.append(part)
+        packed.append({**r, "packed_text": text})
+        kept_terms.append(chunk_terms)
+        used += cost
+
+    stats = {
+        "context_raw": raw_tokens,
+        "context_packed": used,
+        "context_saved": max(0, raw_tokens - used),
+        "dropped_duplicates": dropped_duplicates,
+        "dropped_budget": len(ordered) - len(packed) - dropped_duplicates,
+    }
+    return "\n---\n".join(parts), packed, stats
+
+
+def grounding_sources(packed):
+    """Sources for the grounding check: what the model saw, not the untrimmed chunks."""
+    return [
+        {"api_name": r["metadata"]["api_name"], "text": r.get("packed_text", r["text"])}
+        for r in packed
+    ]
@@ -0,0 +1,121 @@
+"""Diversity-aware selection of the final results.
+
+dedupe keeps the first hit per API (the original behaviour). cap allows up
+to MAX_PER_API hits per API. mmr picks results by Maximal Marginal
+Relevance over the candidates' stored vectors: each pick trades relevance
+against similarity to what is already picked, so near-identical chunks
+give way to different endpoints and APIs without a hard one-per-API rule.
+"""
+import os
+from collections import Counter
+import numpy as np
+
+DIVERSITY_MODE = os.getenv("DIVERSITY_MODE", "dedupe")
+DIVERSITY_MODES = ("dedupe", "cap", "mmr")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MAX_PER_API = int(os.getenv("MAX_PER_API", "2"))
+
+
+def api_name(result):
+    return result.get("metadata", {}).get("api_name", "")
+
+
+def dedupe_by_api(results):
+    """Keep only the first (highest ranked) result per API name."""
+    seen = set()
+    deduped = []
+    for r in results:
+        name = api_name(r)
+        if name not in seen:
+            seen.add(name)
+            deduped.append(r)
+    return deduped
+
+
+def cap_per_api(results, max_per_api=None):
+    """Keep results in order, at most max_per_api per API name."""
+    max_per_api = max_per_api or MAX_PER_API
+    counts = Counter()
+    kept = []
+    for r in results:
+        name = api_name(r)
+        if counts[name] < max_per_api:
+            counts[name] += 1
+            kept.append(r)
+    return kept
+
+
+def per_api_limit(mode=None, max_per_api=None):
+    """How many results per API the mode keeps, or None when the picks depend on vectors (mmr)."""
+    mode = mode or DIVERSITY_MODE
+    if mode == "dedupe":
+        return 1
+    if mode == "cap":
+        return max_per_api or MAX_PER_API
+    return None
+
+
+def relevance_scores(results):
+    """Relevance in [0, 1]: min-max scaled rerank scores when every result has one, else vector scores."""
+    if results and all("rerank_score" in r for r in results):
+        values = np.array([r["rerank_score"] for r in results], dtype="float64")
+    else:
+        values = np.array([r["score"] for r in results], dtype="float64")
+    spread = values.max() - values.min() if len(values) else 0.0
+    if spread <= 0:
+        return np.ones(len(values))
+    return (values - values.min()) / spread
+
+
+def mmr_select(relevance, vectors, k, mmr_lambda=None, groups=None, max_per_group=None):
+    """Indices of up to k items in Maximal Marginal Relevance order.
+
+    vectors are L2-normalized rows. Each step picks the item maximizing
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the picks
+    so far), updating that similarity with one matrix-vector product.
+    groups/max_per_group cap how many picks share a group.
+    """
+    mmr_lambda = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    relevance = np.asarray(relevance, dtype="float64")
+    vectors = np.asarray(vectors, dtype="float32")
+    n = len(relevance)
+    groups = np.asarray(groups, dtype=object) if groups is not None else None
+
+    redundancy = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    counts = Counter()
+    picked = []
+    while len(picked) < min(k, n) and available.any():
+        objective = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        objective[~available] = -np.inf
+        best = int(objective.argmax())
+        picked.append(best)
+        available[best] = False
+        if groups is not None and max_per_group:
+            counts[groups[best]] += 1
+            if counts[groups[best]] >= max_per_group:
+                available &= groups != groups[best]
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return picked
+
+
+def diversify(results, top_k, vectors_fn, mode=None, mmr_lambda=None, max_per_api=None):
+    """The final top_k results under the given diversity mode.
+
+    vectors_fn maps results to their normalized stored vectors (only called for mmr).
+    max_per_api also caps mmr picks when given.
+    """
+    mode = mode or DIVERSITY_MODE
+    if mode == "dedupe":
+        return dedupe_by_api(results)[:top_k]
+    if mode == "cap":
+        return cap_per_api(results, max_per_api)[:top_k]
+    if mode != "mmr":
+        raise ValueError(f"Unknown diversity mode: {mode} (expected one of {DIVERSITY_MODES})")
+    if not results:
+        return results
+    picked = mmr_select(
+        relevance_scores(results), vectors_fn(results), top_k, mmr_lambda,
+        groups=[api_name(r) for r in results], max_per_group=max_per_api,
+    )
+    return [results[i] for i in picked]
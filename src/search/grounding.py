@@ -1,10 +1,11 @@
-import os
-from openai import OpenAI
 from dotenv import load_dotenv
+from src.tracing import span
+from src.llm.client import openai_client
+from src.llm.structured import GroundingCheck, StructuredOutputError, structured_completion, grounding_result
+from src.llm.model_policy import MODEL
 
 load_dotenv()
-client = OpenAI()
-MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2-chat-latest")
+client = openai_client()
 
 GROUNDING_PROMPT = """You are a grounding verification system. Your job is to check whether each claim in an AI-generated answer is supported by the provided source documents.
 
@@ -13,16 +14,9 @@ For each claim in the answer, determine if it is:
 - UNSUPPORTED: Not found in the sources
 - PARTIAL: Loosely related but not directly stated
 
-Respond in this exact JSON format:
-{
-  "claims": [
-    {"claim": "the claim text", "status": "SUPPORTED", "source": "which source"},
-    {"claim": "the claim text", "status": "UNSUPPORTED", "source": null}
-  ],
-  "supported_count": 0,
-  "total_count": 0,
-  "grounding_score": 0.0
-}
+Respond in JSON: {"claims": [{"claim": "...", "status": "SUPPORTED", "source": "Source N", "answer_sentence": "..."}]}
+Use "source": null when no source backs the claim. Keep each claim short.
+"answer_sentence" is the sentence of the answer the claim comes from, copied exactly as written.
 """
 
 
@@ -38,29 +32,20 @@ def check_grounding(answer, sources):
         {"role": "user", "content": f"Sources:\n{source_text}\n\nAnswer to verify:\n{answer}"},
     ]
 
-    response = client.chat.completions.create(
-        model=MODEL,
-        messages=messages,
-    )
-
-    raw = response.choices[0].message.content
-
-    try:
-        import json
-        clean = raw.strip()
-        if clean.startswith("```"):
-            clean = clean.split("\n", 1)[1].rsplit("```", 1)[0]
-        result = json.loads(clean)
-    except (json.JSONDecodeError, IndexError):
-        result = {
-            "claims": [],
-            "supported_count": 0,
-            "total_count": 0,
-            "grounding_score": 0.0,
-            "raw_response": raw,
-        }
-
-    return result
+    with span("grounding"):
+        try:
+            check = structured_completion(client, MODEL, messages, GroundingCheck, step="grounding")
+        except StructuredOutputError as e:
+            print(f"Warning: grounding check failed: {e}")
+            return {
+                "claims": [],
+                "supported_count": 0,
+                "total_count": 0,
+                "grounding_score": 0.0,
+                "error": str(e),
+            }
+
+    return grounding_result(check)
 
 
 if __name__ == "__main__":
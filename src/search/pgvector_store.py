@@ -0,0 +1,379 @@
+"""pgvector-backed vector store.
+
+Vectors and their chunk metadata live in one Postgres table, so every API
+node shares a single copy instead of loading its own FAISS file, and
+metadata filters run in the WHERE clause of the ANN query instead of over
+over-fetched results. Serve it with VECTOR_STORE=pgvector after loading the
+embed.py output:
+
+    python3 -m src.search.pgvector_store --index-type hnsw
+"""
+import io
+import os
+import re
+import json
+import time
+import struct
+import argparse
+import threading
+from contextlib import contextmanager
+import numpy as np
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+from dotenv import load_dotenv
+from src.search.vector_store import (
+    EMBEDDINGS_PATH, HNSW_M, HNSW_EF_SEARCH, IVF_NPROBE, ADD_BATCH_SIZE,
+    load_embeddings_meta, chunk_vectors, fold_duplicates,
+)
+from src.ingestion.chunker import iter_chunks_file
+from src.ingestion.embed import load_rows
+from src.tracing import span
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/api_universe")
+PGVECTOR_TABLE = os.getenv("PGVECTOR_TABLE", "api_chunks")
+PG_INDEX_TYPES = ("hnsw", "ivfflat")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+PG_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", str(HNSW_EF_SEARCH)))
+PG_PROBES = int(os.getenv("PGVECTOR_PROBES", str(IVF_NPROBE)))
+PG_MAINTENANCE_WORK_MEM = os.getenv("PG_MAINTENANCE_WORK_MEM", "1GB")
+HNSW_EF_CONSTRUCTION = 128
+
+# pgvector can index vector columns up to 2000 dimensions and halfvec up to 4000
+MAX_VECTOR_INDEX_DIM = 2000
+# hnsw.iterative_scan keeps filtered HNSW queries from returning fewer than k rows
+ITERATIVE_SCAN_VERSION = (0, 8)
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+JSONB_VERSION = b"\x01"
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def check_identifier(name):
+    """Table names are interpolated into SQL, so only plain lowercase identifiers are accepted."""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid table name: {name!r}")
+    return name
+
+
+def column_type(dimension):
+    """(column type, operator class) that can carry an ANN index at this dimension."""
+    if dimension <= MAX_VECTOR_INDEX_DIM:
+        return "vector", "vector_cosine_ops"
+    return "halfvec", "halfvec_cosine_ops"
+
+
+def filter_clause(filters):
+    """SQL condition and params for metadata equality filters (the semantics of matches_filters).
+
+    Each field becomes a jsonb containment test, which the GIN index on the
+    metadata serves; a list value matches any of its items.
+    """
+    if not filters:
+        return "TRUE", []
+    clauses, params = [], []
+    for field, expected in sorted(filters.items()):
+        options = expected if isinstance(expected, list) else [expected]
+        if not options:
+            return "FALSE", []
+        clauses.append("(" + " OR ".join(["doc->'metadata' @> %s::jsonb"] * len(options)) + ")")
+        params += [json.dumps({field: value}) for value in options]
+    return " AND ".join(clauses), params
+
+
+def index_sql(table, index_type, opclass, count):
+    """CREATE INDEX for the embedding column, sized like the FAISS index of the same type."""
+    if index_type == "hnsw":
+        return (f"CREATE INDEX ON {table} USING hnsw (embedding {opclass}) "
+                f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})")
+    if index_type == "ivfflat":
+        lists = max(1, int(np.sqrt(count)))
+        return f"CREATE INDEX ON {table} USING ivfflat (embedding {opclass}) WITH (lists = {lists})"
+    raise ValueError(f"Unknown pgvector index type: {index_type} (expected one of {PG_INDEX_TYPES})")
+
+
+def vector_bytes(vector, column="vector"):
+    """pgvector's binary wire format: dimension, an unused int16, then big-endian floats."""
+    dtype = ">f2" if column == "halfvec" else ">f4"
+    return struct.pack(">HH", len(vector), 0) + np.asarray(vector).astype(dtype).tobytes()
+
+
+def copy_buffer(docs, vectors, first_id, column="vector"):
+    """A binary COPY stream of (id, doc, embedding) rows; ids continue from first_id."""
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    for offset, (doc, vector) in enumerate(zip(docs, vectors)):
+        doc_bytes = JSONB_VERSION + json.dumps(doc).encode("utf-8")
+        embedding = vector_bytes(vector, column)
+        buffer.write(struct.pack(">hiq", 3, 8, first_id + offset))
+        buffer.write(struct.pack(">i", len(doc_bytes)) + doc_bytes)
+        buffer.write(struct.pack(">i", len(embedding)) + embedding)
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def parse_version(text):
+    return tuple(int(part) for part in re.findall(r"\d+", text or "")[:2])
+
+
+class ConnectionPool:
+    """A ThreadedConnectionPool that queues callers instead of failing when it is exhausted.
+
+    psycopg2 raises PoolError once maxconn connections are checked out; a
+    semaphore of the same size makes callers wait up to timeout seconds.
+    """
+
+    def __init__(self, dsn=None, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX, timeout=PG_POOL_TIMEOUT):
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn or DATABASE_URL)
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._registered = False
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection; the transaction commits on exit and rolls back on error."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No Postgres connection free within {self.timeout}s ({self.maxconn} in use)")
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            if not self._registered:
+                # The vector type adapters are process-wide once registered
+                register_vector(conn)
+                self._registered = True
+            yield conn
+            conn.commit()
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    def close(self):
+        self.pool.closeall()
+
+
+def read_manifest(cur, table):
+    cur.execute(f"SELECT value FROM {table}_meta WHERE key = 'manifest'")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def manifest_version(manifest):
+    return f"pg-{manifest['load_id']}"
+
+
+class PgVectorStore:
+    """Vector search over a table loaded by load_pgvector (same interface as FaissStore)."""
+
+    name = "pgvector"
+
+    def __init__(self, dsn=None, table=None, validate=None, pool=None):
+        self.table = check_identifier(table or PGVECTOR_TABLE)
+        self.pool = pool or ConnectionPool(dsn)
+        self.validate = validate
+        self._lock = threading.Lock()
+        self.version = None
+        self.reload()
+
+    def _read_manifest(self):
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                manifest = read_manifest(cur, self.table)
+                cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                row = cur.fetchone()
+        except psycopg2.errors.UndefinedTable:
+            manifest, row = None, None
+        if manifest is None:
+            raise RuntimeError(f"No pgvector load in table {self.table}; run python3 -m src.search.pgvector_store")
+        return manifest, parse_version(row[0] if row else "")
+
+    def current_version(self):
+        return manifest_version(self._read_manifest()[0])
+
+    def reload(self):
+        """Adopt the latest completed load if it differs from the current one. Returns True if it did."""
+        with self._lock:
+            manifest, extension_version = self._read_manifest()
+            version = manifest_version(manifest)
+            if version == self.version:
+                return False
+            if self.validate:
+                self.validate(manifest)
+            self.manifest = manifest
+            self.dimension = int(manifest["dimension"])
+            self.count = int(manifest["vectors"])
+            self.index_type = manifest["index_type"]
+            self.column = manifest.get("column", column_type(self.dimension)[0])
+            self.iterative_scan = extension_version >= ITERATIVE_SCAN_VERSION
+            self.version = version
+        return True
+
+    def _search_settings(self, cur, k, filtered):
+        if self.index_type == "hnsw":
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (max(PG_EF_SEARCH, k),))
+            if filtered and self.iterative_scan:
+                cur.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+        else:
+            cur.execute("SET LOCAL ivfflat.probes = %s", (PG_PROBES,))
+            if filtered and self.iterative_scan:
+                cur.execute("SET LOCAL ivfflat.iterative_scan = relaxed_order")
+
+    def search(self, query_embeddings, k, filters=None, index=None):
+        """Top-k rows per query. Filters are part of the ANN query, so no over-fetch is needed.
+
+        The table keeps a row per chunk, so identical chunks are folded per
+        DEDUPE_SEARCH_MODE (see fold_duplicates).
+
+        Scores are cosine similarities, equal to FAISS inner products over the
+        same normalized vectors. index exists for interface parity and is ignored.
+        """
+        where, params = filter_clause(filters)
+        query = (
+            f"SELECT id, doc, 1 - (embedding <=> %s::{self.column}) AS score FROM {self.table} "
+            f"WHERE {where} ORDER BY embedding <=> %s::{self.column} LIMIT %s"
+        )
+        batch = []
+        with span("pgvector", **{"db.table": self.table, "db.queries": len(query_embeddings)}):
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                self._search_settings(cur, k, bool(filters))
+                for vector in np.asarray(query_embeddings, dtype="float32"):
+                    cur.execute(query, [vector, *params, vector, k])
+                    results = []
+                    for row_id, doc, score in cur.fetchall():
+                        result = dict(doc)
+                        result["id"] = result["vector_id"] = int(row_id)
+                        result["score"] = float(score)
+                        results.append(result)
+                    batch.append(fold_duplicates(results))
+        return batch
+
+    def reconstruct(self, ids):
+        """{id: stored vector} for the given row ids."""
+        if not ids:
+            return {}
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(f"SELECT id, embedding::vector FROM {self.table} WHERE id = ANY(%s)", (list(ids),))
+            return {int(row_id): np.asarray(vector, dtype="float32") for row_id, vector in cur.fetchall()}
+
+    def close(self):
+        self.pool.close()
+
+
+def iter_copy_batches(embeddings, chunks_path=None, column="vector", batch_size=ADD_BATCH_SIZE, rows=None):
+    """Pair chunks with their embedding rows and yield (rows, COPY buffer) per batch.
+
+    rows maps chunks to embedding rows when identical chunks share one. Each
+    chunk still gets its own table row, so metadata filters see every copy.
+    """
+    count = embeddings.shape[0] if rows is None else len(rows)
+    docs = []
+    written = 0
+    for c in iter_chunks_file(chunks_path):
+        if written + len(docs) == count:
+            break
+        docs.append({k: v for k, v in c.items() if k != "embedding"})
+        if len(docs) == batch_size:
+            vectors = chunk_vectors(embeddings, rows, written, written + len(docs))
+            yield len(docs), copy_buffer(docs, vectors, written, column)
+            written += len(docs)
+            docs = []
+    if docs:
+        vectors = chunk_vectors(embeddings, rows, written, written + len(docs))
+        yield len(docs), copy_buffer(docs, vectors, written, column)
+
+
+def load_pgvector(index_type="hnsw", chunks_path=None, dsn=None, table=None):
+    """Bulk-load embed.py output into Postgres and swap it in for serving.
+
+    Rows are streamed with binary COPY into a staging table. The primary
+    key, ANN index and GIN metadata index are built after the data is in,
+    and the staging table then replaces the live one in a single transaction.
+    """
+    if index_type not in PG_INDEX_TYPES:
+        raise ValueError(f"Unknown pgvector index type: {index_type} (expected one of {PG_INDEX_TYPES})")
+    table = check_identifier(table or PGVECTOR_TABLE)
+    staging = f"{table}_load"
+
+    # Memory-mapped: rows are normalized and copied in batches, never all at once
+    embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+    count, dimension = embeddings.shape
+    # Deduplicated embeddings are expanded back to one table row per chunk
+    chunk_rows = load_rows(EMBEDDINGS_PATH)
+    column, opclass = column_type(dimension)
+    print(f"Loading up to {count if chunk_rows is None else len(chunk_rows)} {dimension}-d vectors "
+          f"into {table} ({column}, {index_type})...")
+
+    conn = psycopg2.connect(dsn or DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(f"CREATE TABLE {staging} (id bigint NOT NULL, doc jsonb NOT NULL, "
+                        f"embedding {column}({dimension}) NOT NULL)")
+            conn.commit()
+
+            start = time.perf_counter()
+            loaded = 0
+            for rows, buffer in iter_copy_batches(embeddings, chunks_path, column, rows=chunk_rows):
+                cur.copy_expert(f"COPY {staging} (id, doc, embedding) FROM STDIN WITH (FORMAT binary)", buffer)
+                loaded += rows
+            conn.commit()
+            print(f"  Copied {loaded} rows in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            cur.execute("SET maintenance_work_mem = %s", (PG_MAINTENANCE_WORK_MEM,))
+            cur.execute(f"ALTER TABLE {staging} ADD PRIMARY KEY (id)")
+            cur.execute(index_sql(staging, index_type, opclass, loaded))
+            cur.execute(f"CREATE INDEX ON {staging} USING gin ((doc->'metadata') jsonb_path_ops)")
+            cur.execute(f"ANALYZE {staging}")
+            conn.commit()
+            print(f"  Built indexes in {time.perf_counter() - start:.1f}s")
+
+            embeddings_meta = load_embeddings_meta()
+            manifest = {
+                "embedding_provider": embeddings_meta["embedding_provider"],
+                "embedding_model": embeddings_meta["embedding_model"],
+                "dimension": int(dimension),
+                "vectors": int(loaded),
+                "index_type": index_type,
+                "column": column,
+                "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "load_id": f"{time.time_ns():x}",
+            }
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_meta (key text PRIMARY KEY, value jsonb NOT NULL)")
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+            cur.execute(
+                f"INSERT INTO {table}_meta (key, value) VALUES ('manifest', %s::jsonb) "
+                f"ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value",
+                (json.dumps(manifest),),
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+    print(f"Done! {loaded} vectors served from {table}")
+    print(f"Embeddings: {manifest['embedding_provider']}:{manifest['embedding_model']}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load embeddings into pgvector")
+    parser.add_argument("--index-type", choices=PG_INDEX_TYPES, default="hnsw")
+    parser.add_argument("--chunks", default=None, help="chunks file (default: the chunker output)")
+    parser.add_argument("--table", default=None)
+    args = parser.parse_args()
+
+    load_pgvector(index_type=args.index_type, chunks_path=args.chunks, table=args.table)
@@ -1,12 +1,14 @@
-import os
-from openai import OpenAI
 from dotenv import load_dotenv
-from src.search.semantic_search import search
+from src.search.semantic_search import search, source_vectors, embed_queries
 from src.search.grounding import check_grounding
+from src.search.claim_verifier import ClaimVerifier, GROUNDING_MODE
+from src.search.context_packer import pack_context, grounding_sources
+from src.tracing import span
+from src.llm.client import chat_completion, stream_completion, openai_client
+from src.llm.model_policy import select_model, escalate
 
 load_dotenv()
-client = OpenAI()
-MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2-chat-latest")
+client = openai_client()
 
 SYSTEM_PROMPT = """You are API Universe, an AI-powered API discovery assistant.
 Your job is to help developers find and understand APIs based on their needs.
@@ -20,38 +22,46 @@ Rules:
 """
 
 
-def build_context(results):
-    """Format search results into context for the LLM."""
-    context_parts = []
-    for i, r in enumerate(results):
-        meta = r["metadata"]
-        part = f"[Source {i + 1}] API: {meta['api_name']}\n"
-        part += f"Score: {r['score']:.3f}\n"
-        if meta.get("type") == "endpoint":
-            part += f"Endpoint: {meta.get('method', '')} {meta.get('path', '')}\n"
-        part += f"Content: {r['text']}\n"
-        context_parts.append(part)
-    return "\n---\n".join(context_parts)
+def grounding_summary(grounding):
+    return {
+        "score": grounding.get("grounding_score", 0),
+        "supported": grounding.get("supported_count", 0),
+        "total": grounding.get("total_count", 0),
+        "claims": grounding.get("claims", []),
+    }
+
+
+def generate_answer(messages, decision, verifier=None):
+    """One generation pass. With a verifier the answer streams into it claim by claim.
 
+    Returns (answer, usage, grounding); grounding is None without a verifier.
+    """
+    with span("generate", **{"model.tier": decision["tier"], "model.reason": decision["reason"]}):
+        if verifier is None:
+            response = chat_completion(client, decision["model"], messages)
+            return response.choices[0].message.content, response.usage, None
+        answer, usage = stream_completion(client, decision["model"], messages, verifier.add_text)
+    with span("grounding"):
+        grounding = verifier.finish()
+    return answer, usage, grounding
 
-def ask(query, top_k=5, verify_grounding=True):
-    """Full RAG pipeline: search + generate + grounding check."""
+
+def ask(query, top_k=5, verify_grounding=True, latency_slo_ms=None):
+    """Full RAG pipeline: search + generate + grounding check.
+
+    The generation model comes from the tier policy; a poorly grounded answer
+    is regenerated one tier up (verification only). In incremental grounding
+    mode claims are verified while the answer streams.
+    """
     results = search(query, top_k=top_k)
-    context = build_context(results)
+    with span("pack_context"):
+        context, results, packing = pack_context(query, results)
 
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": f"Search results:\n{context}\n\nUser question: {query}"},
     ]
 
-    response = client.chat.completions.create(
-        model=MODEL,
-        messages=messages,
-    )
-
-    answer = response.choices[0].message.content
-    usage = response.usage
-
     sources = [
         {
             "api_name": r["metadata"]["api_name"],
@@ -62,24 +72,44 @@ def ask(query, top_k=5, verify_grounding=True):
         for r in results
     ]
 
+    incremental = verify_grounding and GROUNDING_MODE == "incremental"
+    vectors = source_vectors(results) if incremental else None
+
+    def run(decision):
+        verifier = ClaimVerifier(results, vectors, embed_queries) if incremental else None
+        answer, usage, grounding = generate_answer(messages, decision, verifier)
+        if verify_grounding and grounding is None:
+            grounding = check_grounding(answer, grounding_sources(results))
+        return answer, usage, grounding
+
+    decision = select_model(context_tokens=packing["context_packed"], latency_slo_ms=latency_slo_ms)
+    answer, usage, grounding = run(decision)
+
     result = {
         "query": query,
         "answer": answer,
         "sources": sources,
         "tokens": {
-            "input": usage.prompt_tokens,
-            "output": usage.completion_tokens,
+            "input": usage.prompt_tokens if usage else 0,
+            "output": usage.completion_tokens if usage else 0,
+            **packing,
         },
+        "model": decision,
     }
 
     if verify_grounding:
-        grounding = check_grounding(answer, sources)
-        result["grounding"] = {
-            "score": grounding.get("grounding_score", 0),
-            "supported": grounding.get("supported_count", 0),
-            "total": grounding.get("total_count", 0),
-            "claims": grounding.get("claims", []),
-        }
+        result["grounding"] = grounding_summary(grounding)
+
+        escalated = escalate(decision, result["grounding"]["score"])
+        while escalated is not None:
+            answer, usage, grounding = run(escalated)
+            result["answer"] = answer
+            if usage:
+                result["tokens"]["input"] += usage.prompt_tokens
+                result["tokens"]["output"] += usage.completion_tokens
+            result["grounding"] = grounding_summary(grounding)
+            result["model"] = escalated
+            escalated = escalate(escalated, result["grounding"]["score"])
 
     return result
 
@@ -1,4 +1,5 @@
 from sentence_transformers import CrossEncoder
+from src.tracing import span
 
 model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
 
@@ -8,16 +9,36 @@ def rerank(query, results, top_k=5):
     if not results:
         return results
 
-    pairs = [[query, r["text"]] for r in results]
-    scores = model.predict(pairs)
+    with span("rerank", **{"rerank.candidates": len(results)}):
+        pairs = [[query, r["text"]] for r in results]
+        scores = model.predict(pairs)
 
-    for i, score in enumerate(scores):
-        results[i]["rerank_score"] = float(score)
+        for i, score in enumerate(scores):
+            results[i]["rerank_score"] = float(score)
 
-    reranked = sorted(results, key=lambda r: r["rerank_score"], reverse=True)
+        reranked = sorted(results, key=lambda r: r["rerank_score"], reverse=True)
     return reranked[:top_k]
 
 
+def rerank_batch(queries, results_lists, top_k=5, batch_size=64):
+    """Re-rank several queries' candidates with one batched cross-encoder pass."""
+    pairs = [[query, r["text"]] for query, results in zip(queries, results_lists) for r in results]
+    if not pairs:
+        return results_lists
+
+    with span("rerank", **{"rerank.candidates": len(pairs)}):
+        scores = model.predict(pairs, batch_size=batch_size)
+
+    reranked = []
+    offset = 0
+    for results in results_lists:
+        for r, score in zip(results, scores[offset:offset + len(results)]):
+            r["rerank_score"] = float(score)
+        offset += len(results)
+        reranked.append(sorted(results, key=lambda r: r["rerank_score"], reverse=True)[:top_k])
+    return reranked
+
+
 if __name__ == "__main__":
     test_results = [
         {"text": "Send SMS messages internationally with Twilio", "metadata": {"api_name": "Twilio"}},
@@ -1,60 +1,221 @@
 import os
-import json
+import time
+import threading
 import numpy as np
 import faiss
-from openai import OpenAI
 from dotenv import load_dotenv
-from src.search.reranker import rerank
+from src.search.reranker import rerank, rerank_batch
+from src.search.adaptive_rerank import adaptive_rerank, adaptive_rerank_batch
+from src.search.diversity import diversify
+from src.search.cache import ResultCache, make_key
+from src.search.vector_store import MANIFEST_PATH, FaissStore, open_store
+from src.search.shards import collect_missing_shards
+from src.llm.embeddings import get_provider, check_manifest
+from src.tracing import span
 
 load_dotenv()
-client = OpenAI()
 
-EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
-INDEX_PATH = "data/processed/faiss_index.bin"
-METADATA_PATH = "data/processed/metadata.json"
+RETRIEVE_MULTIPLIER = 5
+INDEX_CHECK_INTERVAL = 30
 
-# Load index and metadata once
-index = faiss.read_index(INDEX_PATH)
-with open(METADATA_PATH, "r") as f:
-    metadata = json.load(f)
 
+def check_store_manifest(manifest):
+    """Refuse to serve vectors built with another embedding model than the active provider."""
+    if manifest is None:
+        print(f"Warning: no index manifest ({MANIFEST_PATH} or pgvector meta table); "
+              f"assuming the index matches {provider.name}:{provider.model}")
+        return
+    check_manifest(manifest, provider)
 
-def search(query, top_k=5, use_reranker=True):
-    """Search the vector store with a natural language query."""
+
+# Open the vector store once
+provider = get_provider()
+store = open_store(validate=check_store_manifest)
+_last_index_check = time.time()
+_faiss_store = store if store.name == "faiss" else None
+
+result_cache = ResultCache(
+    max_bytes=int(float(os.getenv("SEARCH_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "0")),
+)
+
+
+def faiss_store():
+    """The local FAISS build, opened on first use when serving from another store (benchmarks)."""
+    global _faiss_store
+    if _faiss_store is None:
+        _faiss_store = FaissStore(validate=check_store_manifest)
+    return _faiss_store
+
+
+def embed_queries(queries):
+    """Embed queries in one provider call and L2-normalize them for inner-product search."""
+    with span("embed", **{"embedding.provider": provider.name, "embedding.model": provider.model,
+                          "embedding.count": len(queries)}):
+        query_embeddings = provider.embed(list(queries))
+    if query_embeddings.shape[1] != store.dimension:
+        raise RuntimeError(
+            f"{provider.name}:{provider.model} returned {query_embeddings.shape[1]}-d vectors "
+            f"but the index has dimension {store.dimension}"
+        )
+    faiss.normalize_L2(query_embeddings)
+    return query_embeddings
+
+
+def embed_query(query):
+    """Embed a query and L2-normalize it for inner-product search."""
+    return embed_queries([query])
+
+
+def vector_search_batch(query_embeddings, k, faiss_index=None, filters=None):
+    """Top-k metadata entries for each row of a normalized query embedding matrix.
+
+    An explicit faiss_index searches that index over the local FAISS metadata
+    instead of the configured store.
+    """
+    if faiss_index is not None:
+        return faiss_store().search(query_embeddings, k, filters=filters, index=faiss_index)
+    return store.search(query_embeddings, k, filters=filters)
+
+
+def vector_search(query_embedding, k, faiss_index=None, filters=None):
+    """Return the top-k metadata entries for a normalized query embedding."""
+    return vector_search_batch(query_embedding[:1], k, faiss_index, filters)[0]
+
+
+def source_vectors(results):
+    """Normalized stored vectors for retrieved results, re-embedding any the store cannot return."""
+    stored = store.reconstruct([int(r["vector_id"]) for r in results if "vector_id" in r])
+    vectors = np.empty((len(results), store.dimension), dtype="float32")
+    missing = []
+    for i, r in enumerate(results):
+        if r.get("vector_id") in stored:
+            vectors[i] = stored[r["vector_id"]]
+        else:
+            # IVF indexes have no direct map; results cached before vector ids existed have none
+            missing.append(i)
+    if missing:
+        vectors[missing] = embed_queries([results[i]["text"] for i in missing])
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def search(query, top_k=5, use_reranker=True, retrieve_multiplier=RETRIEVE_MULTIPLIER, filters=None,
+           rerank_mode=None, diversity=None, mmr_lambda=None, max_per_api=None,
+           query_embedding=None, faiss_index=None):
+    """Search the vector store with a natural language query.
+
+    rerank_mode overrides RERANK_MODE (adaptive skips or narrows reranking
+    when the vector scores are decisive; always reranks every candidate).
+    diversity overrides DIVERSITY_MODE: dedupe (one hit per API), cap (at
+    most max_per_api per API) or mmr (Maximal Marginal Relevance, weighted
+    by mmr_lambda, over the candidates' stored vectors).
+    query_embedding (normalized) and faiss_index let the benchmark replay
+    recorded embeddings against other index types.
+    """
     # Retrieve more candidates for re-ranking
-    retrieve_k = top_k * 5 if use_reranker else top_k
+    retrieve_k = top_k * retrieve_multiplier if use_reranker else top_k
+
+    with span("search"):
+        if query_embedding is None:
+            query_embedding = embed_query(query)
+        results = vector_search(query_embedding, retrieve_k, faiss_index=faiss_index, filters=filters)
+
+        if use_reranker and results:
+            results = adaptive_rerank(query, results, top_k, rerank, mode=rerank_mode,
+                                      diversity=diversity, max_per_api=max_per_api)
+
+        with span("diversify"):
+            results = diversify(results, top_k, source_vectors, diversity, mmr_lambda, max_per_api)
+
+    return results
+
+
+def search_batch(queries, top_k=5, use_reranker=True, retrieve_multiplier=RETRIEVE_MULTIPLIER, filters=None,
+                 rerank_mode=None, diversity=None, mmr_lambda=None, max_per_api=None):
+    """search() for many queries at once.
+
+    One embedding call and one vector-store search cover the whole batch, and
+    the cross-encoder scores every (query, candidate) pair in a single predict.
+    """
+    if not queries:
+        return []
 
-    response = client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=[query],
-    )
-    query_embedding = np.array([response.data[0].embedding], dtype="float32")
-    faiss.normalize_L2(query_embedding)
+    retrieve_k = top_k * retrieve_multiplier if use_reranker else top_k
+    batch = vector_search_batch(embed_queries(queries), retrieve_k, filters=filters)
 
-    scores, indices = index.search(query_embedding, retrieve_k)
+    if use_reranker:
+        batch = adaptive_rerank_batch(queries, batch, top_k, rerank_batch, mode=rerank_mode,
+                                      diversity=diversity, max_per_api=max_per_api)
 
-    results = []
-    for score, idx in zip(scores[0], indices[0]):
-        if idx == -1:
-            continue
-        result = metadata[idx].copy()
-        result["score"] = float(score)
-        results.append(result)
+    return [diversify(results, top_k, source_vectors, diversity, mmr_lambda, max_per_api) for results in batch]
 
-    if use_reranker and results:
-        results = rerank(query, results, top_k=top_k * 2)
 
-    # Deduplicate by API name, keeping highest score
-    seen = set()
-    deduped = []
-    for r in results:
-        name = r.get("metadata", {}).get("api_name", "")
-        if name not in seen:
-            seen.add(name)
-            deduped.append(r)
-    results = deduped
+def reload_index_if_changed():
+    """Pick up a rebuilt index (file or pgvector load); the version change invalidates the cache."""
+    global _last_index_check
+    _last_index_check = time.time()
+    try:
+        if store.current_version() == store.version:
+            return False
+        if not store.reload():
+            return False
+    except Exception as e:
+        print(f"Warning: index reload check failed: {e}")
+        return False
+    result_cache.clear()
+    print(f"Reloaded {store.name} index version {store.version} ({store.count} vectors)")
+    return True
 
-    return results[:top_k]
+
+def _refresh(key, query, top_k, use_reranker, filters, options):
+    try:
+        with collect_missing_shards() as missing:
+            results = search(query, top_k=top_k, use_reranker=use_reranker, filters=filters, **options)
+        if not missing:
+            result_cache.put(key, results)
+    except Exception as e:
+        print(f"Warning: background cache refresh failed: {e}")
+    finally:
+        result_cache.release_refresh(key)
+
+
+def cached_search(query, top_k=5, use_reranker=True, filters=None, diversity=None, mmr_lambda=None,
+                  max_per_api=None):
+    """search() behind the result cache. Returns (results, cache_info)."""
+    if time.time() - _last_index_check > INDEX_CHECK_INTERVAL:
+        reload_index_if_changed()
+
+    version = store.version
+    options = {k: v for k, v in (("diversity", diversity), ("mmr_lambda", mmr_lambda),
+                                 ("max_per_api", max_per_api)) if v is not None}
+    key = make_key(query, top_k, use_reranker, filters, version, options)
+    with span("cache"):
+        results, age, state = result_cache.get(key)
+
+    if state == "stale" and result_cache.claim_refresh(key):
+        threading.Thread(
+            target=_refresh, args=(key, query, top_k, use_reranker, filters, options), daemon=True
+        ).start()
+
+    missing = []
+    if results is None:
+        with collect_missing_shards() as missing:
+            results = search(query, top_k=top_k, use_reranker=use_reranker, filters=filters, **options)
+        # Partial results (shards that timed out) are served but never cached
+        if not missing:
+            result_cache.put(key, results)
+
+    cache_info = {
+        "hit": state != "miss",
+        "state": state,
+        "age_ms": round(age * 1000),
+        "index_version": version,
+    }
+    if missing:
+        cache_info["missing_shards"] = missing
+    return [dict(r) for r in results], cache_info
 
 
 if __name__ == "__main__":
@@ -71,4 +232,4 @@ if __name__ == "__main__":
     results = search(query, top_k=5, use_reranker=False)
     for i, r in enumerate(results):
         print(f"  {i+1}. [{r['score']:.3f}] {r['metadata']['api_name']}")
-        print(f"     {r['text'][:100]}")
\ No newline at end of file
+        print(f"     {r['text'][:100]}")
@@ -0,0 +1,49 @@
+"""A shard node: serves one shard directory built by src.search.shards.
+
+    SHARD_DIR=data/processed/shards/shard-00 \
+        uvicorn --factory src.search.shard_server:create_app --port 8101
+"""
+import os
+from typing import Dict, List, Optional, Any
+from fastapi import FastAPI
+from pydantic import BaseModel
+from src.search.shards import ShardIndex, encode_array, decode_array
+
+
+class EncodedArray(BaseModel):
+    shape: List[int]
+    data: str
+
+
+class ShardSearchRequest(BaseModel):
+    vectors: EncodedArray
+    k: int
+    filters: Optional[Dict[str, Any]] = None
+
+
+class ReconstructRequest(BaseModel):
+    ids: List[int]
+
+
+def create_app(directory=None):
+    shard = ShardIndex(directory or os.environ["SHARD_DIR"])
+    app = FastAPI(title="API Universe shard node")
+
+    @app.get("/info")
+    def info():
+        # Shard info is polled by the coordinator, so a rebuild on disk is picked up here
+        shard.reload_if_changed()
+        return shard.info()
+
+    @app.post("/search")
+    def search(request: ShardSearchRequest):
+        vectors = decode_array(request.vectors.model_dump())
+        return {"results": shard.search(vectors, request.k, filters=request.filters)}
+
+    @app.post("/reconstruct")
+    def reconstruct(request: ReconstructRequest):
+        stored = shard.reconstruct(request.ids)
+        ids = sorted(stored)
+        return {"ids": ids, "vectors": encode_array([stored[i] for i in ids]) if ids else None}
+
+    return app
@@ -0,0 +1,386 @@
+"""Sharded scatter-gather search.
+
+The corpus is partitioned by a hash of each chunk's source_file into N
+shard indexes, each served by a shard node (src/search/shard_server.py) in
+its own process or on its own host. ShardedStore fans every query out to
+all shards in parallel, merges the per-shard top-k lists and hands one
+candidate list to semantic_search, which reranks it once. A shard can have
+several replicas; a shard that does not answer within SHARD_TIMEOUT_MS is
+left out and the results are marked partial.
+
+    python3 -m src.search.shards build --shards 4
+    python3 -m src.search.shards serve --shards 4 --replicas 2
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import base64
+import zlib
+import argparse
+import itertools
+import subprocess
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import faiss
+import httpx
+from src.search.vector_store import (
+    EMBEDDINGS_PATH, ADD_BATCH_SIZE, IVF_TRAIN_SAMPLE, FaissStore,
+    create_index, fold_duplicates, load_embeddings_meta, write_manifest,
+)
+from src.ingestion.chunker import iter_chunks_file
+from src.ingestion.embed import load_rows
+from src.tracing import span
+
+SHARD_ROOT = os.getenv("SHARD_ROOT", "data/processed/shards")
+# Shards separated by ";", replicas of a shard by ",": "http://a:8101,http://b:8101;http://a:8102"
+SHARD_NODES = os.getenv("SHARD_NODES", "")
+SHARD_TIMEOUT_MS = float(os.getenv("SHARD_TIMEOUT_MS", "500"))
+SHARD_BASE_PORT = 8101
+
+_missing_shards = ContextVar("missing_shards", default=None)
+
+
+class ShardUnavailable(Exception):
+    pass
+
+
+def shard_of(source_file, num_shards):
+    """Stable shard number for a spec file, so all chunks of one API land together."""
+    return zlib.crc32((source_file or "").encode("utf-8")) % num_shards
+
+
+def shard_dir(shard, root=None):
+    return os.path.join(root or SHARD_ROOT, f"shard-{shard:02d}")
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array, dtype="float32")
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype="float32").reshape(payload["shape"])
+
+
+def parse_nodes(spec):
+    """[[replica url, ...] per shard] from the SHARD_NODES format."""
+    shards = [[url.strip().rstrip("/") for url in part.split(",") if url.strip()] for part in spec.split(";")]
+    return [urls for urls in shards if urls]
+
+
+def build_shards(num_shards, index_type="flat", chunks_path=None, root=None):
+    """Partition embeddings.npy into num_shards FAISS indexes by source_file hash.
+
+    Each shard directory gets the index, its metadata, ids.npy (shard row ->
+    global chunk row, the id FaissStore results carry) and a manifest. IVF
+    shards are trained on one sample of the whole corpus. Deduplicated
+    embeddings are expanded to one vector per chunk: copies of a text can
+    live in different shards.
+    """
+    root = root or SHARD_ROOT
+    embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+    dimension = embeddings.shape[1]
+    rows = load_rows(EMBEDDINGS_PATH)
+    count = embeddings.shape[0] if rows is None else len(rows)
+    print(f"Building {num_shards} {index_type} shards from up to {count} vectors...")
+
+    train_vectors = None
+    if index_type == "ivf":
+        rng = np.random.default_rng(0)
+        vectors = embeddings.shape[0]
+        sample = np.sort(rng.choice(vectors, size=min(vectors, IVF_TRAIN_SAMPLE), replace=False))
+        train_vectors = np.array(embeddings[sample], dtype="float32")
+        faiss.normalize_L2(train_vectors)
+
+    indexes = [create_index(dimension, index_type, train_vectors=train_vectors) for _ in range(num_shards)]
+    ids = [[] for _ in range(num_shards)]
+    pending = [[] for _ in range(num_shards)]
+    metadata_files = []
+    for shard in range(num_shards):
+        os.makedirs(shard_dir(shard, root), exist_ok=True)
+        f = open(os.path.join(shard_dir(shard, root), "metadata.json"), "w")
+        f.write("[")
+        metadata_files.append(f)
+
+    def flush(shard):
+        vectors = np.array(embeddings[pending[shard] if rows is None else rows[pending[shard]]], dtype="float32")
+        faiss.normalize_L2(vectors)
+        indexes[shard].add(vectors)
+        pending[shard] = []
+
+    try:
+        for row, c in enumerate(iter_chunks_file(chunks_path)):
+            if row == count:
+                break
+            shard = shard_of(c.get("metadata", {}).get("source_file"), num_shards)
+            entry = {k: v for k, v in c.items() if k != "embedding"}
+            metadata_files[shard].write(("," if ids[shard] else "") + json.dumps(entry))
+            ids[shard].append(row)
+            pending[shard].append(row)
+            if len(pending[shard]) == ADD_BATCH_SIZE:
+                flush(shard)
+    finally:
+        for f in metadata_files:
+            f.write("]")
+            f.close()
+
+    embeddings_meta = load_embeddings_meta()
+    build_id = f"{time.time_ns():x}"
+    for shard in range(num_shards):
+        if pending[shard]:
+            flush(shard)
+        directory = shard_dir(shard, root)
+        np.save(os.path.join(directory, "ids.npy"), np.array(ids[shard], dtype="int64"))
+        manifest = write_manifest(indexes[shard], index_type, embeddings_meta,
+                                  os.path.join(directory, "index_manifest.json"))
+        manifest.update({"shard": shard, "shards": num_shards, "build_id": build_id})
+        with open(os.path.join(directory, "index_manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        # Written last: shard servers reload when the index file changes
+        faiss.write_index(indexes[shard], os.path.join(directory, "faiss_index.bin"))
+        print(f"  shard {shard}: {indexes[shard].ntotal} vectors")
+
+    print(f"Done! {num_shards} shards saved under {root} (build {build_id})")
+    return build_id
+
+
+class ShardIndex:
+    """One shard's FAISS index as a shard node serves it, with results in global ids."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.store = FaissStore(
+            os.path.join(directory, "faiss_index.bin"),
+            os.path.join(directory, "metadata.json"),
+            os.path.join(directory, "index_manifest.json"),
+        )
+        self._load_ids()
+
+    def _load_ids(self):
+        self.ids = np.load(os.path.join(self.directory, "ids.npy"))
+        self.local = {int(global_id): local for local, global_id in enumerate(self.ids)}
+
+    def reload_if_changed(self):
+        if self.store.current_version() != self.store.version and self.store.reload():
+            self._load_ids()
+            return True
+        return False
+
+    def info(self):
+        manifest = self.store.manifest or {}
+        return {**manifest, "vectors": int(self.store.count), "dimension": int(self.store.dimension)}
+
+    def search(self, query_embeddings, k, filters=None):
+        batch = self.store.search(query_embeddings, k, filters=filters)
+        for results in batch:
+            for r in results:
+                # Shards keep one vector per chunk, so both ids map to the chunk's global id
+                r["id"] = r["vector_id"] = int(self.ids[r["vector_id"]])
+        return batch
+
+    def reconstruct(self, ids):
+        local = [self.local[i] for i in ids if i in self.local]
+        stored = self.store.reconstruct(local)
+        return {int(self.ids[i]): vector for i, vector in stored.items()}
+
+
+@contextmanager
+def collect_missing_shards():
+    """Collect the shards left out of searches in this block (results are partial if any)."""
+    missing = []
+    token = _missing_shards.set(missing)
+    try:
+        yield missing
+    finally:
+        _missing_shards.reset(token)
+
+
+class ShardReplicas:
+    """Replica URLs of one shard, tried round-robin with failover."""
+
+    def __init__(self, shard, urls):
+        self.shard = shard
+        self.urls = urls
+        self._turn = itertools.count()
+
+    def order(self):
+        start = next(self._turn) % len(self.urls)
+        return self.urls[start:] + self.urls[:start]
+
+
+class ShardedStore:
+    """Scatter-gather over shard nodes (same interface as FaissStore)."""
+
+    name = "sharded"
+
+    def __init__(self, nodes=None, timeout_ms=None, validate=None, client=None):
+        nodes = parse_nodes(nodes if nodes is not None else SHARD_NODES)
+        if not nodes:
+            raise RuntimeError("SHARD_NODES is empty; start shard nodes with python3 -m src.search.shards serve")
+        self.shards = [ShardReplicas(i, urls) for i, urls in enumerate(nodes)]
+        self.timeout = (SHARD_TIMEOUT_MS if timeout_ms is None else timeout_ms) / 1000
+        self.client = client or httpx.Client(limits=httpx.Limits(max_connections=64 * len(nodes)))
+        self.executor = ThreadPoolExecutor(max_workers=8 * len(nodes), thread_name_prefix="shard")
+        self.validate = validate
+        self._lock = threading.Lock()
+        self.version = None
+        self.reload()
+
+    def _call(self, replicas, method, path, payload, deadline):
+        errors = []
+        for url in replicas.order():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self.client.request(method, f"{url}{path}", json=payload, timeout=remaining)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPError as e:
+                errors.append(f"{url}: {e!r}")
+        raise ShardUnavailable(f"shard {replicas.shard}: {'; '.join(errors) or 'timed out'}")
+
+    def _fan_out(self, method, path, payload=None):
+        """{shard: response} from every shard that answered in time, and the shards that did not."""
+        deadline = time.monotonic() + self.timeout
+        futures = {
+            self.executor.submit(self._call, replicas, method, path, payload, deadline): replicas.shard
+            for replicas in self.shards
+        }
+        # A little grace so a replica timing out right at the deadline still reports its error
+        done, _ = wait(futures, timeout=self.timeout + 0.05)
+        responses, missing = {}, []
+        for future, shard in futures.items():
+            if future in done and future.exception() is None:
+                responses[shard] = future.result()
+            else:
+                missing.append(shard)
+                if future in done:
+                    print(f"Warning: {future.exception()}")
+        if not responses:
+            raise ShardUnavailable(f"no shard answered {path} within {self.timeout * 1000:.0f}ms")
+        return responses, sorted(missing)
+
+    def _info(self):
+        responses, _ = self._fan_out("GET", "/info")
+        infos = [responses[s] for s in sorted(responses)]
+        builds = sorted({info.get("build_id", "") for info in infos})
+        version = builds[0] if len(builds) == 1 else "mixed-" + "-".join(builds)
+        return infos, version
+
+    def current_version(self):
+        return self._info()[1]
+
+    def reload(self):
+        """Adopt the shards' current build. Returns True if the version changed."""
+        with self._lock:
+            infos, version = self._info()
+            if version == self.version:
+                return False
+            manifest = {k: v for k, v in infos[0].items() if k not in ("shard", "vectors")}
+            if self.validate:
+                self.validate(manifest)
+            self.manifest = manifest
+            self.dimension = int(infos[0]["dimension"])
+            self.count = sum(int(info["vectors"]) for info in infos)
+            self.version = version
+        return True
+
+    def search(self, query_embeddings, k, filters=None, index=None):
+        """Global top-k per query merged from every shard's top-k. index is ignored.
+
+        Copies of a chunk can land on different shards, so the merged page is
+        folded per DEDUPE_SEARCH_MODE (see fold_duplicates).
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype="float32")
+        payload = {"vectors": encode_array(query_embeddings), "k": k, "filters": filters}
+        with span("shards", **{"shards.count": len(self.shards)}) as s:
+            responses, missing = self._fan_out("POST", "/search", payload)
+            s.set_attribute("shards.missing", len(missing))
+
+        missing_list = _missing_shards.get()
+        if missing and missing_list is not None:
+            missing_list.extend(m for m in missing if m not in missing_list)
+
+        with span("merge"):
+            return [
+                fold_duplicates(heapq.nlargest(
+                    k,
+                    (r for response in responses.values() for r in response["results"][row]),
+                    key=lambda r: r["score"],
+                ))
+                for row in range(len(query_embeddings))
+            ]
+
+    def reconstruct(self, ids):
+        responses, _ = self._fan_out("POST", "/reconstruct", {"ids": [int(i) for i in ids]})
+        vectors = {}
+        for response in responses.values():
+            if response["ids"]:
+                for i, vector in zip(response["ids"], decode_array(response["vectors"])):
+                    vectors[int(i)] = vector
+        return vectors
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/info", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"shard node {url} did not come up within {timeout}s")
+
+
+def serve_local(num_shards, replicas=1, base_port=SHARD_BASE_PORT, root=None):
+    """Start replicas x num_shards local shard node processes. Returns (processes, SHARD_NODES value)."""
+    processes, nodes = [], [[] for _ in range(num_shards)]
+    for replica in range(replicas):
+        for shard in range(num_shards):
+            port = base_port + replica * num_shards + shard
+            env = {**os.environ, "SHARD_DIR": shard_dir(shard, root)}
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "--factory", "src.search.shard_server:create_app",
+                 "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                env=env,
+            ))
+            nodes[shard].append(f"http://127.0.0.1:{port}")
+    try:
+        for urls in nodes:
+            for url in urls:
+                wait_ready(url)
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    return processes, ";".join(",".join(urls) for urls in nodes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or serve a sharded index")
+    parser.add_argument("command", choices=["build", "serve"])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--base-port", type=int, default=SHARD_BASE_PORT)
+    parser.add_argument("--root", default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_shards(args.shards, args.index_type, root=args.root)
+    else:
+        processes, nodes = serve_local(args.shards, args.replicas, args.base_port, args.root)
+        print(f"{len(processes)} shard nodes up. Serve with:\n  VECTOR_STORE=sharded SHARD_NODES='{nodes}'")
+        try:
+            for process in processes:
+                process.wait()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,229 @@
+"""Precomputed "similar APIs" neighbour graph.
+
+Each API is represented by its overview chunk's vector, or by the centroid
+of its chunk vectors when it has no overview. A batched FAISS self-search
+over those vectors gives every API its nearest neighbours, which are stored
+as a compact .npz (names, int32 neighbour rows, float16 scores). It is
+rebuilt after the index:
+
+    python3 -m src.search.similar_apis
+
+and served from memory by /similar/{api_name}.
+
+Free-text matching (mentioned_apis) ignores APIs whose name is a single
+word that many other APIs' chunks also use ("Weather", "Email"), since a
+query naming the topic does not name that API.
+"""
+import os
+import re
+import json
+import argparse
+import threading
+import numpy as np
+import faiss
+from src.search.vector_store import EMBEDDINGS_PATH, METADATA_PATH, ADD_BATCH_SIZE, chunk_vectors
+from src.ingestion.embed import load_rows
+
+SIMILAR_APIS_PATH = "data/processed/similar_apis.npz"
+SIMILAR_K = int(os.getenv("SIMILAR_APIS_K", "20"))
+SEARCH_BATCH_SIZE = 1024
+# Query n-grams up to this many words are looked up as API names
+MAX_NAME_WORDS = 4
+# A one-word API name used in the chunks of more than this share of the other APIs
+# is a topic, not a name, and is not matched in free text
+MAX_NAME_SHARE = float(os.getenv("SIMILAR_APIS_MAX_NAME_SHARE", "0.01"))
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_NAME_NOISE = {"api", "apis", "rest", "the", "v1", "v2", "v3"}
+
+
+def name_key(name):
+    """Lookup key for an API title: lowercase words without punctuation and generic words like "API"."""
+    words = [w for w in _NON_ALNUM.split(name.lower()) if w and w not in _NAME_NOISE]
+    return " ".join(words)
+
+
+def api_vectors(metadata, embeddings, mode="overview", chunk_rows=None):
+    """(names, normalized vectors): overview vector per API, else the centroid of its chunks.
+
+    mode="centroid" uses the centroid for every API. embeddings may be a
+    memory map; rows are read in batches of ADD_BATCH_SIZE. chunk_rows
+    maps metadata entries to embedding rows when identical chunks share one.
+    """
+    names, rows = [], {}
+    for entry in metadata:
+        name = entry.get("metadata", {}).get("api_name")
+        if name and name not in rows:
+            rows[name] = len(names)
+            names.append(name)
+
+    dimension = embeddings.shape[1]
+    sums = np.zeros((len(names), dimension), dtype="float32")
+    overview = np.zeros((len(names), dimension), dtype="float32")
+    has_overview = np.zeros(len(names), dtype=bool)
+
+    count = min(len(metadata), embeddings.shape[0] if chunk_rows is None else len(chunk_rows))
+    for start in range(0, count, ADD_BATCH_SIZE):
+        batch = chunk_vectors(embeddings, chunk_rows, start, min(start + ADD_BATCH_SIZE, count))
+        for offset, vector in enumerate(batch):
+            meta = metadata[start + offset].get("metadata", {})
+            row = rows.get(meta.get("api_name"))
+            if row is None:
+                continue
+            sums[row] += vector
+            if mode == "overview" and meta.get("type") == "overview" and not has_overview[row]:
+                overview[row] = vector
+                has_overview[row] = True
+
+    vectors = np.where(has_overview[:, None], overview, sums)
+    faiss.normalize_L2(vectors)
+    return names, vectors
+
+
+def generic_names(metadata, names, max_share=MAX_NAME_SHARE):
+    """Bool per name: its lookup key is one word found in the chunks of too many other APIs."""
+    words = {}
+    for row, name in enumerate(names):
+        key = name_key(name)
+        if key and " " not in key:
+            words.setdefault(key, []).append(row)
+    mentions = {word: set() for word in words}
+    for entry in metadata:
+        api = entry.get("metadata", {}).get("api_name")
+        for word in set(_NON_ALNUM.split(entry.get("text", "").lower())) & mentions.keys():
+            mentions[word].add(api)
+
+    generic = np.zeros(len(names), dtype=bool)
+    for word, rows in words.items():
+        for row in rows:
+            if len(mentions[word] - {names[row]}) > max_share * len(names):
+                generic[row] = True
+    return generic
+
+
+def neighbour_graph(vectors, k=SIMILAR_K):
+    """(neighbours, scores): each row's k nearest other rows by cosine similarity."""
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    fetch = min(k + 1, len(vectors))
+    neighbours = np.full((len(vectors), k), -1, dtype="int32")
+    scores = np.zeros((len(vectors), k), dtype="float16")
+    for start in range(0, len(vectors), SEARCH_BATCH_SIZE):
+        batch_scores, batch_ids = index.search(vectors[start:start + SEARCH_BATCH_SIZE], fetch)
+        for offset, (row_scores, row_ids) in enumerate(zip(batch_scores, batch_ids)):
+            row = start + offset
+            keep = [(i, s) for i, s in zip(row_ids, row_scores) if i != row and i != -1][:k]
+            neighbours[row, :len(keep)] = [i for i, _ in keep]
+            scores[row, :len(keep)] = [s for _, s in keep]
+    return neighbours, scores
+
+
+def build_similar_apis(k=SIMILAR_K, mode="overview", path=None, metadata_path=None, embeddings_path=None):
+    """Compute the neighbour graph from the current build and save it."""
+    with open(metadata_path or METADATA_PATH, "r") as f:
+        metadata = json.load(f)
+    embeddings_path = embeddings_path or EMBEDDINGS_PATH
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    names, vectors = api_vectors(metadata, embeddings, mode, load_rows(embeddings_path))
+    neighbours, scores = neighbour_graph(vectors, k)
+    generic = generic_names(metadata, names)
+
+    path = path or SIMILAR_APIS_PATH
+    with open(path, "wb") as f:
+        np.savez_compressed(f, names=np.array(names), neighbours=neighbours, scores=scores, generic=generic)
+    print(f"Similar-API graph: {len(names)} APIs x {k} neighbours ({mode} vectors) -> {path}")
+    return len(names)
+
+
+class SimilarAPIs:
+    """The neighbour graph in memory, reloaded when the file on disk changes."""
+
+    def __init__(self, path=None):
+        self.path = path or SIMILAR_APIS_PATH
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.names = []
+        self.rows = {}
+        self.generic = np.zeros(0, dtype=bool)
+
+    def _load_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with np.load(self.path) as data:
+                names = [str(n) for n in data["names"]]
+                neighbours, scores = data["neighbours"], data["scores"].astype("float32")
+                if "generic" in data.files:
+                    generic = data["generic"]
+                else:
+                    # Graphs built before the specificity check: treat every one-word name as generic
+                    generic = np.array([" " not in name_key(n) for n in names], dtype=bool)
+            rows = {}
+            for row, name in enumerate(names):
+                rows.setdefault(name.lower(), row)
+                rows.setdefault(name_key(name), row)
+            self.names, self.neighbours, self.scores, self.rows = names, neighbours, scores, rows
+            self.generic = generic
+            self._mtime = mtime
+
+    def _row(self, name):
+        self._load_if_changed()
+        row = self.rows.get(name.lower())
+        return row if row is not None else self.rows.get(name_key(name))
+
+    def lookup(self, name):
+        """Canonical API name for an exact or loosely matching title, or None."""
+        row = self._row(name)
+        return self.names[row] if row is not None else None
+
+    def similar(self, name, k=10):
+        """[{"api_name", "score"}] nearest first, or None for an unknown API."""
+        row = self._row(name)
+        if row is None:
+            return None
+        return [
+            {"api_name": self.names[i], "score": round(float(s), 4)}
+            for i, s in zip(self.neighbours[row][:k], self.scores[row][:k])
+            if i != -1
+        ]
+
+    def mentioned_apis(self, text):
+        """API names mentioned in free text, matched on word n-grams of their lookup keys.
+
+        Generic one-word names (see generic_names) never match, even as the full title.
+        """
+        self._load_if_changed()
+        words = [w for w in _NON_ALNUM.split(text.lower()) if w]
+        found = []
+        i = 0
+        while i < len(words):
+            for size in range(min(MAX_NAME_WORDS, len(words) - i), 0, -1):
+                key = " ".join(words[i:i + size])
+                if key in _NAME_NOISE or len(key) < 3:
+                    continue
+                row = self.rows.get(key)
+                if row is not None and not self.generic[row]:
+                    if self.names[row] not in found:
+                        found.append(self.names[row])
+                    i += size - 1
+                    break
+            i += 1
+        return found
+
+
+similar_apis = SimilarAPIs()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the similar-APIs neighbour graph")
+    parser.add_argument("--k", type=int, default=SIMILAR_K)
+    parser.add_argument("--vectors", choices=["overview", "centroid"], default="overview")
+    args = parser.parse_args()
+
+    build_similar_apis(k=args.k, mode=args.vectors)
@@ -0,0 +1,302 @@
+"""Prefix autocomplete over API titles, endpoint "METHOD /path" strings and tags.
+
+The completions are extracted from the index metadata when the index is
+built (data/processed/suggest.json):
+
+    python3 -m src.search.suggest
+
+In memory they live in a sorted array of lowercase keys. A title is keyed
+by each of its word suffixes, so "sto" completes "Google Cloud Storage". An
+endpoint is keyed by "get /path" and by "/path". A prefix lookup is a
+bisect to the matching key range, and a sparse table of range maxima
+yields the heaviest keys in that range one at a time. Cost does not depend
+on how many keys share the prefix.
+
+Weights combine a static prior (endpoint and tag counts) with query-log
+frequencies from metrics_db. Those frequencies are re-read every
+SUGGEST_REFRESH_SECONDS in a background thread.
+"""
+import os
+import re
+import json
+import math
+import heapq
+import time
+import argparse
+import threading
+from bisect import bisect_left
+from collections import Counter
+import numpy as np
+from src.search.vector_store import METADATA_PATH
+from src.search.similar_apis import name_key
+
+SUGGEST_PATH = "data/processed/suggest.json"
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "300"))
+MAX_SUGGESTIONS = 20
+# One logged query mentioning an entry outweighs this much static prior
+POPULARITY_WEIGHT = 2.0
+MAX_NGRAM_WORDS = 4
+
+KINDS = ("api", "endpoint", "tag")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def words(text):
+    return [w for w in _NON_ALNUM.split(text.lower()) if w]
+
+
+def extract_entries(metadata):
+    """[{"text", "kind", "api_name", "prior"}] for every API, endpoint and tag in the index metadata."""
+    endpoint_counts = Counter()
+    tag_counts = Counter()
+    tag_text = {}
+    endpoints = {}
+    for entry in metadata:
+        meta = entry.get("metadata", {})
+        name = meta.get("api_name")
+        if not name:
+            continue
+        endpoint_counts[name] += 0
+        if meta.get("type") != "endpoint":
+            continue
+        endpoint_counts[name] += 1
+        endpoints.setdefault((name, f"{meta.get('method', '')} {meta.get('path', '')}".strip()), None)
+        for tag in meta.get("tags") or []:
+            if isinstance(tag, str) and tag.strip():
+                key = normalize(tag)
+                tag_counts[key] += 1
+                tag_text.setdefault(key, tag.strip())
+
+    entries = [
+        {"text": name, "kind": "api", "api_name": name, "prior": round(math.log1p(count) + 1, 4)}
+        for name, count in endpoint_counts.items()
+    ]
+    entries += [
+        {"text": text, "kind": "endpoint", "api_name": name, "prior": 0.0}
+        for name, text in endpoints
+    ]
+    entries += [
+        {"text": tag_text[key], "kind": "tag", "api_name": None, "prior": round(math.log1p(count), 4)}
+        for key, count in tag_counts.items()
+    ]
+    return entries
+
+
+def entry_keys(entry):
+    """Lowercase keys an entry is found under: word suffixes of titles and tags, "method /path" and "/path"."""
+    text = normalize(entry["text"])
+    if entry["kind"] == "endpoint":
+        method, _, path = text.partition(" ")
+        return [text, path] if path else [text]
+    tokens = text.split(" ")
+    return [" ".join(tokens[i:]) for i in range(len(tokens))]
+
+
+def build_suggest_index(metadata_path=None, path=None):
+    """Extract completions from the current build's metadata and save them."""
+    with open(metadata_path or METADATA_PATH, "r") as f:
+        metadata = json.load(f)
+    entries = extract_entries(metadata)
+
+    path = path or SUGGEST_PATH
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"entries": entries}, f)
+    os.replace(tmp_path, path)
+    counts = Counter(e["kind"] for e in entries)
+    print(f"Suggest index: {counts['api']} APIs, {counts['endpoint']} endpoints, {counts['tag']} tags -> {path}")
+    return len(entries)
+
+
+def popularity(entries, frequencies):
+    """Logged-query count per entry.
+
+    An entry counts a query that equals its text, or mentions its tag or
+    API name (without generic words like "API") as a run of words.
+    Endpoints inherit their API's count.
+    """
+    by_words = {}
+    for i, entry in enumerate(entries):
+        if entry["kind"] == "api":
+            by_words.setdefault(name_key(entry["text"]), []).append(i)
+        elif entry["kind"] == "tag":
+            by_words.setdefault(" ".join(words(entry["text"])), []).append(i)
+    exact = {}
+    for i, entry in enumerate(entries):
+        exact.setdefault(normalize(entry["text"]), []).append(i)
+
+    counts = np.zeros(len(entries))
+    for query, n in frequencies.items():
+        hit = set(exact.get(query, []))
+        tokens = words(query)
+        for start in range(len(tokens)):
+            for size in range(1, min(MAX_NGRAM_WORDS, len(tokens) - start) + 1):
+                hit.update(by_words.get(" ".join(tokens[start:start + size]), []))
+        for i in hit:
+            counts[i] += n
+
+    api_counts = {e["api_name"]: counts[i] for i, e in enumerate(entries) if e["kind"] == "api"}
+    for i, entry in enumerate(entries):
+        if entry["kind"] == "endpoint":
+            counts[i] += api_counts.get(entry["api_name"], 0)
+    return counts
+
+
+class RangeMax:
+    """Sparse table answering "index of the largest weight in [lo, hi)" in O(1)."""
+
+    def __init__(self, weights):
+        self.weights = np.asarray(weights, dtype="float64")
+        n = len(self.weights)
+        level = np.arange(n, dtype="int32")
+        self.levels = [level]
+        width = 1
+        while width * 2 <= n:
+            left, right = level[:n - 2 * width + 1], level[width:n - width + 1]
+            level = np.where(self.weights[left] >= self.weights[right], left, right).astype("int32")
+            self.levels.append(level)
+            width *= 2
+
+    def argmax(self, lo, hi):
+        j = (hi - lo).bit_length() - 1
+        left, right = int(self.levels[j][lo]), int(self.levels[j][hi - (1 << j)])
+        return left if self.weights[left] >= self.weights[right] else right
+
+    def top(self, lo, hi):
+        """Indices in [lo, hi) from heaviest to lightest, produced lazily."""
+        if lo >= hi:
+            return
+        best = self.argmax(lo, hi)
+        heap = [(-self.weights[best], best, lo, hi)]
+        while heap:
+            _, best, lo, hi = heapq.heappop(heap)
+            yield best
+            for a, b in ((lo, best), (best + 1, hi)):
+                if a < b:
+                    m = self.argmax(a, b)
+                    heapq.heappush(heap, (-self.weights[m], m, a, b))
+
+
+class Suggester:
+    """The completion index in memory, reloaded when the file changes."""
+
+    def __init__(self, path=None, frequencies_fn=None, refresh_seconds=None):
+        self.path = path or SUGGEST_PATH
+        self.frequencies_fn = frequencies_fn or _logged_frequencies
+        self.refresh_seconds = SUGGEST_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self.entries = []
+        self.keys = []
+        self.key_entry = np.zeros(0, dtype="int32")
+        self.weights = np.zeros(0)
+        self.ranges = RangeMax([])
+
+    def _load_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            if self.refresh_seconds and time.monotonic() - self._refreshed_at > self.refresh_seconds:
+                self._refresh_in_background()
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path, "r") as f:
+                entries = json.load(f)["entries"]
+            pairs = sorted((key, i) for i, entry in enumerate(entries) for key in entry_keys(entry))
+            self._install(entries, pairs)
+            self._mtime = mtime
+
+    def _install(self, entries, pairs):
+        """Swap in a new key array and weight it from the current query log."""
+        weights = self._weights(entries)
+        key_entry = np.array([i for _, i in pairs], dtype="int32")
+        ranges = RangeMax(weights[key_entry] if len(pairs) else [])
+        self.entries, self.keys, self.key_entry = entries, [key for key, _ in pairs], key_entry
+        self.weights, self.ranges = weights, ranges
+        self._refreshed_at = time.monotonic()
+
+    def _weights(self, entries):
+        prior = np.array([e["prior"] for e in entries], dtype="float64")
+        try:
+            counts = popularity(entries, self.frequencies_fn())
+        except Exception as e:
+            print(f"Warning: query-log frequencies unavailable for /suggest: {e}")
+            counts = np.zeros(len(entries))
+        return prior + POPULARITY_WEIGHT * np.log1p(counts)
+
+    def refresh(self):
+        """Re-weight the loaded entries from the query log."""
+        with self._lock:
+            entries, keys, key_entry = self.entries, self.keys, self.key_entry
+        weights = self._weights(entries)
+        ranges = RangeMax(weights[key_entry] if len(keys) else [])
+        with self._lock:
+            if self.entries is entries:
+                self.weights, self.ranges = weights, ranges
+            self._refreshed_at = time.monotonic()
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def suggest(self, prefix, limit=10, kinds=None):
+        """[{"text", "kind", "api_name", "score"}] for keys starting with prefix, heaviest first."""
+        self._load_if_changed()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        keys, key_entry, entries, ranges = self.keys, self.key_entry, self.entries, self.ranges
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\uffff", lo)
+
+        out, seen = [], set()
+        for k in ranges.top(lo, hi):
+            i = int(key_entry[k])
+            if i in seen:
+                continue
+            seen.add(i)
+            entry = entries[i]
+            if kinds and entry["kind"] not in kinds:
+                continue
+            out.append({
+                "text": entry["text"],
+                "kind": entry["kind"],
+                "api_name": entry["api_name"],
+                "score": round(float(ranges.weights[k]), 4),
+            })
+            if len(out) == limit:
+                break
+        return out
+
+
+def _logged_frequencies():
+    from src.metrics_db import query_frequencies
+    return query_frequencies()
+
+
+suggester = Suggester()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the /suggest prefix index from the index metadata")
+    parser.add_argument("--query", help="Print completions for this prefix after building")
+    args = parser.parse_args()
+
+    build_suggest_index()
+    if args.query:
+        for s in suggester.suggest(args.query):
+            print(f"{s['score']:7.3f}  {s['kind']:8s}  {s['text']}  ({s['api_name'] or '-'})")
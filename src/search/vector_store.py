@@ -1,45 +1,365 @@
 import os
 import json
+import time
+import threading
 import numpy as np
 import faiss
+from src.llm.embeddings import OPENAI_EMBEDDING_MODEL
+from src.ingestion.chunker import iter_chunks_file
+from src.ingestion.embed import load_rows
+from src.tracing import span
 
 EMBEDDINGS_PATH = "data/processed/embeddings.npy"
-CHUNKS_PATH = "data/processed/chunks.json"
+EMBEDDINGS_META_PATH = "data/processed/embeddings_meta.json"
 INDEX_PATH = "data/processed/faiss_index.bin"
 METADATA_PATH = "data/processed/metadata.json"
+MANIFEST_PATH = "data/processed/index_manifest.json"
 
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+ADD_BATCH_SIZE = 10000
+IVF_TRAIN_SAMPLE = 100000
+FILTER_OVERFETCH = 4
 
-def build_index():
-    embeddings = np.load(EMBEDDINGS_PATH)
-    print(f"Loaded embeddings: {embeddings.shape}")
+# faiss: in-process index file; pgvector: shared Postgres table (see pgvector_store);
+# sharded: scatter-gather over shard nodes (see shards)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "faiss")
+VECTOR_STORES = ("faiss", "pgvector", "sharded")
 
-    with open(CHUNKS_PATH, "r") as f:
-        chunks = json.load(f)
+# A vector shared by identical chunks is returned once, listing the other chunks
+# under "duplicates" (aggregate), or once per chunk (expand)
+DEDUPE_SEARCH_MODE = os.getenv("DEDUPE_SEARCH_MODE", "aggregate")
+DEDUPE_SEARCH_MODES = ("aggregate", "expand")
 
-    count = min(len(chunks), embeddings.shape[0])
-    embeddings = embeddings[:count]
-    chunks = chunks[:count]
 
-    print(f"Building FAISS index from {count} vectors...")
+def create_index(dimension, index_type="flat", train_vectors=None):
+    """Create an empty inner-product FAISS index (IVF is trained on train_vectors)."""
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif index_type == "ivf":
+        nlist = max(1, int(np.sqrt(train_vectors.shape[0])))
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(train_vectors)
+        index.nprobe = min(IVF_NPROBE, nlist)
+    else:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {INDEX_TYPES})")
+    return index
 
-    dimension = embeddings.shape[1]
-    faiss.normalize_L2(embeddings)
-    index = faiss.IndexFlatIP(dimension)
+
+def make_index(embeddings, index_type="flat"):
+    """Build an inner-product FAISS index over normalized embeddings."""
+    index = create_index(embeddings.shape[1], index_type, train_vectors=embeddings)
     index.add(embeddings)
+    return index
 
-    faiss.write_index(index, INDEX_PATH)
 
-    metadata = []
-    for c in chunks:
-        entry = {k: v for k, v in c.items() if k != "embedding"}
-        metadata.append(entry)
+def normalized_rows(embeddings, start, stop):
+    batch = np.array(embeddings[start:stop], dtype="float32")
+    faiss.normalize_L2(batch)
+    return batch
+
+
+def chunk_vectors(embeddings, rows, start, stop):
+    """Normalized vectors of chunks start..stop; rows maps chunks to embedding rows (None: one row each)."""
+    if rows is None:
+        return normalized_rows(embeddings, start, stop)
+    batch = np.array(embeddings[rows[start:stop]], dtype="float32")
+    faiss.normalize_L2(batch)
+    return batch
+
+
+def metadata_rows_path(metadata_path=None):
+    """The chunk -> vector map saved next to an index's metadata when chunks share vectors."""
+    root, _ = os.path.splitext(metadata_path or METADATA_PATH)
+    return root + "_rows.npy"
+
+
+def vector_groups(rows, count):
+    """(order, starts): the chunks of vector v are order[starts[v]:starts[v + 1]], in chunk order."""
+    order = np.argsort(rows, kind="stable")
+    starts = np.searchsorted(rows[order], np.arange(count + 1))
+    return order, starts
+
+
+def load_embeddings_meta(path=None):
+    """Which model produced embeddings.npy (older runs only ever used OpenAI)."""
+    path = path or EMBEDDINGS_META_PATH
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {
+        "embedding_provider": "openai",
+        "embedding_model": OPENAI_EMBEDDING_MODEL,
+    }
+
 
+def load_manifest(path=None):
+    path = path or MANIFEST_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(index, index_type, embeddings_meta, path=None, chunks=None):
+    manifest = {
+        "embedding_provider": embeddings_meta["embedding_provider"],
+        "embedding_model": embeddings_meta["embedding_model"],
+        "dimension": int(index.d),
+        "vectors": int(index.ntotal),
+        "index_type": index_type,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if chunks is not None:
+        manifest["chunks"] = int(chunks)
+    with open(path or MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_index(index_type="flat", chunks_path=None):
+    # Memory-mapped: vectors are normalized and added in batches, never all copied at once
+    embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+    print(f"Loaded embeddings: {embeddings.shape}")
+
+    count = embeddings.shape[0]
+    dimension = embeddings.shape[1]
+    # Deduplicated embeddings: identical chunks share one row, so one vector
+    rows = load_rows(EMBEDDINGS_PATH)
+    if rows is not None and len(rows) and rows[-1] == len(rows) - 1:
+        rows = None
+    print(f"Building {index_type} FAISS index from up to {count} vectors...")
+
+    train_vectors = None
+    if index_type == "ivf":
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(count, size=min(count, IVF_TRAIN_SAMPLE), replace=False))
+        train_vectors = np.array(embeddings[sample], dtype="float32")
+        faiss.normalize_L2(train_vectors)
+    index = create_index(dimension, index_type, train_vectors=train_vectors)
+
+    # Metadata is streamed to a JSON array, one entry per chunk whose vector exists
+    written = 0
     with open(METADATA_PATH, "w") as f:
-        json.dump(metadata, f)
+        f.write("[")
+        for c in iter_chunks_file(chunks_path):
+            row = written if rows is None else (int(rows[written]) if written < len(rows) else count)
+            if row >= count:
+                break
+            entry = {k: v for k, v in c.items() if k != "embedding"}
+            f.write(("," if written else "") + json.dumps(entry))
+            written += 1
+        f.write("]")
+
+    vectors = written if rows is None else (int(rows[:written].max()) + 1 if written else 0)
+    for start in range(0, vectors, ADD_BATCH_SIZE):
+        index.add(normalized_rows(embeddings, start, min(start + ADD_BATCH_SIZE, vectors)))
+
+    # Written before the index file: stores reload when the index changes
+    rows_file = metadata_rows_path(METADATA_PATH)
+    if rows is not None:
+        np.save(rows_file, rows[:written])
+    elif os.path.exists(rows_file):
+        os.remove(rows_file)
+
+    faiss.write_index(index, INDEX_PATH)
+
+    embeddings_meta = load_embeddings_meta()
+    write_manifest(index, index_type, embeddings_meta, chunks=written)
 
     print(f"Done! Index saved to {INDEX_PATH}")
     print(f"Metadata saved to {METADATA_PATH}")
-    print(f"Dimension: {dimension}, Vectors: {index.ntotal}")
+    print(f"Dimension: {dimension}, Vectors: {index.ntotal} for {written} chunks")
+    print(f"Embeddings: {embeddings_meta['embedding_provider']}:{embeddings_meta['embedding_model']}")
+
+    from src.search.similar_apis import build_similar_apis
+    from src.search.suggest import build_suggest_index
+    processed_dir = os.path.dirname(INDEX_PATH)
+    try:
+        build_similar_apis(
+            path=os.path.join(processed_dir, "similar_apis.npz"),
+            metadata_path=METADATA_PATH,
+            embeddings_path=EMBEDDINGS_PATH,
+        )
+    except Exception as e:
+        print(f"Warning: similar-API graph not rebuilt: {e}")
+    try:
+        build_suggest_index(metadata_path=METADATA_PATH, path=os.path.join(processed_dir, "suggest.json"))
+    except Exception as e:
+        print(f"Warning: suggest index not rebuilt: {e}")
+
+
+def matches_filters(result, filters):
+    """Metadata equality filters; a list value matches any of its items."""
+    meta = result.get("metadata", {})
+    for field, expected in filters.items():
+        value = meta.get(field)
+        if isinstance(expected, list):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def fold_duplicates(results, mode=None):
+    """Apply DEDUPE_SEARCH_MODE to stores that keep a row per chunk (pgvector, sharded).
+
+    Identical chunks share one vector, so they come back with the same text
+    and score. In aggregate mode the first keeps the others' metadata under
+    "duplicates", as FaissStore does; the k slots the others took are not
+    refilled, so a folded page can be shorter than k.
+    """
+    if (mode or DEDUPE_SEARCH_MODE) == "expand":
+        return results
+    folded, first = [], {}
+    for r in results:
+        key = (r.get("text"), r["score"])
+        if key in first:
+            first[key].setdefault("duplicates", []).append(r.get("metadata", {}))
+        else:
+            first[key] = r
+            folded.append(r)
+    return folded
+
+
+class FaissStore:
+    """The on-disk FAISS index and its metadata, held in process memory.
+
+    Every store exposes the same surface to semantic_search: dimension,
+    manifest, version, search(), reconstruct(), current_version() and
+    reload(). validate is called with the manifest before a build is served.
+    Result ids are metadata rows and vector_id is the FAISS vector behind
+    them (the key for reconstruct); a vector shared by identical chunks is
+    hydrated per dedupe_mode (DEDUPE_SEARCH_MODE).
+    """
+
+    name = "faiss"
+
+    def __init__(self, index_path=None, metadata_path=None, manifest_path=None, validate=None, dedupe_mode=None):
+        self.index_path = index_path or INDEX_PATH
+        self.metadata_path = metadata_path or METADATA_PATH
+        self.manifest_path = manifest_path or MANIFEST_PATH
+        self.validate = validate
+        self.dedupe_mode = dedupe_mode or DEDUPE_SEARCH_MODE
+        if self.dedupe_mode not in DEDUPE_SEARCH_MODES:
+            raise ValueError(f"Unknown dedupe mode: {self.dedupe_mode} (expected one of {DEDUPE_SEARCH_MODES})")
+        self._lock = threading.Lock()
+        self.version = None
+        self.reload()
+
+    @property
+    def dimension(self):
+        return self.index.d
+
+    @property
+    def count(self):
+        return self.index.ntotal
+
+    def current_version(self):
+        """Identify the on-disk build by index file size and modification time."""
+        stat = os.stat(self.index_path)
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+    def reload(self):
+        """Load the build on disk if it differs from the one in memory. Returns True if it did."""
+        with self._lock:
+            version = self.current_version()
+            if version == self.version:
+                return False
+            manifest = load_manifest(self.manifest_path)
+            if self.validate:
+                self.validate(manifest)
+            index = faiss.read_index(self.index_path)
+            with open(self.metadata_path, "r") as f:
+                metadata = json.load(f)
+            rows_file = metadata_rows_path(self.metadata_path)
+            groups = vector_groups(np.load(rows_file), index.ntotal) if os.path.exists(rows_file) else None
+            self.index, self.metadata, self.manifest, self.version = index, metadata, manifest, version
+            self.groups = groups
+        return True
+
+    def chunk_ids(self, idx):
+        """Metadata rows of the chunks that share vector idx."""
+        if self.groups is None:
+            return [int(idx)]
+        order, starts = self.groups
+        return order[starts[idx]:starts[idx + 1]].tolist()
+
+    def hydrate(self, idx, filters=None):
+        """Results for one vector: one per chunk (expand) or the first with the rest as "duplicates".
+
+        Each result's "id" is its chunk's metadata row.
+        """
+        entries = [(row, self.metadata[row]) for row in self.chunk_ids(idx)]
+        if filters:
+            entries = [(row, e) for row, e in entries if matches_filters(e, filters)]
+        if self.dedupe_mode == "expand" or len(entries) < 2:
+            return [{**e, "id": row} for row, e in entries]
+        row, first = entries[0]
+        result = {**first, "id": row}
+        result["duplicates"] = [e.get("metadata", {}) for _, e in entries[1:]]
+        return [result]
+
+    def search(self, query_embeddings, k, filters=None, index=None):
+        """Top-k metadata entries for each row of a normalized query matrix.
+
+        Filters are applied after the ANN search, so k * FILTER_OVERFETCH
+        candidates are fetched to leave enough matches. index overrides the
+        FAISS index (benchmark ablations over the same vectors).
+        """
+        index = index if index is not None else self.index
+        fetch_k = k * FILTER_OVERFETCH if filters else k
+        with span("faiss"):
+            scores, indices = index.search(query_embeddings, fetch_k)
+
+        with span("hydrate"):
+            batch = []
+            for score_row, index_row in zip(scores, indices):
+                results = []
+                for score, idx in zip(score_row, index_row):
+                    if idx == -1:
+                        continue
+                    for result in self.hydrate(idx, filters):
+                        result["vector_id"] = int(idx)
+                        result["score"] = float(score)
+                        results.append(result)
+                        if len(results) == k:
+                            break
+                    if len(results) == k:
+                        break
+                batch.append(results)
+        return batch
+
+    def reconstruct(self, ids):
+        """{vector_id: stored vector} for the vector ids the index can return (IVF indexes have no direct map)."""
+        vectors = {}
+        for i in ids:
+            try:
+                vectors[i] = self.index.reconstruct(int(i))
+            except (KeyError, RuntimeError):
+                continue
+        return vectors
+
+
+def open_store(kind=None, validate=None):
+    """The configured vector store (VECTOR_STORE)."""
+    kind = kind or VECTOR_STORE
+    if kind == "faiss":
+        return FaissStore(validate=validate)
+    if kind == "pgvector":
+        from src.search.pgvector_store import PgVectorStore
+        return PgVectorStore(validate=validate)
+    if kind == "sharded":
+        from src.search.shards import ShardedStore
+        return ShardedStore(validate=validate)
+    raise ValueError(f"Unknown vector store: {kind} (expected one of {VECTOR_STORES})")
 
 
 if __name__ == "__main__":
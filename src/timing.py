@@ -0,0 +1,159 @@
+"""Per-request latency breakdown and an opt-in sampling profiler.
+
+Spans are no-ops unless a request opened a collector with collect_timings(),
+so the instrumentation can stay in the hot path permanently.
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROFILES_DIR = "data/profiles"
+PROFILE_INTERVAL = 0.005
+# Admin flag: profile every request and keep the ones slower than this
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS") or 0)
+# Only the newest profiles are kept, each with its most frequent stacks
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_MAX_STACKS = 2000
+
+_timings = ContextVar("timings", default=None)
+_path = ContextVar("span_path", default=())
+
+
+@contextmanager
+def collect_timings():
+    """Collect span durations for the enclosed block; yields the {span: ms} dict."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Time a block under name, nested below any enclosing span (e.g. "search/embed")."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    path = _path.get() + (name,)
+    token = _path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        key = "/".join(path)
+        timings[key] = timings.get(key, 0.0) + (time.perf_counter() - start) * 1000
+        _path.reset(token)
+
+
+def rounded(timings, digits=3):
+    return {key: round(ms, digits) for key, ms in timings.items()}
+
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval.
+
+    Stacks are kept in the folded format ("outer;inner;leaf count") that
+    flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def folded(self, max_stacks=PROFILE_MAX_STACKS):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(max_stacks)) + "\n"
+
+    def save(self, label, profiles_dir=None):
+        profiles_dir = profiles_dir or PROFILES_DIR
+        os.makedirs(profiles_dir, exist_ok=True)
+        safe_label = label.strip("/").replace("/", "_") or "request"
+        path = os.path.join(profiles_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_label}-{self.thread_id}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        prune_profiles(profiles_dir)
+        return path
+
+
+def prune_profiles(profiles_dir=None, max_files=None):
+    """Delete the oldest .folded files beyond max_files (PROFILE_MAX_FILES)."""
+    profiles_dir = profiles_dir or PROFILES_DIR
+    max_files = PROFILE_MAX_FILES if max_files is None else max_files
+    paths = [os.path.join(profiles_dir, f) for f in os.listdir(profiles_dir) if f.endswith(".folded")]
+    if len(paths) <= max_files:
+        return 0
+    paths.sort(key=lambda p: (os.stat(p).st_mtime_ns, p))
+    removed = 0
+    for path in paths[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def profile_requested(header_value, allowed=True):
+    """Whether an X-Profile header asks for a profile; only honoured for allowed (admin) callers."""
+    return allowed and (header_value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@contextmanager
+def maybe_profile(label, requested=False, slow_ms=None):
+    """Profile the calling thread when requested or when the PROFILE_SLOW_MS flag is set.
+
+    Yields a dict that holds "profile" (the saved .folded path) after the block
+    if a profile was kept: always when requested, otherwise only for requests
+    slower than slow_ms.
+    """
+    slow_ms = PROFILE_SLOW_MS if slow_ms is None else slow_ms
+    info = {}
+    if not requested and not slow_ms:
+        yield info
+        return
+
+    profiler = SamplingProfiler().start()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        profiler.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if requested or elapsed_ms >= slow_ms:
+            try:
+                info["profile"] = profiler.save(label)
+            except OSError as e:
+                print(f"Warning: failed to save profile: {e}")
@@ -0,0 +1,266 @@
+"""OpenTelemetry-style tracing for agent runs.
+
+A trace is a tree of spans. Finished traces are exported in the OTLP/JSON
+span model to a local JSONL file or an OTLP/HTTP collector
+(TRACE_EXPORTER=none|file|otlp). Every span is also recorded into the
+request's timing breakdown (src.timing), so span() is the one instrumentation
+call for the hot path.
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src import timing
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "data/traces/spans.jsonl")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "api-universe")
+EXPORT_QUEUE_SIZE = 1000
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, trace_id, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.status = STATUS_OK
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self):
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def find(self, name):
+        """First descendant span (depth-first, including self) with this name."""
+        return next((s for s in self.walk() if s.name == name), None)
+
+    def find_all(self, name):
+        return [s for s in self.walk() if s.name == name]
+
+    def total_ms(self, name):
+        """Summed duration of every descendant span with this name (e.g. retrieve across retries)."""
+        return sum(s.duration_ms for s in self.find_all(name))
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span outside any trace so call sites never need to check."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, default=str)}
+
+
+def otlp_payload(spans):
+    """Wrap spans in an OTLP/JSON ExportTraceServiceRequest body."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "src.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]
+    }
+
+
+class FileExporter:
+    """Append one OTLP/JSON span per line."""
+
+    def __init__(self, path=None):
+        self.path = path or TRACE_FILE
+
+    def export(self, spans):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            for s in spans:
+                f.write(json.dumps(s.to_otlp()) + "\n")
+
+
+class OTLPExporter:
+    """POST spans to an OTLP/HTTP collector's /v1/traces endpoint as JSON."""
+
+    def __init__(self, endpoint=None, timeout=5):
+        self.url = (endpoint or OTLP_ENDPOINT).rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans):
+        import httpx
+        response = httpx.post(self.url, json=otlp_payload(spans), timeout=self.timeout)
+        response.raise_for_status()
+
+
+EXPORTERS = {"file": FileExporter, "otlp": OTLPExporter}
+
+
+class BatchProcessor:
+    """Export finished traces from a background thread so requests never wait on the collector."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            print("Warning: trace export queue full; dropping trace")
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.exporter.export(spans)
+            except Exception as e:
+                print(f"Warning: trace export failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+
+_processor = None
+_configured = False
+_processor_lock = threading.Lock()
+
+
+def get_processor():
+    """The export processor, created from TRACE_EXPORTER on first use."""
+    global _processor, _configured
+    with _processor_lock:
+        if not _configured:
+            if TRACE_EXPORTER in EXPORTERS:
+                _processor = BatchProcessor(EXPORTERS[TRACE_EXPORTER]())
+            _configured = True
+    return _processor
+
+
+def set_exporter(exporter):
+    """Route finished traces to exporter (None disables export)."""
+    global _processor, _configured
+    with _processor_lock:
+        _processor = BatchProcessor(exporter) if exporter is not None else None
+        _configured = True
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+@contextmanager
+def _activate(s, name):
+    token = _current.set(s)
+    try:
+        with timing.span(name):
+            yield s
+    except BaseException as e:
+        s.status = STATUS_ERROR
+        s.status_message = str(e)
+        raise
+    finally:
+        s.end()
+        _current.reset(token)
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    """Open a root span; the whole tree is exported when it closes."""
+    root = Span(name, secrets.token_hex(16), attributes=attributes)
+    try:
+        with _activate(root, name):
+            yield root
+    finally:
+        processor = get_processor()
+        if processor is not None:
+            processor.submit(list(root.walk()))
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the active span. Outside a trace it only feeds the timing breakdown."""
+    parent = _current.get()
+    if parent is None:
+        with timing.span(name):
+            yield NOOP_SPAN
+        return
+
+    s = Span(name, parent.trace_id, parent=parent, attributes=attributes)
+    parent.children.append(s)
+    with _activate(s, name):
+        yield s
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+"""Fixtures shared by unit and integration tests."""
+import json
+import numpy as np
+import pytest
+from src.llm.embeddings import HashEmbeddingProvider
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def shard_build(tmp_path, monkeypatch):
+    from src.search import shards, vector_store
+
+    provider = HashEmbeddingProvider(dimension=16)
+    chunks = [
+        {"text": f"chunk {i}", "metadata": {"api_name": f"API {i % 7}", "source_file": f"spec-{i % 7}.json",
+                                            "type": "endpoint" if i % 2 else "overview"}}
+        for i in range(60)
+    ]
+    embeddings = provider.embed([c["text"] for c in chunks])
+    np.save(tmp_path / "embeddings.npy", embeddings)
+    (tmp_path / "embeddings_meta.json").write_text(json.dumps(
+        {"embedding_provider": "hash", "embedding_model": "hash-16"}
+    ))
+    chunks_path = tmp_path / "chunks.jsonl"
+    chunks_path.write_text("".join(json.dumps(c) + "\n" for c in chunks))
+    monkeypatch.setattr(shards, "EMBEDDINGS_PATH", str(tmp_path / "embeddings.npy"))
+    monkeypatch.setattr(vector_store, "EMBEDDINGS_META_PATH", str(tmp_path / "embeddings_meta.json"))
+
+    root = str(tmp_path / "shards")
+    shards.build_shards(SHARD_COUNT, chunks_path=str(chunks_path), root=root)
+    return root, embeddings, chunks, SHARD_COUNT
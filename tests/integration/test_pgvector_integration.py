@@ -0,0 +1,106 @@
+"""pgvector store against a real Postgres with the vector extension.
+
+Set PGVECTOR_TEST_DSN (e.g. postgresql://postgres@localhost:5432/postgres) to run.
+"""
+import os
+import json
+import numpy as np
+import pytest
+from src.llm.embeddings import HashEmbeddingProvider
+
+DSN = os.getenv("PGVECTOR_TEST_DSN")
+pytestmark = pytest.mark.skipif(not DSN, reason="PGVECTOR_TEST_DSN not set")
+
+TABLE = "test_api_chunks"
+
+
+@pytest.fixture
+def loaded(tmp_path, monkeypatch):
+    from src.search import vector_store, pgvector_store
+
+    provider = HashEmbeddingProvider(dimension=32)
+    chunks = [
+        {"text": f"chunk {i}", "metadata": {"api_name": f"API {i % 10}", "type": "endpoint" if i % 2 else "overview"}}
+        for i in range(200)
+    ]
+    embeddings = provider.embed([c["text"] for c in chunks])
+    np.save(tmp_path / "embeddings.npy", embeddings)
+    (tmp_path / "embeddings_meta.json").write_text(json.dumps(
+        {"embedding_provider": "hash", "embedding_model": "hash-32", "dimension": 32, "count": len(chunks)}
+    ))
+    chunks_path = tmp_path / "chunks.jsonl"
+    chunks_path.write_text("".join(json.dumps(c) + "\n" for c in chunks))
+    monkeypatch.setattr(pgvector_store, "EMBEDDINGS_PATH", str(tmp_path / "embeddings.npy"))
+    monkeypatch.setattr(vector_store, "EMBEDDINGS_META_PATH", str(tmp_path / "embeddings_meta.json"))
+
+    def load(index_type="hnsw"):
+        return pgvector_store.load_pgvector(index_type, str(chunks_path), dsn=DSN, table=TABLE)
+
+    return load, embeddings, chunks
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivfflat"])
+def test_load_and_search_matches_exact(loaded, index_type):
+    from src.search.pgvector_store import PgVectorStore, ConnectionPool
+    from src.search.vector_store import make_index
+
+    load, embeddings, chunks = loaded
+    manifest = load(index_type)
+    assert manifest["vectors"] == len(chunks)
+
+    store = PgVectorStore(table=TABLE, pool=ConnectionPool(DSN, maxconn=2))
+    try:
+        assert store.dimension == 32 and store.index_type == index_type
+        exact = make_index(embeddings, "flat")
+        _, expected = exact.search(embeddings[:5], 10)
+        batch = store.search(embeddings[:5], 10)
+        recall = np.mean([len({r["id"] for r in row} & set(ids.tolist())) / 10 for row, ids in zip(batch, expected)])
+        assert recall >= 0.8
+        assert batch[0][0]["id"] == 0
+        assert batch[0][0]["text"] == "chunk 0"
+        assert batch[0][0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+        filtered = store.search(embeddings[:3], 5, filters={"type": "endpoint", "api_name": ["API 1", "API 3"]})
+        for row in filtered:
+            assert row
+            assert all(r["metadata"]["type"] == "endpoint" for r in row)
+            assert all(r["metadata"]["api_name"] in ("API 1", "API 3") for r in row)
+
+        stored = store.reconstruct([0, 7])
+        np.testing.assert_allclose(stored[7], embeddings[7], atol=1e-5)
+    finally:
+        store.close()
+
+
+def test_reload_sees_a_new_load(loaded):
+    from src.search.pgvector_store import PgVectorStore, ConnectionPool
+
+    load, _, _ = loaded
+    load()
+    store = PgVectorStore(table=TABLE, pool=ConnectionPool(DSN, maxconn=2))
+    try:
+        version = store.version
+        assert store.reload() is False
+        load()
+        assert store.current_version() != version
+        assert store.reload() is True
+    finally:
+        store.close()
+
+
+def test_pool_queues_callers_beyond_maxconn():
+    from concurrent.futures import ThreadPoolExecutor
+    from src.search.pgvector_store import ConnectionPool
+
+    pool = ConnectionPool(DSN, minconn=1, maxconn=2, timeout=30)
+
+    def query(_):
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_sleep(0.05)")
+            return True
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert all(executor.map(query, range(16)))
+    finally:
+        pool.close()
@@ -0,0 +1,36 @@
+"""Scatter-gather against real shard node processes on localhost."""
+import socket
+import numpy as np
+from src.search.shards import ShardedStore, serve_local
+from src.search.vector_store import make_index
+
+
+def _free_port_block(size):
+    for _ in range(20):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + size < 65535:
+            return base
+    raise RuntimeError("no free port")
+
+
+def test_processes_with_replicas(shard_build):
+    root, embeddings, _, num_shards = shard_build
+    processes, nodes = serve_local(num_shards, replicas=2, base_port=_free_port_block(2 * num_shards), root=root)
+    try:
+        store = ShardedStore(nodes=nodes, timeout_ms=2000)
+        assert store.count == 60
+
+        _, expected = make_index(embeddings, "flat").search(embeddings[:3], 10)
+        assert [[r["id"] for r in row] for row in store.search(embeddings[:3], 10)] == expected.tolist()
+
+        # Losing one replica of a shard is absorbed by its other replica
+        processes[0].terminate()
+        processes[0].wait()
+        for _ in range(4):
+            assert len(store.search(embeddings[:1], 10)[0]) == 10
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
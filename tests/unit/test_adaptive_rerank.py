@@ -0,0 +1,102 @@
+import pytest
+from src.search import adaptive_rerank
+from src.search.adaptive_rerank import adaptive_rerank as rerank_adaptive, adaptive_rerank_batch, plan
+
+
+@pytest.fixture(autouse=True)
+def adaptive_mode(monkeypatch):
+    monkeypatch.setattr(adaptive_rerank, "RERANK_MODE", "adaptive")
+
+
+def _results(scores):
+    return [{"text": f"r{i}", "score": s, "metadata": {"api_name": f"API {i}"}} for i, s in enumerate(scores)]
+
+
+def _fake_rerank(query, results, top_k=5):
+    # Reverse vector order so reranked output is distinguishable
+    reranked = [dict(r, rerank_score=float(i)) for i, r in enumerate(results)]
+    return sorted(reranked, key=lambda r: r["rerank_score"], reverse=True)[:top_k]
+
+
+def test_plan_skips_when_cut_is_decisive():
+    assert plan([0.9, 0.85, 0.6, 0.58, 0.5], top_k=2)["path"] == "skip"
+    assert plan([0.9, 0.7, 0.69], top_k=1)["path"] == "skip"
+
+
+def test_plan_reranks_only_the_band():
+    scores = [0.80, 0.79, 0.78, 0.77, 0.76, 0.75, 0.74, 0.73, 0.5, 0.4, 0.3, 0.2]
+    decision = plan(scores, top_k=2)
+    assert decision == {"path": "band", "candidates": 8}
+
+
+def test_plan_band_has_minimum_size():
+    scores = [0.80, 0.79, 0.5, 0.4, 0.3, 0.2, 0.1, 0.0]
+    assert plan(scores, top_k=2)["path"] == "skip"
+    assert plan([0.80, 0.79, 0.78, 0.5, 0.4, 0.3, 0.2, 0.1], top_k=2) == {"path": "band", "candidates": 4}
+
+
+def test_always_is_the_default(monkeypatch):
+    monkeypatch.undo()
+    assert adaptive_rerank.RERANK_MODE == "always"
+    assert plan([0.9, 0.1, 0.0], top_k=1)["path"] == "full"
+
+
+def test_plan_full_and_always():
+    flat = [0.5] * 10
+    assert plan(flat, top_k=2) == {"path": "full", "candidates": 10}
+    assert plan([0.9, 0.1], top_k=1, mode="always") == {"path": "full", "candidates": 2}
+    with pytest.raises(ValueError):
+        plan([0.5], top_k=1, mode="sometimes")
+
+
+def test_adaptive_rerank_paths_and_stats():
+    adaptive_rerank.reset_stats()
+    skipped = rerank_adaptive("q", _results([0.9, 0.5, 0.4]), 1, _fake_rerank)
+    assert [r["text"] for r in skipped] == ["r0", "r1", "r2"]
+
+    banded = rerank_adaptive("q", _results([0.8, 0.79, 0.78, 0.77, 0.2, 0.1]), 1, _fake_rerank)
+    assert [r["text"] for r in banded] == ["r3", "r2"]
+
+    stats = adaptive_rerank.rerank_stats()
+    assert stats["paths"] == {"skip": 1, "band": 1, "full": 0}
+    assert stats["skip_rate"] == 0.5
+    assert stats["reranked_fraction"] == pytest.approx(4 / 9, abs=1e-4)
+
+
+def test_adaptive_rerank_batch_only_reranks_undecided_queries():
+    calls = []
+
+    def fake_batch(queries, lists, top_k=5):
+        calls.append((queries, [len(l) for l in lists]))
+        return [_fake_rerank(q, l, top_k) for q, l in zip(queries, lists)]
+
+    batch = [_results([0.9, 0.5, 0.4]), _results([0.5] * 6), []]
+    out = adaptive_rerank_batch(["a", "b", "c"], batch, 1, fake_batch)
+    assert calls == [(["b"], [6])]
+    assert out[0] is batch[0]
+    assert out[1][0]["text"] == "r5"
+    assert out[2] == []
+
+
+def test_plan_cuts_after_the_per_api_dedupe():
+    # The 0.80 hit is API A's second and is dropped by the dedupe, so the real cut is 0.60 vs 0.59
+    scores = [0.90, 0.80, 0.60, 0.59, 0.58, 0.30, 0.20, 0.10]
+    groups = ["A", "A", "B", "C", "D", "E", "F", "G"]
+    assert plan(scores, top_k=2)["path"] == "skip"
+    assert plan(scores, top_k=2, groups=groups, per_group=1) == {"path": "band", "candidates": 5}
+    # Allowing two per API restores the decisive cut
+    assert plan(scores, top_k=2, groups=groups, per_group=2)["path"] == "skip"
+
+
+def test_plan_never_skips_under_mmr():
+    scores = [0.9, 0.5, 0.4]
+    assert plan(scores, top_k=1)["path"] == "skip"
+    assert plan(scores, top_k=1, groups=["A", "B", "C"], per_group=None)["path"] != "skip"
+
+
+def test_adaptive_rerank_follows_the_diversity_mode():
+    results = _results([0.90, 0.89, 0.88, 0.70, 0.69])
+    for r in results[:3]:
+        r["metadata"]["api_name"] = "Same"
+    assert rerank_adaptive("q", results, 2, _fake_rerank, diversity="cap", max_per_api=2)[0]["text"] == "r0"
+    assert rerank_adaptive("q", results, 2, _fake_rerank, diversity="dedupe")[0]["text"] != "r0"
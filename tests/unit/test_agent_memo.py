@@ -0,0 +1,86 @@
+import time
+from src.agents.memo import MemoStore, memo_input, memoized_completion, prompt_hash
+from src.llm.structured import QueryType, SubQueries
+from src.tracing import span, start_trace
+
+
+def _messages(query, system="Classify the query."):
+    return [{"role": "system", "content": system}, {"role": "user", "content": query}]
+
+
+def test_keys_normalize_input_and_hash_the_prompt():
+    assert memo_input(_messages("  Stripe   vs PayPal ")) == memo_input(_messages("stripe vs paypal"))
+    assert prompt_hash(_messages("a"), QueryType) == prompt_hash(_messages("b"), QueryType)
+    assert prompt_hash(_messages("a"), QueryType) != prompt_hash(_messages("a", "Other prompt."), QueryType)
+    assert prompt_hash(_messages("a"), QueryType) != prompt_hash(_messages("a"), SubQueries)
+
+
+def test_store_round_trip_and_ttl(tmp_path):
+    store = MemoStore(str(tmp_path / "memo.db"), ttl=60)
+    assert store.get("classify", "m", "h", "q") is None
+    store.put("classify", "m", "h", "q", {"type": "SIMPLE"})
+    assert store.get("classify", "m", "h", "q") == {"type": "SIMPLE"}
+    assert store.get("classify", "other-model", "h", "q") is None
+
+    store.ttl = 0
+    time.sleep(0.01)
+    assert store.get("classify", "m", "h", "q") is None
+    assert store.stats()["entries"] == 0
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    store = MemoStore(str(tmp_path / "memo.db"), max_bytes=400)
+    for i in range(4):
+        store.put("decompose", "m", "h", f"query {i}", {"queries": ["x" * 60]})
+        time.sleep(0.002)
+    store.get("decompose", "m", "h", "query 0")
+    store.put("decompose", "m", "h", "query 4", {"queries": ["x" * 60]})
+
+    stats = store.stats()
+    assert stats["bytes"] <= 400
+    kept = {e["input"] for e in store.entries()}
+    assert "query 0" in kept and "query 4" in kept and "query 1" not in kept
+
+
+def test_flush_by_step(tmp_path):
+    store = MemoStore(str(tmp_path / "memo.db"))
+    store.put("classify", "m", "h", "a", {"type": "SIMPLE"})
+    store.put("refine", "m", "h", "a", {"queries": ["b"]})
+    assert store.flush("classify") == 1
+    assert set(store.stats()["steps"]) == {"refine"}
+    assert store.flush() == 1
+
+
+def test_memoized_completion_marks_hits_on_the_span(tmp_path):
+    store = MemoStore(str(tmp_path / "memo.db"))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return QueryType(type="COMPARE")
+
+    with start_trace("agent") as root:
+        with span("classify"):
+            first = memoized_completion("classify", "fast", _messages("Stripe vs PayPal"), QueryType, compute, store)
+        with span("classify"):
+            second = memoized_completion("classify", "fast", _messages("stripe vs  paypal"), QueryType, compute, store)
+
+    assert first == second == QueryType(type="COMPARE")
+    assert len(calls) == 1
+    miss, hit = root.find_all("classify")
+    assert miss.attributes["memo"] == "miss"
+    assert hit.attributes == {"memo": "hit", "model": "memo:fast"}
+    assert store.stats()["steps"]["classify"]["hits"] == 1
+
+
+def test_failed_compute_is_not_stored(tmp_path):
+    store = MemoStore(str(tmp_path / "memo.db"))
+
+    def compute():
+        raise ValueError("no valid response")
+
+    try:
+        memoized_completion("decompose", "fast", _messages("q"), SubQueries, compute, store)
+    except ValueError:
+        pass
+    assert store.stats()["entries"] == 0
@@ -1,3 +1,4 @@
+import importlib
 import pytest
 from src.api.auth import create_token, SECRET_KEY, ALGORITHM
 from jose import jwt
@@ -30,3 +31,32 @@ def test_create_token_different_users():
     p2 = jwt.decode(token2, SECRET_KEY, algorithms=[ALGORITHM])
     assert p1["sub"] == "user-1"
     assert p2["sub"] == "user-2"
+
+
+def _creds(user):
+    from fastapi.security import HTTPAuthorizationCredentials
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_token(user))
+
+
+def test_verify_admin_requires_admin_user(monkeypatch):
+    from fastapi import HTTPException
+    from src.api import auth
+
+    monkeypatch.setattr(auth, "ADMIN_USERS", {"ops"})
+    assert auth.verify_admin(_creds("ops")) == "ops"
+    with pytest.raises(HTTPException) as exc:
+        auth.verify_admin(_creds("someone"))
+    assert exc.value.status_code == 403
+
+
+def test_no_admins_by_default(monkeypatch):
+    from fastapi import HTTPException
+    from src.api import auth
+
+    monkeypatch.delenv("ADMIN_USERS", raising=False)
+    importlib.reload(auth)
+    assert auth.ADMIN_USERS == set()
+    # Anyone can mint a token for "admin" through /token; it must not open /admin
+    with pytest.raises(HTTPException) as exc:
+        auth.verify_admin(_creds("admin"))
+    assert exc.value.status_code == 403
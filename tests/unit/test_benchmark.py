@@ -0,0 +1,80 @@
+import numpy as np
+import faiss
+import pytest
+from src.evaluation import benchmark
+from src.search import adaptive_rerank
+from src.evaluation.benchmark import STAGES, build_ablation_indexes, check_regressions, stage_timings, stored_vectors
+from src.search.vector_store import INDEX_TYPES, make_index
+
+
+def _report(total_p95, qps, p5=0.5):
+    stage = {"p50": 1.0, "p95": total_p95, "p99": total_p95}
+    return {
+        "config": {"embeddings": "cached"},
+        "stages": {"total": stage},
+        "throughput": [{"clients": 4, "qps": qps}],
+        "precision_at_5": p5,
+    }
+
+
+def test_check_regressions_passes_within_tolerance():
+    baseline = {"embeddings": "cached", "tolerance": 0.2,
+                "metrics": {"stages.total.p95": 100, "throughput.c4.qps": 50}}
+    assert check_regressions(_report(110, 45), baseline) == []
+
+
+def test_check_regressions_flags_latency_and_throughput():
+    baseline = {"embeddings": "cached", "tolerance": 0.2,
+                "metrics": {"stages.total.p95": 100, "throughput.c4.qps": 50, "precision_at_5": 0.6}}
+    failures = check_regressions(_report(150, 30, p5=0.3), baseline)
+    assert len(failures) == 3
+
+
+def test_check_regressions_skips_quality_across_embedding_modes():
+    baseline = {"embeddings": "stub", "tolerance": 0.2, "metrics": {"precision_at_5": 0.6}}
+    assert check_regressions(_report(100, 50, p5=0.0), baseline) == []
+
+
+@pytest.mark.parametrize("base_type", INDEX_TYPES)
+def test_ablation_indexes_rebuild_from_any_base_index(base_type):
+    vectors = np.random.default_rng(0).standard_normal((600, 8)).astype("float32")
+    faiss.normalize_L2(vectors)
+    base = make_index(vectors, base_type)
+    np.testing.assert_allclose(stored_vectors(base), vectors, atol=1e-6)
+
+    indexes = build_ablation_indexes(base)
+    assert set(indexes) == set(INDEX_TYPES)
+    assert all(index.ntotal == len(vectors) for index in indexes.values())
+
+
+def test_stage_timings_come_from_the_search_spans():
+    spans = {
+        "embed": 2.0, "embed/embed": 1.5,
+        "search": 9.0, "search/faiss": 1.0, "search/hydrate": 0.5, "search/rerank": 6.0,
+        "search/diversify": 1.0, "search/diversify/embed": 0.8,
+    }
+    timings = stage_timings(spans, total_ms=11.5)
+    assert timings == {"embed": 2.0, "faiss": 1.0, "hydrate": 0.5, "rerank": 6.0, "diversify": 1.0, "total": 11.5}
+    # Stages a query did not reach (no reranker) still report 0
+    assert stage_timings({"embed": 1.0}, 1.0)["rerank"] == 0.0 and set(stage_timings({}, 0)) == set(STAGES)
+
+
+def test_stages_report_latency_per_rerank_path(monkeypatch):
+    # Decisive scores skip the cross-encoder, flat ones rerank every candidate
+    scores = {"decisive": [0.9, 0.3, 0.2, 0.1], "flat": [0.5, 0.5, 0.5, 0.5]}
+    totals = {"decisive": 2.0, "flat": 20.0}
+
+    def fake_pipeline(query, embed, faiss_index, top_k=5, rerank_mode=None, **kwargs):
+        adaptive_rerank.record(adaptive_rerank.plan(scores[query], top_k, rerank_mode), len(scores[query]))
+        return [], {**dict.fromkeys(STAGES, 0.0), "total": totals[query]}
+
+    monkeypatch.setattr(benchmark, "run_pipeline", fake_pipeline)
+    dataset = [{"query": "decisive"}, {"query": "flat"}]
+    report = benchmark.benchmark_stages(dataset, None, None, repeats=2, top_k=1, rerank_mode="adaptive")
+
+    rerank = report["rerank"]
+    assert rerank["mode"] == "adaptive" and rerank["runs"] == 4
+    assert rerank["paths"] == {"skip": 2, "band": 0, "full": 2}
+    assert rerank["latency_ms"]["skip"]["p50"] == 2.0 and rerank["latency_ms"]["skip"]["n"] == 2
+    assert rerank["latency_ms"]["full"]["p50"] == 20.0
+    assert rerank["latency_ms"]["band"]["n"] == 0
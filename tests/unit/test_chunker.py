@@ -67,4 +67,151 @@ def test_chunk_spec_invalid_json(tmp_path):
     bad_file.write_text("not valid json or yaml {{{}}")
 
     chunks = chunk_spec(str(bad_file))
-    assert chunks == []
\ No newline at end of file
+    assert chunks == []
+
+def test_chunk_yaml_spec(tmp_path):
+    import yaml
+    spec_file = tmp_path / "test_api.yaml"
+    spec_file.write_text(yaml.safe_dump(SAMPLE_SPEC))
+
+    chunks = chunk_spec(str(spec_file))
+    assert len(chunks) == 3
+    assert chunks[0]["metadata"]["source_file"] == "test_api.yaml"
+
+
+def test_iter_chunks_includes_yaml_and_skips_other_files(tmp_path):
+    from src.ingestion.chunker import iter_chunks
+    import yaml
+    (tmp_path / "a.json").write_text(json.dumps(SAMPLE_SPEC))
+    (tmp_path / "b.yml").write_text(yaml.safe_dump(SAMPLE_SPEC))
+    (tmp_path / "notes.txt").write_text("ignore me")
+
+    chunks = iter_chunks(str(tmp_path))
+    assert not isinstance(chunks, list)
+    sources = [c["metadata"]["source_file"] for c in chunks]
+    assert sources.count("a.json") == 3
+    assert sources.count("b.yml") == 3
+    assert "notes.txt" not in sources
+
+
+def test_chunk_all_specs_streams_jsonl(tmp_path):
+    from src.ingestion.chunker import chunk_all_specs, iter_chunks_file, count_chunks
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    (raw_dir / "a.json").write_text(json.dumps(SAMPLE_SPEC))
+    output = tmp_path / "processed" / "chunks.jsonl"
+
+    assert chunk_all_specs(str(raw_dir), str(output)) == 3
+    lines = output.read_text().splitlines()
+    assert len(lines) == 3
+    assert count_chunks(str(output)) == 3
+    assert [c["metadata"]["type"] for c in iter_chunks_file(str(output))] == ["overview", "endpoint", "endpoint"]
+
+
+def test_chunk_all_specs_coerces_yaml_scalars(tmp_path):
+    # Unquoted YAML dates and numbers load as date/int objects, which json.dumps rejects
+    from src.ingestion.chunker import chunk_all_specs, iter_chunks_file
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    (raw_dir / "dated.yaml").write_text(
+        "openapi: 3.0.0\n"
+        "info: {title: Dated API, version: 2020-01-01}\n"
+        "servers: [{url: 8080}]\n"
+        "paths:\n"
+        "  /items:\n"
+        "    get: {summary: List items, tags: [2020-01-01, 42]}\n"
+        "  /item:\n"
+        "    get: {summary: One item, tags: single}\n"
+    )
+    output = tmp_path / "chunks.jsonl"
+
+    assert chunk_all_specs(str(raw_dir), str(output)) == 3
+    overview, items, item = iter_chunks_file(str(output))
+    assert overview["metadata"]["version"] == "2020-01-01"
+    assert overview["metadata"]["base_url"] == "8080"
+    assert items["metadata"]["tags"] == ["2020-01-01", "42"]
+    assert item["metadata"]["tags"] == ["single"]
+
+
+REF_SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "Ref API", "version": 2.1},
+    "paths": {
+        "/users/{id}": {
+            "parameters": [{"$ref": "#/components/parameters/UserId"}],
+            "get": {
+                "summary": "Get user",
+                "parameters": [{"name": "expand", "in": "query"}],
+                "responses": {
+                    "404": {"$ref": "#/components/responses/NotFound"},
+                    "200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/User"}}}},
+                },
+            },
+            "put": {
+                "summary": "Replace user",
+                "parameters": [{"name": "id", "in": "path", "description": "override"}],
+                "requestBody": {"$ref": "#/components/requestBodies/UserBody"},
+                "responses": {"200": {"content": {"application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/User"}}}}}},
+            },
+            "head": {"summary": "Check user exists"},
+            "options": {"summary": "CORS preflight"},
+        },
+    },
+    "components": {
+        "parameters": {"UserId": {"name": "id", "in": "path"}},
+        "schemas": {"User": {"type": "object"}, "Error": {"type": "object"}},
+        "responses": {"NotFound": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Error"}}}}},
+        "requestBodies": {"UserBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/User"}}}}},
+    },
+}
+
+
+def test_extract_endpoints_resolves_refs():
+    endpoints = {e["method"]: e for e in extract_endpoints(REF_SPEC)}
+    assert set(endpoints) == {"GET", "PUT", "HEAD", "OPTIONS"}
+
+    get = endpoints["GET"]
+    assert get["parameters"] == ["id", "expand"]
+    assert get["request_schema"] is None
+    assert get["response_schemas"] == ["User", "Error"]
+
+    put = endpoints["PUT"]
+    assert put["parameters"] == ["id"]
+    assert put["request_schema"] == "User"
+    assert put["response_schemas"] == ["User[]"]
+
+
+def test_swagger2_body_parameter_schema():
+    spec = {
+        "swagger": "2.0",
+        "paths": {"/pets": {"post": {
+            "parameters": [{"$ref": "#/parameters/PetBody"}],
+            "responses": {"201": {"schema": {"$ref": "#/definitions/Pet"}}},
+        }}},
+        "parameters": {"PetBody": {"name": "body", "in": "body", "schema": {"$ref": "#/definitions/NewPet"}}},
+        "definitions": {"Pet": {}, "NewPet": {}},
+    }
+    (endpoint,) = extract_endpoints(spec)
+    assert endpoint["request_schema"] == "NewPet"
+    assert endpoint["response_schemas"] == ["Pet"]
+
+
+def test_ref_resolver_memoizes_and_stops_on_cycles():
+    from src.ingestion.chunker import RefResolver
+    spec = {"a": {"$ref": "#/b"}, "b": {"$ref": "#/a"}, "c": {"x": 1}}
+    resolver = RefResolver(spec)
+    assert resolver.resolve({"$ref": "#/c"}) == {"x": 1}
+    assert "#/c" in resolver._cache
+    assert isinstance(resolver.resolve({"$ref": "#/a"}), dict)
+    assert resolver.resolve({"$ref": "other.yaml#/x"}) == {"$ref": "other.yaml#/x"}
+
+
+def test_chunk_spec_includes_schema_names_in_text(tmp_path):
+    spec_file = tmp_path / "ref.json"
+    spec_file.write_text(json.dumps(REF_SPEC))
+    chunks = chunk_spec(str(spec_file))
+    put = next(c for c in chunks if c["metadata"].get("method") == "PUT")
+    assert "Request body: User" in put["text"]
+    assert "Parameters: id" in put["text"]
+    assert chunks[0]["metadata"]["version"] == "2.1"
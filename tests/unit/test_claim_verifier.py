@@ -0,0 +1,160 @@
+import threading
+import numpy as np
+from types import SimpleNamespace
+from src.llm.client import stream_completion
+from src.search.claim_verifier import (
+    SentenceSplitter, ClaimVerifier, ClaimCache, clean_claim, replace_claims, salient_tokens, verify_answer,
+)
+
+TOPICS = ["sms", "login", "weather", "payments"]
+
+
+def topic_vector(text):
+    """Unit vector on the axis of the first topic word in text (orthogonal topics)."""
+    vec = np.zeros(len(TOPICS) + 1, dtype="float32")
+    words = text.lower()
+    hits = [i for i, t in enumerate(TOPICS) if t in words]
+    vec[hits[0] if hits else len(TOPICS)] = 1.0
+    return vec
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls += 1
+        return np.stack([topic_vector(t) for t in texts])
+
+
+SOURCES = [
+    {"text": "Twilio sends sms messages worldwide via POST /Messages"},
+    {"text": "Authentiq provides passwordless login with push sign-in"},
+]
+
+
+def make_verifier(embedder=None, cache=None):
+    embedder = embedder or CountingEmbedder()
+    vectors = np.stack([topic_vector(s["text"]) for s in SOURCES])
+    return ClaimVerifier(SOURCES, vectors, embedder, cache=cache or ClaimCache()), embedder
+
+
+def test_splitter_emits_sentences_as_they_complete():
+    splitter = SentenceSplitter()
+    assert splitter.feed("Twilio sends S") == []
+    assert splitter.feed("MS worldwide. Authen") == ["Twilio sends SMS worldwide."]
+    assert splitter.feed("tiq handles login.\n| a | b |\n") == ["Authentiq handles login.", "| a | b |"]
+    assert splitter.flush() == []
+    splitter.feed("trailing text")
+    assert splitter.flush() == ["trailing text"]
+
+
+def test_clean_claim_drops_markup_and_fragments():
+    assert clean_claim("- **Twilio** sends SMS worldwide [Source 1].") == "Twilio sends SMS worldwide ."
+    assert clean_claim("|---|---|") is None
+    assert clean_claim("## Options") is None
+    assert clean_claim("| Twilio | SMS | Yes | Global |") == "Twilio SMS Yes Global"
+
+
+def test_salient_tokens():
+    assert salient_tokens("Call POST /v1/messages with 160 chars via TwilioClient.") == {
+        "/v1/messages", "160", "twilioclient"}
+
+
+def test_streamed_answer_is_verified_per_claim():
+    verifier, _ = make_verifier()
+    answer = ("Twilio can send sms messages to any country [Source 1]. "
+              "Authentiq supports passwordless login for users. "
+              "Weather data is updated every hour for cities.")
+    for i in range(0, len(answer), 7):
+        verifier.add_text(answer[i:i + 7])
+    result = verifier.finish()
+
+    statuses = [(c["status"], c["source"]) for c in result["claims"]]
+    assert statuses == [("SUPPORTED", "Source 1"), ("SUPPORTED", "Source 2"), ("UNSUPPORTED", None)]
+    assert result["supported_count"] == 2
+    assert result["total_count"] == 3
+    assert result["grounding_score"] == round(2 / 3, 3)
+
+
+def test_identifier_missing_from_source_downgrades_to_partial():
+    verifier, _ = make_verifier()
+    verifier.add_text("Twilio sends sms messages through POST /v2/Bulk only.")
+    claim = verifier.finish()["claims"][0]
+    assert claim["status"] == "PARTIAL"
+    assert claim["source"] == "Source 1"
+
+
+def test_verdicts_are_cached_per_claim_and_source_set():
+    cache = ClaimCache()
+    embedder = CountingEmbedder()
+    answer = "Twilio can send sms messages to any country."
+    first, _ = make_verifier(embedder, cache)
+    verify_first = verify_answer(answer, SOURCES, first.source_vectors, embedder, cache=cache)
+    calls = embedder.calls
+    again = verify_answer(answer, SOURCES, first.source_vectors, embedder, cache=cache)
+    assert embedder.calls == calls
+    assert again == verify_first
+
+    other_sources = SOURCES[:1]
+    verify_answer(answer, other_sources, first.source_vectors[:1], embedder, cache=cache)
+    assert embedder.calls == calls + 1
+
+
+def test_cache_is_bounded():
+    cache = ClaimCache(max_entries=2)
+    for i in range(3):
+        cache.put(("claim", str(i)), {"status": "SUPPORTED"})
+    assert cache.get(("claim", "0")) is None
+    assert cache.get(("claim", "2")) is not None
+
+
+def test_no_sources_means_unsupported():
+    result = verify_answer("Twilio can send sms messages anywhere.", [], np.zeros((0, 5)), CountingEmbedder(),
+                           cache=ClaimCache())
+    assert result["grounding_score"] == 0.0
+    assert result["claims"][0]["status"] == "UNSUPPORTED"
+
+
+def test_stream_completion_feeds_verifier_and_returns_usage():
+    def chunk(content=None, usage=None):
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    deltas = ["Authentiq supports ", "passwordless login for users.", " Twilio can send sms ", "to phones."]
+    stream = [chunk(d) for d in deltas] + [chunk(usage=SimpleNamespace(prompt_tokens=50, completion_tokens=12))]
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return iter(stream)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    verifier, _ = make_verifier()
+    answer, usage = stream_completion(client, "m", [], verifier.add_text)
+
+    assert answer == "".join(deltas)
+    assert usage.completion_tokens == 12
+    assert calls[0]["stream"] is True
+    assert [c["source"] for c in verifier.finish()["claims"]] == ["Source 2", "Source 1"]
+
+
+def test_replace_claims_rewrites_and_drops_only_listed_sentences():
+    answer = (
+        "Stripe supports refunds via POST /v1/refunds [Source 1]. PayPal has no webhooks at all [Source 2].\n\n"
+        "| API | Support |\n|---|---|\n\n**Recommendation:** use Stripe for most teams."
+    )
+    revised, sentences, replaced = replace_claims(answer, {
+        # Echoed claims may differ in punctuation and case
+        "paypal has no webhooks at all.": "PayPal sends webhooks for payment events [Source 3].",
+        "Not in the answer at all, so nothing happens": "ignored",
+    })
+    assert revised == answer.replace("PayPal has no webhooks at all [Source 2].", sentences[0])
+    assert sentences == ["PayPal sends webhooks for payment events [Source 3]."]
+    assert replaced == {"paypal has no webhooks at all"}
+
+    dropped, sentences, replaced = replace_claims(answer, {"Stripe supports refunds via POST /v1/refunds": ""})
+    assert dropped.startswith("PayPal has no webhooks")
+    assert sentences == [] and len(replaced) == 1
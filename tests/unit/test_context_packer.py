@@ -0,0 +1,72 @@
+from src.search.context_packer import pack_context, grounding_sources, trim_to_relevant, terms, count_tokens
+
+
+def _result(name, text, score, rerank_score=None, type_="overview"):
+    r = {"text": text, "score": score, "metadata": {"api_name": name, "type": type_}}
+    if rerank_score is not None:
+        r["rerank_score"] = rerank_score
+    return r
+
+
+LONG_TEXT = "Twilio API\n" + " ".join(
+    f"Sentence {i} covers billing and invoices." for i in range(300)
+) + " You can send SMS messages internationally."
+
+
+def test_trim_keeps_header_and_relevant_sentence():
+    trimmed = trim_to_relevant(LONG_TEXT, terms("send sms internationally"), max_tokens=60)
+    assert trimmed.startswith("Twilio API")
+    assert "send SMS messages internationally" in trimmed
+    assert count_tokens(trimmed) <= 60
+
+
+def test_short_text_is_untouched():
+    assert trim_to_relevant("GET /users\nList users", terms("users"), 100) == "GET /users\nList users"
+
+
+def test_pack_orders_by_rerank_score():
+    results = [
+        _result("Low", "Low relevance text about nothing", 0.9, rerank_score=-2.0),
+        _result("High", "Send SMS with this API", 0.1, rerank_score=5.0),
+    ]
+    context, packed, _ = pack_context("send sms", results)
+    assert [r["metadata"]["api_name"] for r in packed] == ["High", "Low"]
+    assert context.startswith("[Source 1] API: High")
+
+
+def test_pack_drops_near_duplicates():
+    results = [
+        _result("A v1", "Send SMS messages to any phone number worldwide", 0.9),
+        _result("A v2", "Send SMS messages to any phone number worldwide", 0.8),
+        _result("B", "Manage cloud storage buckets", 0.7),
+    ]
+    _, packed, stats = pack_context("send sms", results)
+    assert [r["metadata"]["api_name"] for r in packed] == ["A v1", "B"]
+    assert stats["dropped_duplicates"] == 1
+
+
+def test_pack_respects_budget_and_reports_savings():
+    results = [_result(f"API {i}", LONG_TEXT.replace("Twilio", f"Vendor{i}") + f" unique{i}", 1 - i / 10)
+               for i in range(5)]
+    context, packed, stats = pack_context("send sms internationally", results, token_budget=300)
+    assert stats["context_packed"] <= 300
+    assert stats["context_raw"] > stats["context_packed"]
+    assert stats["context_saved"] == stats["context_raw"] - stats["context_packed"]
+    assert len(packed) >= 1
+
+
+def test_pack_numbers_sources_from_first_source():
+    results = [_result("A", "Send SMS messages", 0.9), _result("B", "Manage cloud storage buckets", 0.8)]
+    context, packed, _ = pack_context("sms", results, first_source=4)
+    assert "[Source 4] API: A" in context and "[Source 5] API: B" in context
+    assert "[Source 1]" not in context
+
+
+def test_grounding_sources_are_the_packed_text():
+    results = [_result("Twilio", LONG_TEXT, 0.9)]
+    context, packed, _ = pack_context("send sms internationally", results, max_chunk_tokens=80)
+    assert packed[0]["text"] == LONG_TEXT and results[0].get("packed_text") is None
+    sources = grounding_sources(packed)
+    assert sources == [{"api_name": "Twilio", "text": packed[0]["packed_text"]}]
+    # The judge sees the trimmed text the prompt had, including the sentence the query needed
+    assert sources[0]["text"] in context and "internationally" in sources[0]["text"]
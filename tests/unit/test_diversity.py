@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from src.search.diversity import cap_per_api, dedupe_by_api, diversify, mmr_select, relevance_scores
+
+
+def _results(names, scores):
+    return [{"text": f"{n} {i}", "score": s, "metadata": {"api_name": n}} for i, (n, s) in enumerate(zip(names, scores))]
+
+
+def test_dedupe_and_cap():
+    results = _results(["A", "A", "A", "B", "C"], [0.9, 0.8, 0.7, 0.6, 0.5])
+    assert [r["text"] for r in dedupe_by_api(results)] == ["A 0", "B 3", "C 4"]
+    assert [r["text"] for r in cap_per_api(results, 2)] == ["A 0", "A 1", "B 3", "C 4"]
+
+
+def test_relevance_scores_prefers_complete_rerank_scores():
+    results = _results(["A", "B", "C"], [0.9, 0.8, 0.7])
+    np.testing.assert_allclose(relevance_scores(results), [1.0, 0.5, 0.0])
+    for r, score in zip(results, [-2.0, 6.0, 2.0]):
+        r["rerank_score"] = score
+    np.testing.assert_allclose(relevance_scores(results), [0.0, 1.0, 0.5])
+    assert relevance_scores(_results(["A", "B"], [0.5, 0.5])).tolist() == [1.0, 1.0]
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1, 0, 0], [0.999, 0.045, 0], [0, 1, 0], [0, 0, 1]], dtype="float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = [1.0, 0.95, 0.6, 0.5]
+
+    assert mmr_select(relevance, vectors, 3, mmr_lambda=1.0) == [0, 1, 2]
+    assert mmr_select(relevance, vectors, 3, mmr_lambda=0.5) == [0, 2, 3]
+
+
+def test_mmr_group_cap():
+    vectors = np.eye(4, dtype="float32")
+    picked = mmr_select([1.0, 0.9, 0.8, 0.1], vectors, 3, mmr_lambda=1.0,
+                        groups=["A", "A", "A", "B"], max_per_group=2)
+    assert picked == [0, 1, 3]
+
+
+def test_diversify_modes():
+    results = _results(["A", "A", "B", "C"], [0.9, 0.89, 0.5, 0.4])
+    vectors = np.array([[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype="float32")
+
+    assert len(diversify(results, 3, None, mode="dedupe")) == 3
+    assert [r["text"] for r in diversify(results, 2, None, mode="cap", max_per_api=2)] == ["A 0", "A 1"]
+    mmr = diversify(results, 3, lambda rs: vectors, mode="mmr", mmr_lambda=0.5)
+    assert [r["text"] for r in mmr] == ["A 0", "B 2", "C 3"]
+    with pytest.raises(ValueError):
+        diversify(results, 3, None, mode="random")
@@ -0,0 +1,120 @@
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from src.ingestion.download_specs import download_specs, load_manifest
+from src.ingestion.chunker import iter_spec_files, iter_chunks
+
+
+SPECS = {
+    "/specs/alpha.json": json.dumps({"info": {"title": "Alpha"}, "paths": {"/a": {"get": {"summary": "A"}}}}).encode(),
+    "/specs/beta.yaml": b"info:\n  title: Beta\npaths:\n  /b:\n    post:\n      summary: B\n",
+    "/specs/flaky.json": json.dumps({"info": {"title": "Flaky"}, "paths": {}}).encode(),
+}
+
+
+class SpecServer:
+    """Local stand-in for APIs.guru serving fixture specs with ETags."""
+
+    def __init__(self):
+        self.specs = dict(SPECS)
+        self.requests = []
+        self.flaky_failures = 1
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                if self.path == "/list.json":
+                    return self._send(200, json.dumps(server.api_list()).encode())
+                if self.path == "/specs/flaky.json" and server.flaky_failures > 0:
+                    server.flaky_failures -= 1
+                    return self._send(503, b"try again")
+                body = server.specs.get(self.path)
+                if body is None:
+                    return self._send(404, b"missing")
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", etag)
+                return self._send(200, body, etag)
+
+            def _send(self, status, body, etag=None):
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def api_list(self):
+        entries = {}
+        for name, path in (("alpha.io", "/specs/alpha.json"), ("beta.io:v1", "/specs/beta.yaml"),
+                           ("flaky.io", "/specs/flaky.json")):
+            key = "swaggerYamlUrl" if path.endswith(".yaml") else "swaggerUrl"
+            entries[name] = {"preferred": "1", "versions": {"1": {key: self.base + path}}}
+        return entries
+
+
+@pytest.fixture
+def server():
+    s = SpecServer()
+    yield s
+    s.httpd.shutdown()
+
+
+def _download(server, raw_dir):
+    return download_specs(limit=10, list_url=server.base + "/list.json", raw_dir=str(raw_dir),
+                          concurrency=4, backoff_base=0.01)
+
+
+def test_download_stores_content_addressed_with_manifest(server, tmp_path):
+    stats = _download(server, tmp_path)
+    assert stats["downloaded"] == 3
+    assert stats["failed"] == 0
+
+    manifest = load_manifest(str(tmp_path))
+    alpha = manifest["specs"]["alpha.io"]
+    assert alpha["sha256"] == hashlib.sha256(SPECS["/specs/alpha.json"]).hexdigest()
+    assert alpha["path"].endswith(alpha["sha256"] + ".json")
+    assert (tmp_path / alpha["path"]).read_bytes() == SPECS["/specs/alpha.json"]
+    assert manifest["specs"]["beta.io_v1"]["path"].endswith(".yaml")
+
+
+def test_retry_recovers_from_503(server, tmp_path):
+    _download(server, tmp_path)
+    assert server.requests.count("/specs/flaky.json") == 2
+
+
+def test_refresh_sends_conditional_requests(server, tmp_path):
+    _download(server, tmp_path)
+    stats = _download(server, tmp_path)
+    assert stats["not_modified"] == 3
+    assert stats["bytes"] == 0
+
+
+def test_changed_spec_replaces_old_object(server, tmp_path):
+    _download(server, tmp_path)
+    old_path = load_manifest(str(tmp_path))["specs"]["alpha.io"]["path"]
+
+    server.specs["/specs/alpha.json"] = json.dumps({"info": {"title": "Alpha v2"}, "paths": {}}).encode()
+    stats = _download(server, tmp_path)
+    assert stats["downloaded"] == 1
+    assert stats["not_modified"] == 2
+    assert stats["pruned"] == 1
+    assert not (tmp_path / old_path).exists()
+
+
+def test_chunker_reads_manifest(server, tmp_path):
+    _download(server, tmp_path)
+    names = [name for _, name in iter_spec_files(str(tmp_path))]
+    assert names == ["alpha.io.json", "beta.io_v1.yaml", "flaky.io.json"]
+    titles = {c["metadata"]["api_name"] for c in iter_chunks(str(tmp_path))}
+    assert titles == {"Alpha", "Beta", "Flaky"}
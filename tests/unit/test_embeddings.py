@@ -0,0 +1,130 @@
+import json
+import numpy as np
+import pytest
+from src.llm.embeddings import HashEmbeddingProvider, get_provider, check_manifest
+
+
+def test_hash_provider_is_deterministic_and_normalized():
+    provider = HashEmbeddingProvider(dimension=64)
+    a = provider.embed(["send sms", "send email"])
+    b = provider.embed(["send sms"])
+    assert a.shape == (2, 64)
+    assert a.dtype == np.float32
+    assert np.allclose(a[0], b[0])
+    assert not np.allclose(a[0], a[1])
+    assert np.linalg.norm(a, axis=1) == pytest.approx([1.0, 1.0], abs=1e-5)
+
+
+def test_get_provider_shares_instances():
+    assert get_provider("hash") is get_provider("hash")
+    assert get_provider("local").name == "local"
+
+
+def test_get_provider_unknown():
+    with pytest.raises(ValueError):
+        get_provider("nope")
+
+
+def test_check_manifest_accepts_matching_model():
+    provider = HashEmbeddingProvider(dimension=64)
+    check_manifest({"embedding_provider": "hash", "embedding_model": "hash-64"}, provider)
+
+
+def test_check_manifest_rejects_mismatch():
+    provider = HashEmbeddingProvider(dimension=64)
+    with pytest.raises(RuntimeError, match="text-embedding-3-large"):
+        check_manifest({"embedding_provider": "openai", "embedding_model": "text-embedding-3-large"}, provider)
+
+
+def test_build_index_writes_manifest(tmp_path, monkeypatch):
+    from src.search import vector_store
+
+    provider = HashEmbeddingProvider(dimension=32)
+    chunks = [{"text": f"chunk {i}", "metadata": {"api_name": f"API {i}"}} for i in range(10)]
+    paths = {
+        "EMBEDDINGS_PATH": tmp_path / "embeddings.npy",
+        "EMBEDDINGS_META_PATH": tmp_path / "embeddings_meta.json",
+        "INDEX_PATH": tmp_path / "faiss_index.bin",
+        "METADATA_PATH": tmp_path / "metadata.json",
+        "MANIFEST_PATH": tmp_path / "index_manifest.json",
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(vector_store, name, str(path))
+
+    np.save(paths["EMBEDDINGS_PATH"], provider.embed([c["text"] for c in chunks]))
+    chunks_path = tmp_path / "chunks.jsonl"
+    chunks_path.write_text("".join(json.dumps(c) + "\n" for c in chunks))
+    paths["EMBEDDINGS_META_PATH"].write_text(json.dumps(
+        {"embedding_provider": "hash", "embedding_model": "hash-32", "dimension": 32, "count": 10}
+    ))
+
+    vector_store.build_index(chunks_path=str(chunks_path))
+
+    manifest = json.loads(paths["MANIFEST_PATH"].read_text())
+    assert manifest["embedding_provider"] == "hash"
+    assert manifest["embedding_model"] == "hash-32"
+    assert manifest["vectors"] == 10
+    assert manifest["dimension"] == 32
+    check_manifest(manifest, provider)
+    assert len(json.loads(paths["METADATA_PATH"].read_text())) == 10
+
+
+def test_dedupe_report():
+    from src.ingestion.embed import dedupe_report
+
+    counts = {"chunks": 10, "unique": 4, "chars": 40_000_000, "duplicate_chars": 24_000_000}
+    report = dedupe_report(counts, "text-embedding-3-large")
+    assert report["duplicates"] == 6 and report["dedupe_ratio"] == 0.6
+    assert report["tokens_saved"] == 6_000_000
+    assert report["cost_saved_usd"] == pytest.approx(0.78)
+    assert dedupe_report(counts, "hash-32")["cost_saved_usd"] == 0.0
+
+
+def test_identical_chunks_share_one_embedding_and_vector(tmp_path, monkeypatch):
+    from src.ingestion import embed
+    from src.search import vector_store
+
+    for module, name, path in [
+        (embed, "EMBEDDINGS_DIR", tmp_path / "batches"),
+        (embed, "EMBEDDINGS_PATH", tmp_path / "embeddings.npy"),
+        (embed, "EMBEDDINGS_META_PATH", tmp_path / "embeddings_meta.json"),
+        (vector_store, "EMBEDDINGS_PATH", tmp_path / "embeddings.npy"),
+        (vector_store, "EMBEDDINGS_META_PATH", tmp_path / "embeddings_meta.json"),
+        (vector_store, "INDEX_PATH", tmp_path / "faiss_index.bin"),
+        (vector_store, "METADATA_PATH", tmp_path / "metadata.json"),
+        (vector_store, "MANIFEST_PATH", tmp_path / "index_manifest.json"),
+    ]:
+        monkeypatch.setattr(module, name, str(path))
+    monkeypatch.setattr(embed, "BATCH_SIZE", 2)
+
+    # Versioned copies of one spec: "boilerplate" three times, "list users" twice
+    texts = ["boilerplate", "list users", "boilerplate", "create user", "list users", "boilerplate"]
+    chunks = [{"text": t, "metadata": {"api_name": f"API v{i}"}} for i, t in enumerate(texts)]
+    chunks_path = tmp_path / "chunks.jsonl"
+    chunks_path.write_text("".join(json.dumps(c) + "\n" for c in chunks))
+
+    provider = HashEmbeddingProvider(dimension=16)
+    assert embed.generate_embeddings(provider, str(chunks_path), dedupe=True)
+
+    assert np.load(tmp_path / "embeddings.npy").shape == (3, 16)
+    assert np.load(tmp_path / "embeddings_rows.npy").tolist() == [0, 1, 0, 2, 1, 0]
+    meta = json.loads((tmp_path / "embeddings_meta.json").read_text())
+    assert meta["count"] == 3 and meta["chunks"] == 6
+    assert meta["dedupe"]["duplicates"] == 3 and meta["dedupe"]["dedupe_ratio"] == 0.5
+
+    vector_store.build_index(chunks_path=str(chunks_path))
+    manifest = json.loads((tmp_path / "index_manifest.json").read_text())
+    assert manifest["vectors"] == 3 and manifest["chunks"] == 6
+    assert len(json.loads((tmp_path / "metadata.json").read_text())) == 6
+
+    store = vector_store.FaissStore()
+    top = store.search(provider.embed(["boilerplate"]), 1)[0][0]
+    assert top["metadata"]["api_name"] == "API v0"
+    assert [d["api_name"] for d in top["duplicates"]] == ["API v2", "API v5"]
+
+    # Without dedupe every chunk gets its own row, and the build drops the chunk map
+    assert embed.generate_embeddings(provider, str(chunks_path), dedupe=False)
+    assert np.load(tmp_path / "embeddings.npy").shape == (6, 16)
+    vector_store.build_index(chunks_path=str(chunks_path))
+    assert not (tmp_path / "metadata_rows.npy").exists()
+    assert vector_store.FaissStore().count == 6
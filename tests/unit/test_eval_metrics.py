@@ -0,0 +1,62 @@
+import json
+import numpy as np
+import pytest
+from src.evaluation.eval import load_golden_dataset
+from src.evaluation.metrics import percentiles, retrieval_metrics, match_tensor, mrr, relevance_matrix
+
+
+RETRIEVED = [
+    ["Twilio API", "Stripe", "Vonage SMS"],
+    ["Foo", "Auth0 Management", "Okta"],
+    ["Foo", "Bar", "Baz"],
+    ["Anything"],
+]
+EXPECTED = [
+    ["twilio", "SMS"],
+    ["Auth0", "Okta"],
+    ["Stripe"],
+    None,
+]
+
+
+def test_percentiles():
+    stats = percentiles(list(range(1, 101)))
+    assert stats["n"] == 100
+    assert stats["p50"] == pytest.approx(50.5)
+    assert stats["p99"] > stats["p95"] > stats["p50"]
+
+
+def test_percentiles_empty():
+    assert percentiles([])["n"] == 0
+
+
+def test_match_tensor_ignores_padding_and_unscored():
+    match, expected_mask, scored = match_tensor(RETRIEVED, EXPECTED, k=3)
+    assert match.shape == (4, 2, 3)
+    assert scored.tolist() == [True, True, True, False]
+    assert not match[3].any()
+    rel = relevance_matrix(match)
+    assert rel[0].tolist() == [True, False, True]
+
+
+def test_mrr():
+    rel = np.array([[False, True, False], [True, False, False], [False, False, False]])
+    assert mrr(rel).tolist() == [0.5, 1.0, 0.0]
+
+
+def test_retrieval_metrics():
+    summary, per_query, scored = retrieval_metrics(RETRIEVED, EXPECTED, k=3)
+    assert summary["scored_queries"] == 3
+    assert per_query["recall_at_3"][:3].tolist() == [1.0, 1.0, 0.0]
+    assert per_query["precision_at_3"][1] == pytest.approx(2 / 3)
+    assert per_query["mrr"][:3].tolist() == [1.0, 0.5, 0.0]
+    assert summary["mrr"] == 0.5
+    assert per_query["ndcg_at_3"][0] == pytest.approx((1 + 1 / np.log2(4)) / (1 + 1 / np.log2(3)))
+    assert 0.0 <= summary["ndcg_at_3"] <= 1.0
+
+
+def test_load_golden_dataset_jsonl(tmp_path):
+    path = tmp_path / "golden.jsonl"
+    rows = [{"query": f"q{i}", "expected_apis": ["X"]} for i in range(3)]
+    path.write_text("\n".join(json.dumps(r) for r in rows) + "\n\n")
+    assert load_golden_dataset(str(path)) == rows
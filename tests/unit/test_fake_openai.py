@@ -0,0 +1,66 @@
+import random
+import openai
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from src.evaluation.fake_openai import create_app, parse_latency, sample_schema
+from src.llm.client import stream_completion
+from src.llm.structured import GroundingCheck, QueryType, Revisions, SubQueries, strict_schema, structured_completion
+
+FAST = {"chat_latency": "fixed:0", "token_ms": 0, "embed_latency": "fixed:0", "embedding_dim": 8, "seed": 1}
+
+
+def _client(**config):
+    http = TestClient(create_app({**FAST, **config}))
+    return OpenAI(base_url="http://testserver/v1", api_key="local", http_client=http, max_retries=0), http
+
+
+def test_parse_latency_specs():
+    rng = random.Random(0)
+    assert parse_latency("fixed:25")(rng) == 25
+    assert all(10 <= parse_latency("uniform:10:20")(rng) <= 20 for _ in range(50))
+    samples = sorted(parse_latency("lognormal:100:0.5")(rng) for _ in range(2001))
+    assert 80 < samples[1000] < 125
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+@pytest.mark.parametrize("schema", [QueryType, SubQueries, GroundingCheck, Revisions])
+def test_sampled_replies_validate(schema):
+    value = sample_schema(strict_schema(schema), random.Random(0))
+    schema.model_validate(value)
+
+
+def test_structured_and_streamed_chat_through_the_sdk():
+    client, _ = _client()
+    step = {QueryType: "classify", SubQueries: "decompose", GroundingCheck: "grounding", Revisions: "revise"}
+    for schema, name in step.items():
+        assert isinstance(structured_completion(client, "m", [{"role": "user", "content": "q"}], schema, step=name), schema)
+
+    deltas = []
+    text, usage = stream_completion(client, "m", [{"role": "user", "content": "q"}], deltas.append,
+                                    max_completion_tokens=40)
+    assert text == "".join(deltas) and "[Source" in text
+    assert usage.completion_tokens > 0
+
+
+def test_embeddings_match_dimension_and_are_deterministic():
+    client, _ = _client()
+    first = client.embeddings.create(model="e", input=["a", "b"])
+    second = client.embeddings.create(model="e", input=["a"], dimensions=16)
+    assert [len(d.embedding) for d in first.data] == [8, 8]
+    assert len(second.data[0].embedding) == 16
+    again = client.embeddings.create(model="e", input=["a"])
+    assert again.data[0].embedding == first.data[0].embedding
+
+
+def test_error_and_rate_limit_injection():
+    client, http = _client(rate_limit_rate=1.0)
+    with pytest.raises(openai.RateLimitError):
+        client.chat.completions.create(model="m", messages=[{"role": "user", "content": "q"}])
+
+    client, http = _client(error_rate=1.0)
+    with pytest.raises(openai.InternalServerError):
+        client.embeddings.create(model="e", input=["a"])
+    stats = http.get("/stats").json()
+    assert stats["embeddings.500"] == 1 and stats["in_flight"] == 0
@@ -0,0 +1,119 @@
+import json
+import time
+import pytest
+from src.api import jobs
+
+
+def _fake_search(queries, top_k=5, use_reranker=True, filters=None):
+    return [[{"text": f"result for {q}", "score": 1.0}] * top_k for q in queries]
+
+
+def _wait(job_id, user="u1", timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id, user)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_parse_queries():
+    body = '{"query": "send sms", "id": "a"}\n\n"plain string query"\n{"query": "store files"}\n'
+    queries = jobs.parse_queries(body)
+    assert [q["query"] for q in queries] == ["send sms", "plain string query", "store files"]
+    assert queries[0]["id"] == "a"
+    assert queries[2]["id"] == 2
+
+
+@pytest.mark.parametrize("body", ["", "{bad json", '{"q": "missing field"}', '{"query": "  "}'])
+def test_parse_queries_rejects_bad_input(body):
+    with pytest.raises(jobs.JobInputError):
+        jobs.parse_queries(body)
+
+
+def test_query_stream_parses_lines_split_across_chunks():
+    stream = jobs.QueryStream()
+    for chunk in [b'{"query": "send', b' sms"}\n"plain"\n', b'\n{"query": "store files"}']:
+        stream.feed(chunk)
+    assert [q["query"] for q in stream.finish()] == ["send sms", "plain", "store files"]
+
+
+def test_query_stream_stops_at_the_limits():
+    stream = jobs.QueryStream(max_queries=2)
+    with pytest.raises(jobs.JobTooLargeError):
+        stream.feed(b'"a"\n"b"\n"c"\n"d"\n')
+    assert len(stream.queries) == 2
+
+    stream = jobs.QueryStream(max_bytes=10)
+    stream.feed(b'"a"\n')
+    with pytest.raises(jobs.JobTooLargeError):
+        stream.feed(b'"abcdefgh"\n')
+
+
+@pytest.mark.parametrize("top_k", [0, -1, jobs.MAX_JOB_TOP_K + 1])
+def test_out_of_range_top_k_is_rejected_before_queueing(top_k):
+    with pytest.raises(jobs.JobInputError):
+        jobs.create_job([{"id": 0, "query": "q"}], "u1", top_k=top_k, search_fn=_fake_search)
+
+
+def test_job_runs_in_batches_and_writes_jsonl(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "JOB_BATCH_SIZE", 4)
+    calls = []
+
+    def search_fn(queries, **kwargs):
+        calls.append(len(queries))
+        return _fake_search(queries, **kwargs)
+
+    queries = jobs.parse_queries("\n".join(json.dumps({"query": f"q{i}"}) for i in range(10)))
+    status = jobs.create_job(queries, "u1", top_k=2, search_fn=search_fn)
+    assert status["total"] == 10
+
+    job = _wait(status["job_id"])
+    assert job["status"] == "completed"
+    assert calls == [4, 4, 2]
+
+    lines = [json.loads(l) for l in open(job["output_path"])]
+    assert [l["query"] for l in lines] == [f"q{i}" for i in range(10)]
+    assert len(lines[0]["results"]) == 2
+
+    progress = jobs.job_status(job)
+    assert progress["processed"] == 10
+    assert progress["progress"] == 1.0
+    assert progress["throughput_qps"] > 0
+
+
+def test_job_is_private_to_its_user(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    status = jobs.create_job([{"id": 0, "query": "q"}], "u1", search_fn=_fake_search)
+    _wait(status["job_id"])
+    assert jobs.get_job(status["job_id"], "someone-else") is None
+
+
+def test_failed_job_reports_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+
+    def broken(queries, **kwargs):
+        raise RuntimeError("index unavailable")
+
+    status = jobs.create_job([{"id": 0, "query": "q"}], "u1", search_fn=broken)
+    job = _wait(status["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "index unavailable"
+
+
+def test_finished_jobs_expire_with_their_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "jobs", {})
+    status = jobs.create_job([{"id": 0, "query": "q"}], "u1", search_fn=_fake_search)
+    job = _wait(status["job_id"])
+    orphan = tmp_path / "from-an-earlier-run.jsonl"
+    orphan.write_text("{}\n")
+
+    assert jobs.sweep_jobs(ttl=60, now=job["finished_at"] + 30) == 0
+    assert jobs.get_job(job["id"], "u1") is job
+
+    assert jobs.sweep_jobs(ttl=60, now=job["finished_at"] + 3600) == 1
+    assert jobs.get_job(job["id"], "u1") is None
+    assert list(tmp_path.iterdir()) == []
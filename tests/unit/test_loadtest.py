@@ -0,0 +1,76 @@
+import asyncio
+import random
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from src.evaluation.loadtest import arrival_times, latency_growth, parse_mix, run_load, summarize
+
+
+def test_parse_mix():
+    assert parse_mix("search=8,ask=1,agent") == {"search": 8.0, "ask": 1.0, "agent": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("search=1,upload=2")
+
+
+def test_arrival_times():
+    rng = random.Random(0)
+    assert arrival_times(4, 1, rng, "uniform") == [0, 0.25, 0.5, 0.75]
+    poisson = arrival_times(200, 5, rng)
+    assert 900 < len(poisson) < 1100 and poisson == sorted(poisson) and poisson[-1] < 5
+
+
+def test_summarize_and_latency_growth():
+    records = (
+        [{"endpoint": "search", "status": 200, "latency_ms": 10.0, "offset_s": i} for i in range(8)]
+        + [{"endpoint": "ask", "status": 429, "latency_ms": 5.0, "offset_s": 1}]
+        + [{"endpoint": "ask", "status": "timeout", "latency_ms": 100.0, "offset_s": 2}]
+    )
+    report = summarize(records, wall_seconds=2.0, dropped=1)
+    assert report["all"]["sent"] == 10 and report["all"]["errors"] == 2
+    assert report["endpoints"]["search"]["throughput_rps"] == 4.0
+    assert report["endpoints"]["search"]["latency_ms"]["p50"] == 10.0
+    assert report["endpoints"]["ask"]["status_counts"] == {"429": 1, "timeout": 1}
+    assert report["endpoints"]["ask"]["error_rate"] == 1.0
+
+    growing = [{"endpoint": "search", "status": 200, "latency_ms": 10.0 * (i + 1), "offset_s": i} for i in range(8)]
+    assert latency_growth(growing) == 7.5 / 1.5
+    assert latency_growth(records) == 1.0
+
+
+def _app():
+    app = FastAPI()
+    calls = {"n": 0}
+
+    @app.post("/token")
+    def token(body: dict):
+        return {"access_token": "t"}
+
+    @app.post("/search")
+    def search(body: dict):
+        return {"results": []}
+
+    @app.post("/ask")
+    def ask(body: dict):
+        calls["n"] += 1
+        if calls["n"] % 2:
+            raise HTTPException(status_code=503)
+        return {"answer": "a"}
+
+    return app
+
+
+def test_run_load_against_an_in_process_app():
+    async def run():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await run_load("http://test", [20, 40], 0.5, {"search": 1, "ask": 1},
+                                  queries=["q1", "q2"], arrivals="uniform", client=client)
+
+    report = asyncio.run(run())
+    first, second = report["stages"]
+    assert first["all"]["sent"] == 10 and second["all"]["sent"] == 20
+    assert set(first["endpoints"]) == {"search", "ask"}
+    assert first["endpoints"]["search"]["error_rate"] == 0.0
+    assert first["endpoints"]["ask"]["status_counts"].get("503", 0) > 0
+    # Failing /ask calls push every stage past the error budget
+    assert report["max_sustained_rps"] == 0 and not first["sustained"]
@@ -38,9 +38,16 @@ def test_log_and_get_metrics(tmp_path):
             "generate_tokens": 200,
             "verify_model": "gpt-5.2-chat-latest",
             "verify_ms": 1000,
+            "model_tier": "full",
+            "model_reason": "type=COMPARE",
+            "escalations": 0,
         })
         metrics = get_metrics()
         assert metrics["summary"]["total_queries"] == 1
+        assert metrics["classifier"] == {"local_runs": 0, "llm_runs": 1, "skip_rate": 0}
+        assert metrics["tier_stats"] == [
+            {"model_tier": "full", "runs": 1, "avg_latency_ms": 5000, "avg_grounding": 0.8, "escalated_runs": 0}
+        ]
         assert metrics["summary"]["avg_grounding"] == 0.8
         assert len(metrics["recent_runs"]) == 1
         assert metrics["recent_runs"][0]["query"] == "test query"
@@ -53,3 +60,72 @@ def test_get_metrics_empty(tmp_path):
         init_db()
         metrics = get_metrics()
         assert metrics["summary"]["total_queries"] == 0
+
+
+def test_init_db_adds_new_columns_to_existing_table(tmp_path):
+    db_path = str(tmp_path / "old_metrics.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE agent_runs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, query TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    with patch("src.metrics_db.DB_PATH", db_path):
+        from src.metrics_db import init_db
+        init_db()
+        init_db()
+        conn = sqlite3.connect(db_path)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(agent_runs)")}
+        conn.close()
+    assert {"model_tier", "model_reason", "escalations"} <= columns
+
+
+def test_memo_hits_and_query_log(tmp_path):
+    db_path = str(tmp_path / "test_metrics.db")
+    with patch("src.metrics_db.DB_PATH", db_path):
+        from src.metrics_db import init_db, log_agent_run, get_metrics
+        init_db()
+        log_agent_run({"query": "q", "classify_model": "memo:gpt-5-nano", "decompose_model": "memo:gpt-5-nano"})
+        log_agent_run({"query": "q", "classify_model": "local-classifier", "decompose_model": "gpt-5-nano"})
+        assert get_metrics()["memo"] == {"classify_hits": 1, "decompose_hits": 1, "llm_calls_saved": 2}
+
+
+def test_query_counter_batches_normalized_queries(tmp_path):
+    db_path = str(tmp_path / "test_metrics.db")
+    with patch("src.metrics_db.DB_PATH", db_path):
+        from src.metrics_db import QueryCounter, init_db, query_frequencies
+        init_db()
+        counter = QueryCounter(interval=3600)
+        for query in ["Stripe ", "stripe", "google  cloud storage", "Google Cloud Storage", "  "]:
+            counter.record(query)
+        # Nothing reaches SQLite until the background flush
+        assert query_frequencies() == {}
+        counter.flush()
+        counter.record("stripe")
+        counter.flush()
+        assert query_frequencies() == {"stripe": 3, "google cloud storage": 2}
+
+
+def test_query_log_is_folded_into_counts_and_pruned(tmp_path):
+    db_path = str(tmp_path / "old_metrics.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE query_log (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                  "endpoint TEXT NOT NULL, query TEXT NOT NULL)")
+    conn.executemany("INSERT INTO query_log (timestamp, endpoint, query) VALUES (?, ?, ?)", [
+        ("2026-01-01T00:00:00", "/search", "Stripe  refunds"),
+        ("2026-01-02T00:00:00", "/ask", "stripe refunds"),
+        ("2020-01-01T00:00:00", "/search", "twilio"),
+    ])
+    conn.commit()
+    conn.close()
+    with patch("src.metrics_db.DB_PATH", db_path):
+        from src.metrics_db import add_query_counts, init_db, prune_query_counts, query_frequencies
+        init_db()
+        assert query_frequencies() == {"stripe refunds": 2, "twilio": 1}
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name='query_log'").fetchone() is None
+        conn.close()
+
+        add_query_counts({"sendgrid": 1})
+        prune_query_counts(max_age_days=365 * 3)
+        assert query_frequencies() == {"stripe refunds": 2, "sendgrid": 1}
+        prune_query_counts(max_age_days=365 * 3, max_rows=1)
+        assert query_frequencies() == {"stripe refunds": 2}
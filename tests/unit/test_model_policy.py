@@ -0,0 +1,74 @@
+import pytest
+from src.llm import model_policy
+from src.llm.model_policy import select_model, escalate, FAST_MODEL, MID_MODEL, MODEL
+
+
+@pytest.mark.parametrize("query_type, tier", [
+    ("SIMPLE", "fast"),
+    ("EXPLORE", "mid"),
+    ("COMPARE", "full"),
+    (None, "full"),
+])
+def test_query_type_picks_starting_tier(query_type, tier):
+    decision = select_model(query_type, context_tokens=200)
+    assert decision["tier"] == tier
+    assert decision["model"] == model_policy.TIER_MODELS[tier]
+    assert decision["escalations"] == 0
+
+
+def test_large_context_needs_at_least_mid():
+    decision = select_model("SIMPLE", context_tokens=model_policy.LARGE_CONTEXT_TOKENS + 1)
+    assert decision["model"] == MID_MODEL
+    assert "context" in decision["reason"]
+    # Already above mid: unchanged
+    assert select_model("COMPARE", context_tokens=10_000)["model"] == MODEL
+
+
+def test_latency_slo_caps_tier():
+    assert select_model("COMPARE", latency_slo_ms=1500)["model"] == FAST_MODEL
+    assert select_model("COMPARE", latency_slo_ms=4000)["model"] == MID_MODEL
+    assert select_model("COMPARE", latency_slo_ms=60000)["model"] == MODEL
+    decision = select_model("SIMPLE", latency_slo_ms=4000)
+    assert decision["model"] == FAST_MODEL
+    assert "slo" not in decision["reason"]
+
+
+def test_escalation_moves_up_one_tier_within_budget(monkeypatch):
+    monkeypatch.setattr(model_policy, "MAX_ESCALATIONS", 2)
+    decision = select_model("SIMPLE")
+
+    assert escalate(decision, grounding_score=0.9) is None
+
+    up = escalate(decision, grounding_score=0.1)
+    assert up["tier"] == "mid" and up["escalations"] == 1
+    assert "escalated" in up["reason"]
+
+    top = escalate(up, grounding_score=0.1)
+    assert top["tier"] == "full"
+    assert escalate(top, grounding_score=0.0) is None
+
+
+def test_escalation_budget(monkeypatch):
+    monkeypatch.setattr(model_policy, "MAX_ESCALATIONS", 1)
+    up = escalate(select_model("SIMPLE"), grounding_score=0.0)
+    assert escalate(up, grounding_score=0.0) is None
+
+
+def test_escalation_respects_the_slo_cap(monkeypatch):
+    monkeypatch.setattr(model_policy, "MAX_ESCALATIONS", 2)
+    capped = select_model("COMPARE", latency_slo_ms=1500)
+    assert capped["tier"] == "fast" and capped["max_tier"] == "fast"
+    assert escalate(capped, grounding_score=0.1) is None
+
+    # Below the cap there is room to climb, but only up to it
+    up = escalate(select_model("SIMPLE", latency_slo_ms=4000), grounding_score=0.1)
+    assert up["tier"] == "mid"
+    assert escalate(up, grounding_score=0.1) is None
+
+
+def test_unclassified_queries_keep_the_full_model():
+    decision = select_model(context_tokens=200)
+    assert decision["model"] == MODEL
+    # Already on the top tier: a weak grounding score does not trigger a second pass
+    assert escalate(decision, grounding_score=0.0) is None
+    assert select_model(latency_slo_ms=4000)["model"] == MID_MODEL
@@ -0,0 +1,74 @@
+import json
+import struct
+import numpy as np
+import pytest
+from src.search.pgvector_store import (
+    COPY_HEADER, check_identifier, column_type, copy_buffer, filter_clause, index_sql, parse_version,
+)
+
+
+def test_filter_clause_matches_filter_semantics():
+    where, params = filter_clause({"type": "endpoint", "api_name": ["Stripe", "Twilio"]})
+    assert where == ("(doc->'metadata' @> %s::jsonb OR doc->'metadata' @> %s::jsonb) "
+                     "AND (doc->'metadata' @> %s::jsonb)")
+    assert [json.loads(p) for p in params] == [{"api_name": "Stripe"}, {"api_name": "Twilio"}, {"type": "endpoint"}]
+
+
+def test_filter_clause_empty():
+    assert filter_clause(None) == ("TRUE", [])
+    assert filter_clause({"api_name": []}) == ("FALSE", [])
+
+
+def test_column_type_switches_to_halfvec_above_index_limit():
+    assert column_type(1536) == ("vector", "vector_cosine_ops")
+    assert column_type(3072) == ("halfvec", "halfvec_cosine_ops")
+
+
+def test_index_sql():
+    assert "USING hnsw (embedding vector_cosine_ops)" in index_sql("chunks", "hnsw", "vector_cosine_ops", 100)
+    assert "lists = 10" in index_sql("chunks", "ivfflat", "vector_cosine_ops", 100)
+    with pytest.raises(ValueError):
+        index_sql("chunks", "flat", "vector_cosine_ops", 100)
+
+
+def test_check_identifier():
+    assert check_identifier("api_chunks") == "api_chunks"
+    with pytest.raises(ValueError):
+        check_identifier("chunks; DROP TABLE users")
+
+
+def test_parse_version():
+    assert parse_version("0.8.0") == (0, 8)
+    assert parse_version("0.7.4") < (0, 8)
+
+
+def _read_rows(data):
+    assert data.startswith(COPY_HEADER)
+    pos, rows = len(COPY_HEADER), []
+    while True:
+        (fields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if fields == -1:
+            return rows
+        row = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from(">i", data, pos)
+            row.append(data[pos + 4:pos + 4 + length])
+            pos += 4 + length
+        rows.append(row)
+
+
+@pytest.mark.parametrize("column,dtype", [("vector", ">f4"), ("halfvec", ">f2")])
+def test_copy_buffer_binary_rows(column, dtype):
+    vectors = np.array([[0.6, 0.8, 0.0], [0.0, 0.0, 1.0]], dtype="float32")
+    docs = [{"text": "a", "metadata": {"api_name": "A"}}, {"text": "b, \"quoted\"", "metadata": {}}]
+
+    rows = _read_rows(copy_buffer(docs, vectors, 10, column).getvalue())
+
+    assert len(rows) == 2
+    assert struct.unpack(">q", rows[1][0])[0] == 11
+    assert rows[1][1][:1] == b"\x01"
+    assert json.loads(rows[1][1][1:]) == docs[1]
+    dimension, _ = struct.unpack_from(">HH", rows[0][2])
+    assert dimension == 3
+    np.testing.assert_allclose(np.frombuffer(rows[0][2][4:], dtype=dtype), vectors[0], atol=1e-3)
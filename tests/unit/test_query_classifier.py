@@ -0,0 +1,70 @@
+import sqlite3
+import pytest
+from unittest.mock import patch
+from src.agents import query_classifier
+from src.agents.query_classifier import (
+    QueryClassifier, features, train, evaluate, load_training_rows, FEATURE_NAMES, MIN_CONFIDENCE,
+)
+
+
+def test_features_align_with_names():
+    vec = features("Compare Twilio vs Vonage, and which is cheapest?")
+    assert len(vec) == len(FEATURE_NAMES)
+    named = dict(zip(FEATURE_NAMES, vec))
+    assert named["compare_word"] == 1.0
+    assert named["superlative"] == 1.0
+    assert named["how_to"] == 0.0
+
+
+@pytest.mark.parametrize("query, label", [
+    ("How do I authenticate with the Authentiq API?", "SIMPLE"),
+    ("Compare Twilio vs Vonage for international SMS", "COMPARE"),
+    ("What APIs are available for weather data?", "EXPLORE"),
+])
+def test_default_model_is_confident_on_clear_queries(query, label):
+    predicted, confidence = QueryClassifier.default().classify(query)
+    assert predicted == label
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_ambiguous_query_falls_back_to_llm():
+    _, confidence = QueryClassifier.default().classify("Which REST APIs support GraphQL subscriptions natively?")
+    assert confidence < MIN_CONFIDENCE
+
+
+def test_training_fits_logged_labels_and_round_trips(tmp_path):
+    # Logged runs where "options for X" queries were labeled COMPARE, unlike the default weights
+    queries = [f"options for {topic}" for topic in ("sms", "email", "maps", "payments", "storage")] * 4
+    queries += [f"how do I call the {name} api" for name in ("stripe", "twilio", "github", "slack")] * 4
+    labels = ["COMPARE"] * 20 + ["SIMPLE"] * 16
+
+    before = evaluate(QueryClassifier.default(), queries, labels)
+    model = train(queries, labels)
+    after = evaluate(model, queries, labels)
+    assert after["accuracy"] == 1.0 > before["accuracy"]
+    assert 0 < after["skip_rate"] <= 1
+
+    path = str(tmp_path / "classifier.json")
+    model.save(path)
+    loaded = QueryClassifier.load(path)
+    assert loaded.classify("options for sms") == model.classify("options for sms")
+
+
+def test_load_training_rows_skips_locally_labeled_runs(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    with patch("src.metrics_db.DB_PATH", db_path):
+        from src.metrics_db import init_db, log_agent_run
+        init_db()
+        log_agent_run({"query": "compare a and b", "query_type": "COMPARE", "classify_model": "gpt-5-nano"})
+        log_agent_run({"query": "how to x", "query_type": "SIMPLE", "classify_model": "local-classifier"})
+        log_agent_run({"query": "junk", "query_type": "", "classify_model": "gpt-5-nano"})
+        assert load_training_rows() == [("compare a and b", "COMPARE")]
+
+
+def test_get_classifier_ignores_stale_model(tmp_path, monkeypatch):
+    path = tmp_path / "classifier.json"
+    path.write_text('{"labels": ["SIMPLE"], "features": ["old"], "weights": [[1]], "bias": [0]}')
+    monkeypatch.setattr(query_classifier, "MODEL_PATH", str(path))
+    monkeypatch.setattr(query_classifier, "_classifier", None)
+    model = query_classifier.get_classifier()
+    assert model.weights.shape == (3, len(FEATURE_NAMES))
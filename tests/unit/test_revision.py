@@ -0,0 +1,97 @@
+import numpy as np
+from src.agents.revision import SENTENCE_METHOD, apply_revisions, revisable_claims
+from src.llm.structured import Revision, summarize_claims
+from src.search.claim_verifier import ClaimCache, ClaimVerifier
+
+TOPICS = ["sms", "login", "payments"]
+
+SOURCES = [
+    {"text": "Twilio sends sms messages worldwide via POST /Messages"},
+    {"text": "Authentiq provides passwordless login with push sign-in"},
+]
+
+ANSWER = (
+    "Twilio sends sms messages worldwide [Source 1]. "
+    "Authentiq also settles card payments in every currency [Source 2]."
+)
+
+
+def topic_vectors(texts):
+    """One orthogonal axis per topic word (plus one for none), so a claim supports only its topic."""
+    vectors = np.zeros((len(texts), len(TOPICS) + 1), dtype="float32")
+    for row, text in enumerate(texts):
+        hits = [i for i, t in enumerate(TOPICS) if t in text.lower()]
+        vectors[row, hits[0] if hits else len(TOPICS)] = 1.0
+    return vectors
+
+
+def verifier():
+    return ClaimVerifier(SOURCES, topic_vectors([s["text"] for s in SOURCES]), topic_vectors, cache=ClaimCache())
+
+
+def grounding(claims, method):
+    """The agent's verify output for claims."""
+    summary = summarize_claims(claims)
+    return {"score": summary["grounding_score"], "claims": claims, "method": method}
+
+
+def test_incremental_verdicts_are_revised_in_place():
+    v = verifier()
+    v.add_text(ANSWER)
+    first = grounding(v.finish()["claims"], SENTENCE_METHOD)
+    assert first["score"] == 0.5
+
+    unsupported = revisable_claims(first)
+    assert unsupported == ["Authentiq also settles card payments in every currency ."]
+    revision = Revision(claim=unsupported[0], revised="Authentiq offers passwordless login [Source 2].")
+    answer, revised, kept = apply_revisions(ANSWER, first, [revision])
+    assert answer == "Twilio sends sms messages worldwide [Source 1]. Authentiq offers passwordless login [Source 2]."
+    assert [c["claim"] for c in kept] == ["Twilio sends sms messages worldwide ."]
+
+    # Only the rewritten sentence is verified again
+    v = verifier()
+    for sentence in revised:
+        v.add_claim(sentence)
+    second = grounding(kept + v.finish()["claims"], SENTENCE_METHOD)
+    assert second["score"] == 1.0 and len(second["claims"]) == 2
+
+
+def test_llm_verdicts_are_revised_through_their_answer_sentence():
+    # The LLM check restates claims, and quotes the sentence each one comes from
+    claims = [
+        {"claim": "Twilio can send SMS", "status": "SUPPORTED", "source": "Source 1",
+         "answer_sentence": "Twilio sends sms messages worldwide [Source 1]."},
+        {"claim": "Authentiq processes payments", "status": "UNSUPPORTED", "source": None,
+         "answer_sentence": "Authentiq also settles card payments in every currency [Source 2]."},
+        {"claim": "It supports every currency", "status": "UNSUPPORTED", "source": None,
+         "answer_sentence": "Authentiq also settles card payments in every currency [Source 2]."},
+    ]
+    first = grounding(claims, "llm")
+    unsupported = revisable_claims(first)
+    assert unsupported == ["Authentiq also settles card payments in every currency ."]
+
+    # The reviser echoes the listed sentence, which replace_claims finds in the answer
+    revision = Revision(claim=unsupported[0], revised="Authentiq offers passwordless login [Source 2].")
+    answer, revised, kept = apply_revisions(ANSWER, first, [revision])
+    assert answer.endswith("Authentiq offers passwordless login [Source 2].")
+    assert kept == claims[:1]
+
+    checked = []
+
+    def check_grounding(text, sources):
+        checked.append(text)
+        return summarize_claims([{"claim": "Authentiq offers login", "status": "SUPPORTED", "source": "Source 2",
+                                  "answer_sentence": text}])
+
+    # Only the rewritten sentence goes back to the LLM check
+    second = grounding(kept + check_grounding(" ".join(revised), SOURCES)["claims"], "llm")
+    assert checked == ["Authentiq offers passwordless login [Source 2]."]
+    assert second["score"] == 1.0
+
+
+def test_verdicts_without_a_sentence_fall_back_to_full_regeneration():
+    claims = [{"claim": "Authentiq processes payments", "status": "UNSUPPORTED", "source": None}]
+    assert revisable_claims(grounding(claims, "llm")) == []
+
+    revision = Revision(claim="Authentiq processes payments", revised="Authentiq offers passwordless login.")
+    assert apply_revisions(ANSWER, grounding(claims, "llm"), [revision]) is None
@@ -0,0 +1,73 @@
+import time
+from src.search.cache import ResultCache, make_key, normalize_query, estimate_size
+
+
+RESULTS = [{"text": "POST /messages send sms", "metadata": {"api_name": "Twilio"}, "score": 0.9}]
+
+
+def test_normalize_query():
+    assert normalize_query("  Send   SMS\tAPI ") == "send sms api"
+
+
+def test_make_key_covers_all_inputs():
+    base = make_key("send sms", 5, True, None, "v1")
+    assert make_key("SEND  sms", 5, True, None, "v1") == base
+    assert make_key("send sms", 3, True, None, "v1") != base
+    assert make_key("send sms", 5, False, None, "v1") != base
+    assert make_key("send sms", 5, True, {"type": "endpoint"}, "v1") != base
+    assert make_key("send sms", 5, True, None, "v2") != base
+    assert make_key("q", 5, True, {"a": 1, "b": 2}, "v") == make_key("q", 5, True, {"b": 2, "a": 1}, "v")
+    assert make_key("send sms", 5, True, None, "v1", {"diversity": "mmr"}) != base
+    assert make_key("send sms", 5, True, None, "v1", {}) == base
+
+
+def test_get_put_hit_and_miss():
+    cache = ResultCache()
+    key = make_key("send sms", 5, True, None, "v1")
+    assert cache.get(key)[2] == "miss"
+    cache.put(key, RESULTS)
+    results, age, state = cache.get(key)
+    assert state == "fresh"
+    assert results == RESULTS
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_size_aware_eviction():
+    size = estimate_size(RESULTS)
+    cache = ResultCache(max_bytes=size * 2)
+    for i in range(3):
+        cache.put(("k", i), RESULTS)
+    assert cache.get_stats()["entries"] == 2
+    assert cache.bytes <= size * 2
+    assert cache.get(("k", 0))[2] == "miss"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_recently_used_entry_survives_eviction():
+    size = estimate_size(RESULTS)
+    cache = ResultCache(max_bytes=size * 2)
+    cache.put("a", RESULTS)
+    cache.put("b", RESULTS)
+    cache.get("a")
+    cache.put("c", RESULTS)
+    assert cache.get("a")[2] == "fresh"
+    assert cache.get("b")[2] == "miss"
+
+
+def test_stale_while_revalidate_window():
+    cache = ResultCache(ttl=0.01, stale_ttl=60)
+    cache.put("k", RESULTS)
+    time.sleep(0.02)
+    assert cache.get("k")[2] == "stale"
+    assert cache.claim_refresh("k")
+    assert not cache.claim_refresh("k")
+    cache.release_refresh("k")
+    assert cache.claim_refresh("k")
+
+
+def test_expired_entry_is_dropped():
+    cache = ResultCache(ttl=0.01, stale_ttl=0)
+    cache.put("k", RESULTS)
+    time.sleep(0.02)
+    assert cache.get("k")[2] == "miss"
+    assert cache.bytes == 0
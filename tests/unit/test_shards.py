@@ -0,0 +1,98 @@
+import json
+import time
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+from src.search.vector_store import make_index
+from src.search import shards
+from src.search.shards import (
+    ShardedStore, collect_missing_shards, decode_array, encode_array, parse_nodes, shard_of,
+)
+
+
+def _transport(root, slow=(), down=()):
+    """Route http://shard-N/... to an in-process shard app; hosts in down answer 503."""
+    from src.search.shard_server import create_app
+
+    clients = {}
+
+    def handler(request):
+        host = request.url.host
+        if host in down:
+            return httpx.Response(503)
+        if host in slow:
+            time.sleep(0.5)
+        if host not in clients:
+            clients[host] = TestClient(create_app(shards.shard_dir(int(host.split("-")[1]), root)))
+        response = clients[host].request(request.method, request.url.path, content=request.content,
+                                         headers={"content-type": "application/json"})
+        return httpx.Response(response.status_code, content=response.content, headers=response.headers)
+
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def test_shard_of_is_stable():
+    assert shard_of("stripe.json", 4) == shard_of("stripe.json", 4)
+    assert {shard_of(f"spec-{i}.json", 4) for i in range(50)} == {0, 1, 2, 3}
+
+
+def test_parse_nodes_and_array_encoding():
+    assert parse_nodes("http://a:1/, http://b:1;http://a:2;") == [["http://a:1", "http://b:1"], ["http://a:2"]]
+    array = np.arange(6, dtype="float32").reshape(2, 3)
+    np.testing.assert_array_equal(decode_array(encode_array(array)), array)
+
+
+def test_build_shards_partitions_by_source_file(shard_build):
+    root, embeddings, chunks, num_shards = shard_build
+    seen = []
+    for shard in range(num_shards):
+        ids = np.load(f"{shards.shard_dir(shard, root)}/ids.npy").tolist()
+        with open(f"{shards.shard_dir(shard, root)}/metadata.json") as f:
+            metadata = json.load(f)
+        assert len(ids) == len(metadata)
+        assert all(shard_of(m["metadata"]["source_file"], num_shards) == shard for m in metadata)
+        seen += ids
+    assert sorted(seen) == list(range(len(chunks)))
+
+
+def test_scatter_gather_matches_single_index(shard_build):
+    root, embeddings, _, num_shards = shard_build
+    store = ShardedStore(nodes=";".join(f"http://shard-{i}" for i in range(num_shards)),
+                         timeout_ms=2000, client=_transport(root))
+    assert store.count == 60 and store.dimension == 16
+
+    _, expected = make_index(embeddings, "flat").search(embeddings[:4], 10)
+    batch = store.search(embeddings[:4], 10)
+    assert [[r["id"] for r in row] for row in batch] == expected.tolist()
+    assert batch[0][0]["text"] == "chunk 0"
+
+    filtered = store.search(embeddings[:2], 5, filters={"type": "endpoint"})
+    assert all(len(row) == 5 and all(r["metadata"]["type"] == "endpoint" for r in row) for row in filtered)
+
+    stored = store.reconstruct([3, 41])
+    np.testing.assert_allclose(stored[41], embeddings[41], atol=1e-6)
+
+
+def test_replica_failover(shard_build):
+    root, embeddings, _, num_shards = shard_build
+    nodes = ";".join(f"http://down-{i},http://shard-{i}" for i in range(num_shards))
+    down = {f"down-{i}" for i in range(num_shards)}
+    store = ShardedStore(nodes=nodes, timeout_ms=2000, client=_transport(root, down=down))
+    for _ in range(3):
+        assert len(store.search(embeddings[:1], 10)[0]) == 10
+
+
+def test_slow_shard_gives_partial_results(shard_build):
+    root, embeddings, _, num_shards = shard_build
+    nodes = ";".join(f"http://shard-{i}" for i in range(num_shards))
+    store = ShardedStore(nodes=nodes, timeout_ms=2000, client=_transport(root, slow={"shard-1"}))
+    store.timeout = 0.2
+
+    with collect_missing_shards() as missing:
+        start = time.perf_counter()
+        results = store.search(embeddings[:1], 10)[0]
+        elapsed = time.perf_counter() - start
+    assert missing == [1]
+    assert elapsed < 0.45
+    assert results
+    assert all(shard_of(r["metadata"]["source_file"], num_shards) != 1 for r in results)
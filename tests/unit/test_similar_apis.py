@@ -0,0 +1,101 @@
+import json
+import numpy as np
+from src.search.similar_apis import SimilarAPIs, build_similar_apis, generic_names, name_key, neighbour_graph
+
+
+def _chunk(name, kind="endpoint"):
+    return {"text": f"{name} {kind}", "metadata": {"api_name": name, "type": kind}}
+
+
+def _build(tmp_path, k=2, weather_alerts=False):
+    # Stripe and PayPal point the same way, Twilio and SendGrid another, Weather a third
+    metadata = [
+        _chunk("Stripe API", "overview"), _chunk("Stripe API"),
+        _chunk("PayPal REST API", "overview"),
+        _chunk("Twilio", "overview"),
+        _chunk("SendGrid"), _chunk("SendGrid"),
+        _chunk("Weather API", "overview"),
+    ]
+    if weather_alerts:
+        # Another API's chunk uses the word, so "Weather" names a topic rather than an API
+        metadata[4]["text"] = "SendGrid emails severe weather alerts"
+    embeddings = np.array([
+        [1.0, 0.0, 0.0], [0.0, 0.0, 1.0],
+        [0.9, 0.1, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.1, 0.9, 0.0], [0.0, 1.0, 0.1],
+        [0.2, 0.2, 1.0],
+    ], dtype="float32")
+    metadata_path = tmp_path / "metadata.json"
+    metadata_path.write_text(json.dumps(metadata))
+    embeddings_path = tmp_path / "embeddings.npy"
+    np.save(embeddings_path, embeddings)
+    path = str(tmp_path / "similar_apis.npz")
+    build_similar_apis(k=k, path=path, metadata_path=str(metadata_path), embeddings_path=str(embeddings_path))
+    return SimilarAPIs(path)
+
+
+def test_name_key_drops_generic_words():
+    assert name_key("PayPal REST API v2") == "paypal"
+    assert name_key("The Weather-API") == "weather"
+
+
+def test_neighbour_graph_excludes_self_and_pads_short_rows():
+    vectors = np.eye(2, dtype="float32")
+    neighbours, scores = neighbour_graph(vectors, k=3)
+    assert neighbours.dtype == np.int32 and scores.dtype == np.float16
+    assert neighbours.tolist() == [[1, -1, -1], [0, -1, -1]]
+
+
+def test_similar_uses_overview_vectors(tmp_path):
+    graph = _build(tmp_path)
+    # Stripe's endpoint chunk points at Weather, but its overview decides
+    assert graph.similar("Stripe API", 1)[0]["api_name"] == "PayPal REST API"
+    # SendGrid has no overview, so its chunk centroid is used
+    assert graph.similar("twilio", 1)[0]["api_name"] == "SendGrid"
+    assert len(graph.similar("Stripe API", 10)) == 2
+    assert graph.similar("Unknown", 5) is None
+
+
+def test_lookup_and_mentioned_apis(tmp_path):
+    graph = _build(tmp_path)
+    assert graph.lookup("paypal") == "PayPal REST API"
+    assert graph.lookup("nope") is None
+    assert graph.mentioned_apis("Compare Stripe vs the PayPal API for refunds") == ["Stripe API", "PayPal REST API"]
+    assert graph.mentioned_apis("which api is best") == []
+
+
+def test_generic_one_word_names_are_not_matched_in_free_text(tmp_path):
+    graph = _build(tmp_path, weather_alerts=True)
+    assert graph.mentioned_apis("Compare Stripe and Weather API for alerts") == ["Stripe API"]
+    assert graph.mentioned_apis("compare weather apis") == []
+    # Explicit lookups still resolve it
+    assert graph.lookup("weather") == "Weather API"
+
+
+def test_generic_names_use_the_share_of_other_apis():
+    names = ["Weather API", "Open Meteo", "Stripe API"]
+    metadata = [
+        {"text": "Weather API current weather", "metadata": {"api_name": "Weather API"}},
+        {"text": "Open Meteo hourly weather forecasts", "metadata": {"api_name": "Open Meteo"}},
+        {"text": "Stripe charges cards", "metadata": {"api_name": "Stripe API"}},
+    ]
+    assert generic_names(metadata, names).tolist() == [True, False, False]
+    assert generic_names(metadata, names, max_share=0.5).tolist() == [False, False, False]
+
+
+def test_missing_graph_is_empty(tmp_path):
+    graph = SimilarAPIs(str(tmp_path / "absent.npz"))
+    assert graph.similar("Stripe", 5) is None
+    assert graph.mentioned_apis("Stripe") == []
+
+
+def test_api_vectors_follow_shared_embedding_rows():
+    from src.search.similar_apis import api_vectors
+
+    metadata = [_chunk("Stripe API", "overview"), _chunk("Stripe API"), _chunk("Twilio"), _chunk("Twilio")]
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]], dtype="float32")
+    # The second Stripe chunk shares the Twilio chunks' row
+    names, vectors = api_vectors(metadata, embeddings, chunk_rows=np.array([0, 1, 1, 1]))
+    assert names == ["Stripe API", "Twilio"]
+    np.testing.assert_allclose(vectors, [[1.0, 0.0], [0.0, 1.0]], atol=1e-6)
@@ -0,0 +1,82 @@
+import pytest
+from types import SimpleNamespace
+from src.llm import structured
+from src.llm.structured import (
+    QueryType, SubQueries, GroundingCheck, StructuredOutputError,
+    strict_schema, structured_completion, grounding_result, parse,
+)
+
+
+class FakeClient:
+    """Mimics client.chat.completions.create, replying with queued contents."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies.pop(0)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+
+def test_strict_schema_requires_every_property_and_forbids_extras():
+    schema = strict_schema(GroundingCheck)
+    assert schema["additionalProperties"] is False
+    claim = schema["$defs"]["ClaimCheck"]
+    assert claim["additionalProperties"] is False
+    assert set(claim["required"]) == {"claim", "status", "source", "answer_sentence"}
+    assert "maxItems" not in strict_schema(SubQueries)["properties"]["queries"]
+
+
+def test_structured_completion_sends_schema_and_token_cap():
+    client = FakeClient(['{"type": "COMPARE"}'])
+    result = structured_completion(client, "fast", [{"role": "user", "content": "q"}], QueryType, step="classify")
+    assert result.type == "COMPARE"
+    call = client.calls[0]
+    assert call["response_format"]["type"] == "json_schema"
+    assert call["response_format"]["json_schema"]["strict"] is True
+    assert call["max_completion_tokens"] == structured.STEP_MAX_TOKENS["classify"]
+
+
+def test_invalid_output_is_retried_with_the_error():
+    client = FakeClient(['{"type": "MAYBE"}', '{"type": "EXPLORE"}'])
+    result = structured_completion(client, "fast", [{"role": "user", "content": "q"}], QueryType,
+                                   step="classify", retries=1)
+    assert result.type == "EXPLORE"
+    retry_messages = client.calls[1]["messages"]
+    assert retry_messages[-2] == {"role": "assistant", "content": '{"type": "MAYBE"}'}
+    assert "did not match" in retry_messages[-1]["content"]
+
+
+def test_gives_up_after_retries():
+    client = FakeClient(["not json", '{"queries": []}'])
+    with pytest.raises(StructuredOutputError):
+        structured_completion(client, "fast", [], SubQueries, step="decompose", retries=1)
+    assert len(client.calls) == 2
+
+
+def test_json_object_mode(monkeypatch):
+    monkeypatch.setattr(structured, "STRUCTURED_OUTPUT_MODE", "json_object")
+    client = FakeClient(['```json\n{"queries": ["a", "b"]}\n```'])
+    result = structured_completion(client, "fast", [], SubQueries, step="decompose")
+    assert result.queries == ["a", "b"]
+    assert client.calls[0]["response_format"] == {"type": "json_object"}
+
+
+def test_grounding_score_is_computed_from_claims():
+    check = parse(GroundingCheck, '{"claims": ['
+                  '{"claim": "a", "status": "SUPPORTED", "source": "Source 1"},'
+                  '{"claim": "b", "status": "PARTIAL", "source": "Source 2"},'
+                  '{"claim": "c", "status": "UNSUPPORTED", "source": null},'
+                  '{"claim": "d", "status": "SUPPORTED", "source": "Source 1"}]}')
+    result = grounding_result(check)
+    assert result["supported_count"] == 2
+    assert result["total_count"] == 4
+    assert result["grounding_score"] == 0.625
+    assert result["claims"][2]["source"] is None
+    assert grounding_result(GroundingCheck(claims=[]))["grounding_score"] == 0.0
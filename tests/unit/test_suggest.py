@@ -0,0 +1,110 @@
+import json
+import time
+import numpy as np
+from src.search.suggest import RangeMax, Suggester, build_suggest_index, entry_keys, extract_entries, popularity
+
+
+def _endpoint(name, method, path, tags=()):
+    return {"text": "", "metadata": {"type": "endpoint", "api_name": name, "method": method, "path": path, "tags": list(tags)}}
+
+
+METADATA = [
+    {"text": "", "metadata": {"type": "overview", "api_name": "Stripe API"}},
+    _endpoint("Stripe API", "GET", "/v1/charges", ["Payments"]),
+    _endpoint("Stripe API", "POST", "/v1/charges", ["payments"]),
+    _endpoint("Stripe API", "GET", "/v1/charges", ["Payments"]),
+    {"text": "", "metadata": {"type": "overview", "api_name": "Google Cloud Storage"}},
+    _endpoint("Google Cloud Storage", "GET", "/b/{bucket}/o", ["Objects"]),
+    {"text": "", "metadata": {"type": "overview", "api_name": "Spotify"}},
+]
+
+
+def _suggester(tmp_path, frequencies=None):
+    metadata_path = tmp_path / "metadata.json"
+    metadata_path.write_text(json.dumps(METADATA))
+    path = str(tmp_path / "suggest.json")
+    build_suggest_index(metadata_path=str(metadata_path), path=path)
+    return Suggester(path, frequencies_fn=lambda: frequencies or {}, refresh_seconds=0)
+
+
+def test_extract_entries_dedupes_endpoints_and_tags():
+    entries = extract_entries(METADATA)
+    texts = {(e["kind"], e["text"]) for e in entries}
+    assert texts == {
+        ("api", "Stripe API"), ("api", "Google Cloud Storage"), ("api", "Spotify"),
+        ("endpoint", "GET /v1/charges"), ("endpoint", "POST /v1/charges"), ("endpoint", "GET /b/{bucket}/o"),
+        ("tag", "Payments"), ("tag", "Objects"),
+    }
+    tag = next(e for e in entries if e["text"] == "Payments")
+    assert tag["api_name"] is None and tag["prior"] > 0
+
+
+def test_entry_keys():
+    assert entry_keys({"kind": "api", "text": "Google Cloud Storage"}) == ["google cloud storage", "cloud storage", "storage"]
+    assert entry_keys({"kind": "endpoint", "text": "GET /v1/charges"}) == ["get /v1/charges", "/v1/charges"]
+
+
+def test_range_max_top_matches_sort():
+    rng = np.random.default_rng(0)
+    weights = rng.random(37)
+    ranges = RangeMax(weights)
+    for lo, hi in [(0, 37), (3, 4), (5, 30), (36, 37)]:
+        expected = sorted(range(lo, hi), key=lambda i: -weights[i])
+        assert list(ranges.top(lo, hi)) == expected
+    assert list(RangeMax([]).top(0, 0)) == []
+
+
+def test_suggest_prefix_and_word_matches(tmp_path):
+    suggester = _suggester(tmp_path)
+    assert [s["text"] for s in suggester.suggest("sto")] == ["Google Cloud Storage"]
+    assert [s["text"] for s in suggester.suggest("STRIPE")] == ["Stripe API"]
+    assert {s["text"] for s in suggester.suggest("/v1/ch")} == {"GET /v1/charges", "POST /v1/charges"}
+    assert [s["text"] for s in suggester.suggest("get /v1")] == ["GET /v1/charges"]
+    assert [s["kind"] for s in suggester.suggest("pay")] == ["tag"]
+    assert suggester.suggest("s", kinds=["api"])[0]["kind"] == "api"
+    assert len(suggester.suggest("s", limit=1)) == 1
+    assert suggester.suggest("") == [] and suggester.suggest("zzz") == []
+
+
+def test_query_log_frequencies_rank_completions(tmp_path):
+    cold = _suggester(tmp_path)
+    # Stripe has more endpoints, so it leads without any logged queries
+    assert [s["text"] for s in cold.suggest("s", kinds=["api"])] == ["Stripe API", "Google Cloud Storage", "Spotify"]
+
+    warm = _suggester(tmp_path, {"spotify playlists": 5, "stripe": 1})
+    assert warm.suggest("s", kinds=["api"])[0]["text"] == "Spotify"
+
+
+def test_popularity_passes_api_counts_to_endpoints():
+    entries = extract_entries(METADATA)
+    counts = popularity(entries, {"stripe refunds": 3, "get /v1/charges": 2})
+    by_text = {(e["kind"], e["text"]): c for e, c in zip(entries, counts)}
+    assert by_text[("api", "Stripe API")] == 3
+    assert by_text[("endpoint", "GET /v1/charges")] == 5
+    assert by_text[("endpoint", "GET /b/{bucket}/o")] == 0
+
+
+def test_refresh_reweights_from_query_log(tmp_path):
+    frequencies = {}
+    suggester = _suggester(tmp_path)
+    suggester.frequencies_fn = lambda: frequencies
+    assert suggester.suggest("s", kinds=["api"])[0]["text"] == "Stripe API"
+    frequencies["spotify"] = 10
+    suggester.refresh()
+    assert suggester.suggest("s", kinds=["api"])[0]["text"] == "Spotify"
+
+
+def test_suggest_is_fast_on_a_large_index(tmp_path):
+    metadata = [_endpoint(f"API {i % 500}", "GET", f"/resource{i}/items") for i in range(20000)]
+    metadata_path = tmp_path / "metadata.json"
+    metadata_path.write_text(json.dumps(metadata))
+    path = str(tmp_path / "suggest.json")
+    build_suggest_index(metadata_path=str(metadata_path), path=path)
+    suggester = Suggester(path, frequencies_fn=dict, refresh_seconds=0)
+    suggester.suggest("get")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        results = suggester.suggest("get /res")
+    assert len(results) == 10
+    assert (time.perf_counter() - start) / 100 < 0.005
@@ -0,0 +1,78 @@
+import os
+import time
+from src import timing
+from src.timing import collect_timings, span, maybe_profile, SamplingProfiler
+
+
+def test_spans_are_noops_without_collector():
+    with span("search"):
+        pass
+    assert timing._timings.get() is None
+
+
+def test_nested_spans_build_paths_and_accumulate():
+    with collect_timings() as timings:
+        with span("retrieve"):
+            for _ in range(2):
+                with span("search"):
+                    with span("embed"):
+                        time.sleep(0.001)
+
+    assert set(timings) == {"retrieve", "retrieve/search", "retrieve/search/embed"}
+    assert timings["retrieve/search/embed"] >= 2
+    assert timings["retrieve"] >= timings["retrieve/search"] >= timings["retrieve/search/embed"]
+
+
+def test_profiler_writes_folded_stacks(tmp_path):
+    def busy_leaf():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+
+    profiler = SamplingProfiler(interval=0.001).start()
+    busy_leaf()
+    profiler.stop()
+
+    path = profiler.save("/search", profiles_dir=str(tmp_path))
+    lines = open(path).read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("busy_leaf" in line for line in lines)
+    assert ";" in stack
+
+
+def test_maybe_profile_only_keeps_slow_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(timing, "PROFILES_DIR", str(tmp_path))
+
+    with maybe_profile("/search") as info:
+        pass
+    assert info == {}
+
+    with maybe_profile("/search", slow_ms=10_000) as info:
+        pass
+    assert "profile" not in info
+
+    with maybe_profile("/search", requested=True) as info:
+        time.sleep(0.01)
+    assert info["profile"].startswith(str(tmp_path))
+
+
+def test_profile_header_needs_an_allowed_caller():
+    assert timing.profile_requested("1")
+    assert not timing.profile_requested("1", allowed=False)
+    assert not timing.profile_requested(None)
+
+
+def test_saved_profiles_are_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(timing, "PROFILE_MAX_FILES", 3)
+    for i in range(5):
+        old = tmp_path / f"old-{i}.folded"
+        old.write_text("a;b 1\n")
+        os.utime(old, ns=(i * 10**9, i * 10**9))
+
+    profiler = SamplingProfiler()
+    profiler.samples.update({f"frame;{i}": i + 1 for i in range(10)})
+    path = profiler.save("/search", profiles_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), "old-3.folded", "old-4.folded"])
+    assert len(profiler.folded(max_stacks=4).splitlines()) == 4
@@ -0,0 +1,151 @@
+import json
+import pytest
+from src import tracing
+from src.tracing import start_trace, span, traced, current_span, NOOP_SPAN, STATUS_ERROR
+from src.timing import collect_timings
+from src.agents.telemetry import run_metrics, step_summary
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+def test_span_outside_trace_is_noop_but_still_timed():
+    with collect_timings() as timings:
+        with span("rerank") as s:
+            assert s is NOOP_SPAN
+            s.set_attribute("ignored", 1)
+    assert "rerank" in timings
+    assert current_span() is NOOP_SPAN
+
+
+def test_nested_spans_form_a_tree_and_export(exporter):
+    @traced("retrieve")
+    def retrieve():
+        with span("embed", **{"embedding.count": 2}):
+            pass
+        current_span().set_attribute("total_results", 7)
+
+    with start_trace("agent") as root:
+        retrieve()
+
+    tracing.get_processor().flush()
+    assert [s.name for s in exporter.spans] == ["agent", "retrieve", "embed"]
+    node = root.find("retrieve")
+    assert node.parent is root
+    assert node.attributes["total_results"] == 7
+    assert node.find("embed").trace_id == root.trace_id
+    assert root.duration_ms >= node.duration_ms
+
+
+def test_exception_marks_span_as_error(exporter):
+    with pytest.raises(ValueError):
+        with start_trace("agent") as root:
+            with span("generate"):
+                raise ValueError("boom")
+    generate = root.find("generate")
+    assert generate.status == STATUS_ERROR
+    assert generate.status_message == "boom"
+    assert generate.end_ns is not None
+
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracing.set_exporter(tracing.FileExporter(str(path)))
+    try:
+        with start_trace("agent"):
+            with span("llm.chat", **{"llm.model": "m", "llm.usage.prompt_tokens": 12, "ok": True}):
+                current_span().set_attribute("queries", ["a", "b"])
+        tracing.get_processor().flush()
+    finally:
+        tracing.set_exporter(None)
+
+    root, child = [json.loads(line) for line in path.read_text().splitlines()]
+    assert child["parentSpanId"] == root["spanId"]
+    assert child["traceId"] == root["traceId"] and len(root["traceId"]) == 32
+    attrs = {a["key"]: a["value"] for a in child["attributes"]}
+    assert attrs["llm.model"] == {"stringValue": "m"}
+    assert attrs["llm.usage.prompt_tokens"] == {"intValue": "12"}
+    assert attrs["ok"] == {"boolValue": True}
+    assert attrs["queries"]["arrayValue"]["values"][1] == {"stringValue": "b"}
+
+
+def _llm(model, prompt, completion):
+    with span("llm.chat", **{"llm.model": model}) as s:
+        s.set_attributes({"llm.usage.prompt_tokens": prompt, "llm.usage.completion_tokens": completion})
+
+
+def test_run_metrics_come_from_span_tree():
+    with start_trace("agent") as root:
+        with span("classify"):
+            _llm("fast", 20, 3)
+        with span("decompose"):
+            pass
+        for total in (4, 9):
+            with span("retrieve") as s:
+                s.set_attribute("total_results", total)
+            with span("generate"):
+                _llm("big", 500, 100)
+            with span("verify"):
+                _llm("big", 300, 50)
+
+    decision = {"model": "big", "tier": "full", "reason": "type=COMPARE", "escalations": 1}
+    result = {"query": "q", "query_type": "SIMPLE", "grounding": {"score": 0.9}, "model_decision": decision}
+    metrics = run_metrics(root, result)
+    assert metrics["model_tier"] == "full" and metrics["escalations"] == 1
+    assert metrics["latency_ms"] == round(root.duration_ms)
+    assert metrics["classify_model"] == "fast"
+    assert metrics["decompose_model"] == "none"
+    assert metrics["generate_tokens"] == 200
+    assert metrics["retrieve_count"] == 9
+    assert metrics["retrieve_ms"] == round(root.total_ms("retrieve"))
+
+    step = step_summary(root.find("generate"))
+    assert step["step"] == "generate"
+    assert step["model"] == "big" and step["tokens"] == 100 and step["prompt_tokens"] == 500
+
+
+def test_classify_fallback_is_recorded_as_local():
+    with start_trace("agent") as root:
+        with span("classify") as s:
+            _llm("fast", 20, 0)
+            s.set_attributes({"fallback": True, "model": "local-classifier"})
+
+    result = {"query": "q", "query_type": "SIMPLE", "grounding": {}}
+    assert run_metrics(root, result)["classify_model"] == "local-classifier"
+    assert step_summary(root.find("classify"))["model"] == "local-classifier"
+
+
+def test_spans_follow_langgraph_nodes():
+    from typing import TypedDict
+    from langgraph.graph import StateGraph, END
+
+    class State(TypedDict):
+        x: int
+
+    @traced("node")
+    def node(state: State) -> State:
+        with span("inner"):
+            state["x"] += 1
+        return state
+
+    graph = StateGraph(State)
+    graph.add_node("node", node)
+    graph.set_entry_point("node")
+    graph.add_edge("node", END)
+
+    with start_trace("agent") as root:
+        graph.compile().invoke({"x": 1})
+    assert [s.name for s in root.walk()] == ["agent", "node", "inner"]
@@ -0,0 +1,146 @@
+import json
+import numpy as np
+import faiss
+import pytest
+from src.search.vector_store import FaissStore, fold_duplicates, make_index, matches_filters, metadata_rows_path
+
+
+def _write_build(tmp_path, count=20, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    metadata = [
+        {"text": f"chunk {i}", "metadata": {"api_name": f"API {i}", "type": "endpoint" if i % 2 else "overview"}}
+        for i in range(count)
+    ]
+    paths = {name: str(tmp_path / name) for name in ("index.bin", "metadata.json", "manifest.json")}
+    faiss.write_index(make_index(vectors, "flat"), paths["index.bin"])
+    with open(paths["metadata.json"], "w") as f:
+        json.dump(metadata, f)
+    with open(paths["manifest.json"], "w") as f:
+        json.dump({"embedding_provider": "hash", "embedding_model": f"hash-{dimension}"}, f)
+    return vectors, paths
+
+
+def _open(paths, **kwargs):
+    return FaissStore(paths["index.bin"], paths["metadata.json"], paths["manifest.json"], **kwargs)
+
+
+def test_matches_filters():
+    result = {"metadata": {"api_name": "Twilio", "type": "endpoint"}}
+    assert matches_filters(result, {"type": "endpoint"})
+    assert matches_filters(result, {"api_name": ["Stripe", "Twilio"]})
+    assert not matches_filters(result, {"type": "overview"})
+
+
+def test_search_returns_ids_and_scores(tmp_path):
+    vectors, paths = _write_build(tmp_path)
+    store = _open(paths)
+    assert store.dimension == 16 and store.count == 20
+
+    results = store.search(vectors[3:4], 5)[0]
+    assert len(results) == 5
+    assert results[0]["id"] == 3
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert results[0]["text"] == "chunk 3"
+
+
+def test_search_filters_and_caps_at_k(tmp_path):
+    vectors, paths = _write_build(tmp_path)
+    store = _open(paths)
+
+    results = store.search(vectors[:2], 3, filters={"type": "endpoint"})
+    for row in results:
+        assert len(row) == 3
+        assert all(r["metadata"]["type"] == "endpoint" for r in row)
+
+
+def test_reconstruct(tmp_path):
+    vectors, paths = _write_build(tmp_path)
+    stored = _open(paths).reconstruct([1, 7])
+    assert set(stored) == {1, 7}
+    np.testing.assert_allclose(stored[7], vectors[7], atol=1e-6)
+
+
+def test_reload_picks_up_rebuild_and_validates(tmp_path):
+    _, paths = _write_build(tmp_path)
+    seen = []
+    store = _open(paths, validate=seen.append)
+    version = store.version
+    assert store.reload() is False
+
+    _write_build(tmp_path, count=30, seed=1)
+    assert store.reload() is True
+    assert store.version != version
+    assert store.count == 30
+    assert len(seen) == 2
+
+
+def test_reload_keeps_serving_when_validation_fails(tmp_path):
+    _, paths = _write_build(tmp_path)
+    store = _open(paths)
+    store.validate = lambda manifest: (_ for _ in ()).throw(RuntimeError("model mismatch"))
+
+    _write_build(tmp_path, count=30, seed=1)
+    with pytest.raises(RuntimeError):
+        store.reload()
+    assert store.count == 20
+
+
+def _write_shared_build(tmp_path):
+    """Three vectors for six chunks: 0 <- chunks 0, 2, 4; 1 <- chunk 1; 2 <- chunks 3, 5."""
+    vectors, paths = _write_build(tmp_path, count=3)
+    metadata = [
+        {"text": f"text {row}", "metadata": {"api_name": f"API {i}", "type": "endpoint" if i % 2 else "overview"}}
+        for i, row in enumerate([0, 1, 0, 2, 0, 2])
+    ]
+    with open(paths["metadata.json"], "w") as f:
+        json.dump(metadata, f)
+    np.save(metadata_rows_path(paths["metadata.json"]), np.array([0, 1, 0, 2, 0, 2], dtype="int32"))
+    return vectors, paths
+
+
+def test_shared_vectors_aggregate_into_one_result(tmp_path):
+    vectors, paths = _write_shared_build(tmp_path)
+    store = _open(paths)
+    assert store.count == 3
+
+    results = store.search(vectors[0:1], 3)[0]
+    assert len(results) == 3 and results[0]["id"] == results[0]["vector_id"] == 0
+    top = results[0]
+    assert top["metadata"]["api_name"] == "API 0"
+    assert [d["api_name"] for d in top["duplicates"]] == ["API 2", "API 4"]
+    assert "duplicates" not in next(r for r in results if r["vector_id"] == 1)
+
+    # Filters pick the matching copies; the first match represents the vector
+    filtered = store.search(vectors[2:3], 3, filters={"api_name": ["API 5", "API 1"]})[0]
+    assert filtered[0]["id"] == 5 and filtered[0]["vector_id"] == 2
+    assert filtered[0]["metadata"]["api_name"] == "API 5"
+    assert "duplicates" not in filtered[0]
+
+
+def test_shared_vectors_expand_to_every_chunk(tmp_path):
+    vectors, paths = _write_shared_build(tmp_path)
+    store = _open(paths, dedupe_mode="expand")
+
+    results = store.search(vectors[0:1], 2)[0]
+    assert [r["metadata"]["api_name"] for r in results] == ["API 0", "API 2"]
+    # Each copy keeps its own chunk id; reconstruct goes through the shared vector id
+    assert [r["id"] for r in results] == [0, 2]
+    assert {r["vector_id"] for r in results} == {0}
+    assert list(store.reconstruct([0])) == [0]
+    assert all(r["score"] == pytest.approx(1.0, abs=1e-5) for r in results)
+
+    with pytest.raises(ValueError):
+        _open(paths, dedupe_mode="nope")
+
+
+def test_fold_duplicates_for_row_per_chunk_stores():
+    results = [
+        {"id": 0, "text": "same", "score": 0.9, "metadata": {"api_name": "A"}},
+        {"id": 2, "text": "same", "score": 0.9, "metadata": {"api_name": "B"}},
+        {"id": 1, "text": "other", "score": 0.8, "metadata": {"api_name": "C"}},
+    ]
+    folded = fold_duplicates([dict(r) for r in results], "aggregate")
+    assert [r["id"] for r in folded] == [0, 1]
+    assert folded[0]["duplicates"] == [{"api_name": "B"}] and "duplicates" not in folded[1]
+    assert fold_duplicates(results, "expand") == results